@@ -1,53 +1,377 @@
 # Importing dependecies
 import os
+import json
 import time
 import asyncio
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import List, Optional
 from pydantic import BaseModel
 
-from app.pipeline import PromptEnhancer
+from prompt_enhancer import PromptEnhancer, PROFILES, get_profile, client_provider, rate_limiters, response_cache, pipeline_cache, telemetry
+from prompt_enhancer import inflight_pipelines, inflight_calls, stage_classifier, model_router, pricing, cost_ledger, semantic_cache, stage_cache, stage_budgets
+from prompt_enhancer.telemetry import setup_tracing
+from prompt_enhancer.admission import AdmissionController, Overloaded
+from prompt_enhancer.ledger import BudgetExceeded
+from prompt_enhancer.routing import parse_routes
+from prompt_enhancer.batch import enhance_many
+from prompt_enhancer.jobs import JobRunner, job_store_from_env
 
 
 # Setting up the API key for single project
 # - create a .env file and add to it: OPENAI_API_KEY = the_personal_api_key
-# - Or: go to pipeline.py and pass it there (not recommended)
+# - the shared client, caches and rate limiter are set up from the environment in prompt_enhancer/runtime.py
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # one pooled OpenAI client per worker, opened at startup and closed cleanly at shutdown
+    client_provider.get()
+    # exporting the spans over OTLP if OTEL_EXPORTER_OTLP_ENDPOINT is set
+    setup_tracing()
+    # loading the tokenizer files now rather than on the event loop during the first request
+    await asyncio.to_thread(rate_limiters.warm_up)
+    loop_monitor = asyncio.create_task(telemetry.monitor_event_loop())
+    # appending the cost ledger to its file every COST_LEDGER_FLUSH_INTERVAL seconds, and at shutdown
+    ledger_flusher = asyncio.create_task(cost_ledger.flush_periodically())
+    # the job store (by default a SQLite file) is opened here rather than when the module is imported
+    job_runner.store = await asyncio.to_thread(job_store_from_env)
+    await job_runner.start()
+    yield
+    await job_runner.stop()
+    ledger_flusher.cancel()
+    await asyncio.gather(ledger_flusher, return_exceptions=True)
+    loop_monitor.cancel()
+    await client_provider.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 class InputPrompt(BaseModel):
     text: str
+    profile: str = "3-stage"
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    text: str
+
+class InputPromptBatch(BaseModel):
+    prompts: List[BatchItem]
+    concurrency: int = 8
+    profile: str = "3-stage"
+
+class JobRequest(BaseModel):
+    text: str
+    profile: str = "3-stage"
+    perform_eval: bool = False # 8-stage profile only
+    llm_assembly: bool = False # 8-stage profile only: an LLM call instead of the local assembler
+    webhook_url: Optional[str] = None
+
+
+# Upper bound on the concurrency a single batch request can ask for
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", 16))
+# Identity of the client: the tenant its cost is accounted to, and its share of the fair admission queue
+# - TENANT_API_KEYS = "key1=tenant1,key2=tenant2": every request needs "Authorization: Bearer <key>" (401 otherwise)
+# - else TENANT_HEADER: a header set by an authenticating proxy in front of the app (never trust it on a public endpoint)
+# - else the peer address
+TENANT_API_KEYS = parse_routes(os.getenv("TENANT_API_KEYS"))
+TENANT_HEADER = os.getenv("TENANT_HEADER") or None
+
+
+# Admission control of the worker: at most MAX_INFLIGHT_PIPELINES pipelines at once (0: unbounded), the other requests
+# wait in a bounded queue served round-robin between the clients, and are rejected fast with Retry-After when it is full
+admission = AdmissionController.from_env(telemetry=telemetry)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, error):
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers={"Retry-After": str(error.retry_after)})
+
+
+@app.exception_handler(BudgetExceeded)
+async def budgetExceeded(request, error):
+    headers = {"Retry-After": str(error.retry_after)} if error.retry_after is not None else None
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers=headers)
+
+
+def usage_report(enhancer, elapsed_time):
+    """Gather the usage, cost and timing information of a finished pipeline"""
+    return {
+        "model": enhancer.model,
+        "profile": enhancer.profile.name,
+        "elapsed_time": elapsed_time,
+        "prompt_tokens": enhancer.prompt_tokens,
+        "completion_tokens": enhancer.completion_tokens,
+        "cached_prompt_tokens": enhancer.cached_prompt_tokens,
+        # priced per model and stage by the pricing registry, cached prompt tokens included
+        "approximate_cost": enhancer.cost,
+        "cost_limit": enhancer.cost_limit,
+        "budget_downgrades": enhancer.budget_downgrades,
+        "stage_timings": enhancer.stage_timings,
+        "stage_usage": enhancer.stage_usage,
+        "model_usage": enhancer.model_usage,
+        "routing": enhancer.routing,
+        "cache_hits": enhancer.cache_hits,
+        "cache_misses": enhancer.cache_misses,
+        "pipeline_cache_hit": enhancer.pipeline_cache_hit,
+        "semantic_similarity": enhancer.semantic_similarity,
+        "pipeline_coalesced": enhancer.pipeline_coalesced,
+        "coalesced_calls": enhancer.coalesced_calls,
+        "skipped_stages": enhancer.skipped_stages,
+        "reused_stages": enhancer.reused_stages,
+        "trimmed_stages": enhancer.trimmed_stages,
+        "rate_limit_wait": enhancer.rate_limit_wait,
+        "call_stats": enhancer.call_stats,
+    }
+
+
+async def run_job(job, on_stage):
+    """Run the pipeline of a job, reporting each finished stage through on_stage"""
+    request = job["request"]
+    enhancer = PromptEnhancer(request["model"], profile=request["profile"], tenant=request.get("tenant"))
+    enhancer.stage_callback = on_stage
+    
+    start_time = time.time()
+    # the jobs share the pipeline slots of the worker with the synchronous requests
+    async with admission.slot("jobs", bounded=False):
+        advanced_prompt = await enhancer.enhance_prompt(request["text"], **request["options"])
+    elapsed_time = time.time() - start_time
+    
+    return {
+        **usage_report(enhancer, elapsed_time),
+        "input_prompt": request["text"],
+        "advanced_prompt": advanced_prompt,
+    }
+
+
+# Long pipelines (e.g. 8-stage with perform_eval) run as jobs in a pool of in-process workers, so they do not hold
+# HTTP connections (JOB_STORE_BACKEND = sqlite | memory, JOB_WORKERS, JOB_WEBHOOK_SECRET, ... see jobs.py).
+# Its store is set at startup, in lifespan()
+job_runner = JobRunner.from_env(None, run_job)
+
+
+def client_id(request):
+    if TENANT_API_KEYS:
+        scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+        tenant = TENANT_API_KEYS.get(key.strip()) if scheme.lower() == "bearer" else None
+        if tenant is None:
+            raise HTTPException(status_code=401, detail="A valid API key is required", headers={"WWW-Authenticate": "Bearer"})
+        return tenant
+    if TENANT_HEADER is not None and request.headers.get(TENANT_HEADER):
+        return request.headers[TENANT_HEADER]
+    return request.client.host if request.client else "unknown"
+
+
+def check_profile(profile):
+    """Reject unknown pipeline profiles before any work starts"""
+    try:
+        return get_profile(profile)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+def sse_event(event, data):
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
        
 @app.post("/advanced_prompt_generation")
-async def advancedPromptPipeline(payload: InputPrompt):
+async def advancedPromptPipeline(payload: InputPrompt, request: Request):
     
     input_prompt = payload.text
     
     model="gpt-4o-mini"
     
-    if model == "gpt-4o":
-        i_cost=5/10**6
-        o_cost=15/10**6
-    elif model == "gpt-4o-mini":
-        i_cost=0.15/10**6
-        o_cost=0.6/10**6
-    
-    enhancer = PromptEnhancer(model)
+    # the client is also the tenant the cost is accounted to
+    client = client_id(request)
+    cost_ledger.check(client)
+    enhancer = PromptEnhancer(model, profile=check_profile(payload.profile), tenant=client)
     
     start_time = time.time()
-    advanced_prompt = await enhancer.enhance_prompt(input_prompt)
+    async with admission.slot(client) as queue_wait:
+        advanced_prompt = await enhancer.enhance_prompt(input_prompt)
     elapsed_time = time.time() - start_time
     
     return {
-        "model": model,
-        "elapsed_time": elapsed_time,
-        "prompt_tokens": enhancer.prompt_tokens,
-        "completion_tokens": enhancer.completion_tokens,
-        "approximate_cost": (enhancer.prompt_tokens*i_cost)+(enhancer.completion_tokens*o_cost),
+        **usage_report(enhancer, elapsed_time),
+        "queue_wait": queue_wait,
         "input_prompt": input_prompt,
         "advanced_prompt": advanced_prompt,
     }
+
+
+@app.post("/advanced_prompt_generation/stream")
+async def advancedPromptPipelineStream(payload: InputPrompt, request: Request):
     
+    input_prompt = payload.text
+    
+    model="gpt-4o-mini"
+    
+    # rejecting with a plain 429/503 while it is still possible, the slot itself is waited for inside the stream
+    client = client_id(request)
+    cost_ledger.check(client)
+    admission.check(client)
+    
+    enhancer = PromptEnhancer(model, profile=check_profile(payload.profile), tenant=client)
+    
+    # the stages push their tokens into this queue as they arrive, tagged with the stage name
+    queue = asyncio.Queue()
+    
+    async def forward_token(stage, token):
+        await queue.put(("token", {"stage": stage, "content": token}))
+    
+    enhancer.token_callback = forward_token
+    
+    async def run_pipeline():
+        start_time = time.time()
+        try:
+            async with admission.slot(client) as queue_wait:
+                advanced_prompt = await enhancer.enhance_prompt(input_prompt)
+        except (Overloaded, BudgetExceeded) as error:
+            await queue.put(("error", {"detail": error.detail, "retry_after": error.retry_after}))
+        except Exception as error:
+            await queue.put(("error", {"detail": str(error)}))
+        else:
+            elapsed_time = time.time() - start_time
+            await queue.put(("done", {
+                **usage_report(enhancer, elapsed_time),
+                "queue_wait": queue_wait,
+                "input_prompt": input_prompt,
+                "advanced_prompt": advanced_prompt,
+            }))
+    
+    async def event_stream():
+        task = asyncio.create_task(run_pipeline())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield sse_event(event, data)
+                if event in ("done", "error"):
+                    break
+        finally:
+            # the client went away or the pipeline is over
+            task.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/advanced_prompt_generation/batch")
+async def advancedPromptPipelineBatch(payload: InputPromptBatch, request: Request):
+    
+    model="gpt-4o-mini"
+    profile = check_profile(payload.profile)
+    
+    # the batch is rejected up front if the queue is full; once accepted, its prompts wait for their turn like
+    # any other request of the client (at most `concurrency` of them are queued)
+    client = client_id(request)
+    cost_ledger.check(client)
+    admission.check(client)
+    
+    items = [(item.id if item.id is not None else str(index), item.text) for index, item in enumerate(payload.prompts)]
+    concurrency = min(max(1, payload.concurrency), MAX_BATCH_CONCURRENCY)
+    
+    # one JSON line per prompt, in completion order
+    async def result_stream():
+        async for result in enhance_many(items, lambda: PromptEnhancer(model, profile=profile, tenant=client), concurrency,
+                                         slot=lambda: admission.slot(client, bounded=False)):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def createJob(payload: JobRequest, request: Request, response: Response):
+    
+    model="gpt-4o-mini"
+    check_profile(payload.profile)
+    client = client_id(request)
+    cost_ledger.check(client)
+    if job_runner.full():
+        raise Overloaded(503, "Too many jobs are queued, retry later", admission.retry_after())
+    
+    # only non-default options are passed on, so a job shares the memoized results of the synchronous routes
+    options = {"perform_eval": True} if payload.perform_eval else {}
+    if payload.llm_assembly:
+        options["assembler"] = "llm"
+    try:
+        job = await job_runner.submit({"text": payload.text, "profile": payload.profile, "model": model, "options": options, "tenant": client}, payload.webhook_url)
+    except ValueError as error:
+        # the webhook URL is not an http(s) URL of a public (or JOB_WEBHOOK_ALLOWED_HOSTS) host
+        raise HTTPException(status_code=400, detail=str(error))
+    
+    response.headers["Location"] = f"/jobs/{job['id']}"
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}
+
+
+@app.get("/jobs/stats")
+async def jobsStats(request: Request):
+    # with API keys, only their holders see the job queue
+    client_id(request)
+    return await asyncio.to_thread(job_runner.stats)
+
+
+@app.get("/jobs/{job_id}")
+async def getJob(job_id: str, request: Request):
+    job = await job_runner.store.get(job_id)
+    # with API keys, a job is only visible to its own tenant (the other identities are not stable enough to poll with,
+    # the random job id is then what protects it)
+    if job is None or (TENANT_API_KEYS and job["request"].get("tenant") != client_id(request)):
+        raise HTTPException(status_code=404, detail="No such job")
+    return job
+
+
+@app.get("/cache/stats")
+async def cacheStats():
+    return {
+        "responses": await asyncio.to_thread(response_cache.stats) if response_cache is not None else None,
+        "pipelines": await asyncio.to_thread(pipeline_cache.stats) if pipeline_cache is not None else None,
+        "semantic": semantic_cache.stats() if semantic_cache is not None else None,
+        "stages": await asyncio.to_thread(stage_cache.stats) if stage_cache is not None else None,
+        # identical requests joined while in flight
+        "single_flight": {
+            "pipelines": inflight_pipelines.stats() if inflight_pipelines is not None else None,
+            "calls": inflight_calls.stats() if inflight_calls is not None else None,
+        },
+    }
+
+
+@app.get("/rate_limits/stats")
+async def rateLimitsStats():
+    return rate_limiters.stats()
+
+
+@app.get("/templates/stats")
+async def templatesStats():
+    return {name: profile.templates.stats() for name, profile in PROFILES.items()}
+
+
+@app.get("/stage_skipping/stats")
+async def stageSkippingStats():
+    return stage_classifier.stats() if stage_classifier is not None else None
+
+
+@app.get("/stage_budgets/stats")
+async def stageBudgetsStats():
+    return stage_budgets.stats() if stage_budgets is not None else None
+
+
+@app.get("/routing/stats")
+async def routingStats():
+    return model_router.stats() if model_router is not None else None
+
+
+@app.get("/costs/stats")
+async def costsStats():
+    return {"pricing": pricing.stats(), "ledger": cost_ledger.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = telemetry.metrics_text()
+    return Response(content=body, media_type=content_type)
 
 
-    
\ No newline at end of file
+@app.get("/admission/stats")
+async def admissionStats():
+    return admission.stats()
@@ -0,0 +1,5 @@
+#! /usr/bin/env sh
+
+# Run by the base image before gunicorn starts: the Prometheus samples of the previous run are dropped
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
@@ -1,22 +1,20 @@
 import gradio as gr
 
 import os 
+import sys
 import time 
 import asyncio
 
-from pipeline import PromptEnhancer
+# the pipelines live in the prompt_enhancer package at the root of the repository; a Space built with build_space.sh
+# has its own copy next to this file, found first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from prompt_enhancer import PromptEnhancer
 
 
 async def advancedPromptPipeline(InputPrompt, model="gpt-4o-mini", temperature=0.0):
     
-    if model == "gpt-4o":
-        i_cost=5/10**6
-        o_cost=15/10**6
-    elif model == "gpt-4o-mini":
-        i_cost=0.15/10**6
-        o_cost=0.6/10**6
-    
-    enhancer = PromptEnhancer(model, temperature)
+    enhancer = PromptEnhancer(model, profile="8-stage", temperature=temperature)
     
     start_time = time.time()
     advanced_prompt = await enhancer.enhance_prompt(InputPrompt, perform_eval=False)
@@ -28,12 +26,12 @@ async def advancedPromptPipeline(InputPrompt, model="gpt-4o-mini", temperature=0
         "elapsed_time": elapsed_time,
         "prompt_tokens": enhancer.prompt_tokens,
         "completion_tokens": enhancer.completion_tokens,
-        "approximate_cost": (enhancer.prompt_tokens*i_cost)+(enhancer.completion_tokens*o_cost),
+        "approximate_cost": enhancer.cost,
         "inout_prompt": input_prompt,
-        "advanced_prompt": advanced_prompt["advanced_prompt"],
+        "advanced_prompt": advanced_prompt,
     }"""
 
-    return advanced_prompt["advanced_prompt"]
+    return advanced_prompt
 
 
 demo = gr.Interface(fn=advancedPromptPipeline, 
@@ -0,0 +1,16 @@
+#!/usr/bin/env sh
+# Assemble a standalone Hugging Face Space: app.py and requirements.txt with a copy of the shared prompt_enhancer package,
+# which a Space cannot import from the root of this repository.
+# Usage, from anywhere: sh Gradio-app/build_space.sh [target directory, default build/gradio-space]
+set -e
+
+ROOT="$(cd "$(dirname "$0")/.." && pwd)"
+TARGET="${1:-$ROOT/build/gradio-space}"
+
+rm -rf "$TARGET"
+mkdir -p "$TARGET"
+cp "$ROOT/Gradio-app/app.py" "$ROOT/Gradio-app/requirements.txt" "$TARGET/"
+cp -R "$ROOT/prompt_enhancer" "$TARGET/prompt_enhancer"
+find "$TARGET" -name "__pycache__" -type d -prune -exec rm -rf {} +
+
+echo "Space ready in $TARGET (push its content to the Space repository)"
@@ -0,0 +1,301 @@
+# Importing dependencies
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import tempfile
+import subprocess
+import importlib.util
+import httpx
+
+from run_benchmark import ROOT, RESULTS_DIR, free_port, start_mock_server, mock_server_args, percentile, git_commit
+
+
+# Load test of the FastAPI service against the mock OpenAI server, sweeping the worker count and the per-worker cap of
+# in-flight pipelines (MAX_INFLIGHT_PIPELINES), then checking the event loop never blocks:
+#   python benchmarks/load_test.py --workers 1,2,4 --inflight 0,8,32 --clients 8,32,128 --duration 15 --slo-p95 5
+#   python benchmarks/load_test.py --url http://localhost:80 --clients 8,32,128   (a running container, no sweep)
+# The servers are run with gunicorn + uvicorn workers like the Docker image (uvicorn --workers if gunicorn is missing).
+
+
+APP_DIR = os.path.join(ROOT, "Docker-FastAPI-app")
+
+# asyncio debug mode reports every callback holding the loop longer than loop.slow_callback_duration (0.1 s)
+SLOW_CALLBACK = re.compile(r"Executing (?P<callback>.+?) took (?P<seconds>[\d.]+) seconds")
+
+
+def server_command(workers, port):
+    if importlib.util.find_spec("gunicorn") is not None:
+        return [sys.executable, "-m", "gunicorn", "app.main:app", "-k", "uvicorn.workers.UvicornWorker",
+                "-w", str(workers), "-b", f"127.0.0.1:{port}", "--timeout", "300"]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+
+
+def start_server(workers, inflight, mock_port, log_file, debug=False, timeout=60.0):
+    """Start the FastAPI service on a free port, pointed at the mock server, and wait until it answers"""
+    port = free_port()
+    multiproc_dir = tempfile.mkdtemp(prefix="prometheus_")
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": "mock",
+        "MAX_INFLIGHT_PIPELINES": str(inflight),
+        # the simulated users identify themselves with this header (see run_load)
+        "TENANT_HEADER": "X-Client-ID",
+        # the /metrics route aggregates the samples of all the workers
+        "PROMETHEUS_MULTIPROC_DIR": multiproc_dir,
+    }
+    # every request must reach the mock server, and the client-side rate limiter must not be the bottleneck
+    env.setdefault("PROMPT_CACHE_BACKEND", "none")
+    env.setdefault("PIPELINE_CACHE_BACKEND", "none")
+    env.setdefault("RATE_LIMIT_RPM", str(10**6))
+    env.setdefault("RATE_LIMIT_TPM", str(10**9))
+    if debug:
+        env["PYTHONASYNCIODEBUG"] = "1"
+
+    process = subprocess.Popen(server_command(workers, port), cwd=APP_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with code {process.returncode}, see {log_file.name}")
+        try:
+            if httpx.get(f"{url}/metrics", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The service did not start in time")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_load(url, clients, duration, profile):
+    """Closed-loop load: each client sends its next request as soon as the previous one is answered"""
+    latencies, statuses = [], {}
+    stop_at = time.perf_counter() + duration
+    counter = iter(range(10**9))
+
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=httpx.Limits(max_connections=clients)) as client:
+        async def user(index):
+            # each simulated user is its own client of the fair admission queue
+            headers = {"X-Client-ID": f"load-test-{index}"}
+            while time.perf_counter() < stop_at:
+                # distinct prompts, so no cache can serve them
+                payload = {"text": f"Write a short story about load test case #{next(counter)}", "profile": profile}
+                start = time.perf_counter()
+                try:
+                    status = (await client.post("/advanced_prompt_generation", json=payload, headers=headers)).status_code
+                except httpx.HTTPError:
+                    status = "connection_error"
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(index) for index in range(clients)))
+        wall_time = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": sum(statuses.values()),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "throughput_rps": round(len(latencies) / wall_time, 3),
+        "latency_p50": round(percentile(latencies, 50), 4) if latencies else None,
+        "latency_p95": round(percentile(latencies, 95), 4) if latencies else None,
+        "latency_p99": round(percentile(latencies, 99), 4) if latencies else None,
+        "error_rate": round(1 - len(latencies) / max(1, sum(statuses.values())), 4),
+    }
+
+
+def loop_lag(url):
+    """Read the event loop lag the workers reported on /metrics"""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    text = httpx.get(f"{url}/metrics", timeout=10.0).text
+    report = {"max_seconds": None, "samples": 0, "samples_over_100ms": 0}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name == "prompt_enhancer_event_loop_lag_max_seconds":
+                report["max_seconds"] = max(report["max_seconds"] or 0.0, round(sample.value, 4))
+            elif sample.name == "prompt_enhancer_event_loop_lag_seconds_count":
+                report["samples"] += int(sample.value)
+            elif sample.name == "prompt_enhancer_event_loop_lag_seconds_bucket" and sample.labels["le"] == "0.1":
+                report["samples_over_100ms"] -= int(sample.value)
+    report["samples_over_100ms"] += report["samples"]
+    return report
+
+
+def saturation_point(levels, gain=0.1):
+    """The load level after which adding clients raises the throughput by less than `gain`"""
+    best = levels[0]
+    for level in levels[1:]:
+        if level["throughput_rps"] < best["throughput_rps"] * (1 + gain):
+            break
+        best = level
+    return best
+
+
+def recommend(configs, slo_p95):
+    """Pick the configuration with the highest saturation throughput meeting the p95 latency objective"""
+    candidates = [config for config in configs if config["saturation"]["latency_p95"] is not None
+                  and config["saturation"]["latency_p95"] <= slo_p95 and config["saturation"]["error_rate"] == 0]
+    if not candidates:
+        return None
+    # fewer workers and a tighter cap win the ties: less memory and fewer upstream calls in flight
+    return max(candidates, key=lambda config: (config["saturation"]["throughput_rps"], -config["workers"], -(config["inflight"] or 10**9)))
+
+
+def blocking_check(args, mock_port, log_dir):
+    """Run the service in asyncio debug mode under load, and collect the callbacks that held the event loop"""
+    log_path = os.path.join(log_dir, "blocking_check.log")
+    with open(log_path, "w") as log_file:
+        process, url = start_server(1, 0, mock_port, log_file, debug=True)
+        # the startup (imports, cache files, ...) runs before the first request, only the serving part is checked
+        serving_offset = os.path.getsize(log_path)
+        try:
+            asyncio.run(run_load(url, max(int(clients) for clients in args.clients.split(",")), args.duration, args.profile))
+            lag = loop_lag(url)
+        finally:
+            stop_server(process)
+
+    slow_callbacks = {}
+    with open(log_path, encoding="utf-8", errors="replace") as f:
+        f.seek(serving_offset)
+        for line in f:
+            match = SLOW_CALLBACK.search(line)
+            if match:
+                callback = match.group("callback")
+                slow_callbacks[callback] = max(slow_callbacks.get(callback, 0.0), float(match.group("seconds")))
+    return {
+        "event_loop_lag": lag,
+        "slow_callbacks": [{"callback": callback, "max_seconds": seconds} for callback, seconds in sorted(slow_callbacks.items(), key=lambda item: -item[1])],
+        "log": log_path,
+    }
+
+
+def print_level(prefix, level):
+    print(f"|   {prefix}{level['clients']} clients: {level['throughput_rps']} req/s | p50 {level['latency_p50']} s | p95 {level['latency_p95']} s"
+          f" | p99 {level['latency_p99']} s | errors {level['error_rate']:.1%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test of the FastAPI service with a worker/concurrency tuning report")
+    parser.add_argument("--url", help="load an already running service instead of sweeping local ones (no worker sweep, no blocking check)")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to sweep")
+    parser.add_argument("--inflight", default="0,8,32", help="comma-separated MAX_INFLIGHT_PIPELINES values to sweep (0: unbounded)")
+    parser.add_argument("--clients", default="8,32,128", help="comma-separated numbers of concurrent clients")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per level")
+    parser.add_argument("--slo-p95", type=float, default=5.0, help="p95 latency objective of the recommended settings (seconds)")
+    parser.add_argument("--profile", default="3-stage")
+    parser.add_argument("--latency", type=float, default=0.5, help="latency of a mock chat completion (seconds, median if lognormal)")
+    parser.add_argument("--latency-jitter", type=float, default=0.5, help="uniform extra latency, or sigma of the lognormal distribution")
+    parser.add_argument("--latency-distribution", default="lognormal", choices=["uniform", "lognormal"])
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-blocking-check", action="store_true")
+    parser.add_argument("--output", help="JSON file of the report (default: benchmarks/results/load_<timestamp>_<commit>.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    client_levels = [int(clients) for clients in args.clients.split(",")]
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "configs": [],
+    }
+
+    print("-"*52)
+    print("|||||||||||||||| SERVICE LOAD TEST ||||||||||||||||")
+    print("-"*52, "\n")
+
+    if args.url:
+        levels = [asyncio.run(run_load(args.url, clients, args.duration, args.profile)) for clients in client_levels]
+        for level in levels:
+            print_level("", level)
+        report["configs"].append({"url": args.url, "levels": levels, "saturation": saturation_point(levels)})
+    else:
+        mock_port = free_port()
+        mock = start_mock_server(mock_port, mock_server_args(args))
+        log_dir = tempfile.mkdtemp(prefix="load_test_")
+        try:
+            for workers in [int(value) for value in args.workers.split(",")]:
+                for inflight in [int(value) for value in args.inflight.split(",")]:
+                    print(f"|- {workers} worker(s), MAX_INFLIGHT_PIPELINES={inflight} ----")
+                    with open(os.path.join(log_dir, f"server_{workers}_{inflight}.log"), "w") as log_file:
+                        process, url = start_server(workers, inflight, mock_port, log_file)
+                        try:
+                            levels = []
+                            for clients in client_levels:
+                                levels.append(asyncio.run(run_load(url, clients, args.duration, args.profile)))
+                                print_level("", levels[-1])
+                            lag = loop_lag(url)
+                        finally:
+                            stop_server(process)
+                    config = {"workers": workers, "inflight": inflight, "levels": levels, "saturation": saturation_point(levels), "event_loop_lag": lag}
+                    report["configs"].append(config)
+                    print(f"|   saturation: {config['saturation']['throughput_rps']} req/s at {config['saturation']['clients']} clients"
+                          f" | worst event loop lag {lag['max_seconds']} s\n")
+
+            if not args.skip_blocking_check:
+                print("|- Event loop blocking check (asyncio debug mode) ----")
+                report["blocking_check"] = blocking_check(args, mock_port, log_dir)
+                check = report["blocking_check"]
+                print(f"|   worst event loop lag {check['event_loop_lag']['max_seconds']} s"
+                      f" | {check['event_loop_lag']['samples_over_100ms']} lag samples over 100 ms")
+                for slow in check["slow_callbacks"][:10]:
+                    print(f"|   BLOCKING: {slow['callback']} held the loop for {slow['max_seconds']} s")
+                if not check["slow_callbacks"]:
+                    print("|   no callback held the event loop for more than 100 ms")
+                print()
+        finally:
+            mock.terminate()
+            mock.wait()
+
+        best = recommend(report["configs"], args.slo_p95)
+        report["recommendation"] = None if best is None else {
+            "WEB_CONCURRENCY": best["workers"],
+            "MAX_INFLIGHT_PIPELINES": best["inflight"],
+            "saturation_throughput_rps": best["saturation"]["throughput_rps"],
+            "saturation_clients": best["saturation"]["clients"],
+            "latency_p95": best["saturation"]["latency_p95"],
+        }
+        print("-"*52)
+        if best is None:
+            print(f"No configuration met the {args.slo_p95} s p95 objective without errors")
+        else:
+            print(f"RECOMMENDED: WEB_CONCURRENCY={best['workers']} MAX_INFLIGHT_PIPELINES={best['inflight']}"
+                  f" ({best['saturation']['throughput_rps']} req/s, p95 {best['saturation']['latency_p95']} s"
+                  f" at {best['saturation']['clients']} clients)")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load_{report['timestamp'].replace(':', '-')}_{report['commit'] or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# Importing dependencies
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import datetime
+import subprocess
+import tracemalloc
+
+
+# Offline benchmark of the pipelines against the local mock of the OpenAI API (no credits burnt):
+#   python benchmarks/run_benchmark.py --concurrency 1,4,16,64 --latency 0.3 --latency-jitter 0.4 --latency-distribution lognormal
+#   python benchmarks/run_benchmark.py --baseline benchmarks/results/<previous run>.json
+# Each run is saved as JSON (throughput, p50/p95/p99 latency, CPU time and, with --memory, memory per request, per target and concurrency).
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(port, mock_args=(), timeout=20.0):
+    """Start mock_openai_server.py in a subprocess and wait until it accepts connections"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "mock_openai_server.py"), "--port", str(port), *mock_args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The mock server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("The mock server did not start in time")
+
+
+def mock_server_args(args):
+    """Forward the latency/fault options of the benchmark to the mock server"""
+    mock_args = [
+        "--latency", str(args.latency),
+        "--latency-jitter", str(args.latency_jitter),
+        "--latency-distribution", args.latency_distribution,
+        "--slow-rate", str(args.slow_rate),
+        "--slow-latency", str(args.slow_latency),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--completion-tokens", str(args.completion_tokens),
+    ]
+    if args.seed is not None:
+        mock_args += ["--seed", str(args.seed)]
+    return mock_args
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of values (q in [0, 100])"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def make_prompts(count, offset=0):
+    """Distinct prompts, so neither the response cache nor the pipeline memo can serve them"""
+    topics = ["a python script", "a marketing email", "a history lesson", "a product review", "a travel plan", "a recipe"]
+    return [(str(offset + index), f"Write {topics[index % len(topics)]} about case #{offset + index}") for index in range(count)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_pool(items, concurrency, handle):
+    """Run handle(item) over the items with at most `concurrency` in flight, and return their (latency, ok) pairs"""
+    items = iter(items)
+    measures = []
+
+    async def worker():
+        for item in items:
+            start = time.perf_counter()
+            ok = await handle(item)
+            measures.append((time.perf_counter() - start, ok))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return measures
+
+
+def enhancer_target(model, profile):
+    """Drive PromptEnhancer.enhance_prompt directly"""
+    from prompt_enhancer import PromptEnhancer
+
+    async def handle(item):
+        _, text = item
+        try:
+            await PromptEnhancer(model, profile=profile).enhance_prompt(text)
+            return True
+        except Exception:
+            return False
+
+    return handle
+
+
+def api_target(model, profile):
+    """Drive the FastAPI app in-process (ASGI transport, no network hop), so only the app overhead is added"""
+    import httpx
+    sys.path.insert(0, os.path.join(ROOT, "Docker-FastAPI-app"))
+    from app.main import app
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+
+    async def handle(item):
+        prompt_id, text = item
+        # one client per request, so the fair admission queue does not serialize the benchmark
+        response = await client.post("/advanced_prompt_generation", json={"text": text, "profile": profile}, headers={"X-Client-ID": prompt_id})
+        return response.status_code == 200
+
+    return handle
+
+
+async def run_level(handle, concurrency, requests, offset, trace_memory):
+    """Run one benchmark level and summarize it"""
+    prompts = make_prompts(requests, offset)
+
+    if trace_memory:
+        tracemalloc.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    measures = await run_pool(prompts, concurrency, handle)
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    peak_memory = None
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies = [latency for latency, ok in measures if ok]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, ok in measures if not ok),
+        "wall_time": round(wall_time, 4),
+        "throughput_rps": round(len(latencies) / wall_time, 3),
+        "latency_p50": round(percentile(latencies, 50), 4) if latencies else None,
+        "latency_p95": round(percentile(latencies, 95), 4) if latencies else None,
+        "latency_p99": round(percentile(latencies, 99), 4) if latencies else None,
+        # the pipeline's own overhead: the mock LLM latency is spent waiting, not on the CPU
+        "cpu_ms_per_request": round(1000 * cpu_time / requests, 3),
+        # peak Python allocations while `concurrency` requests were in flight
+        "peak_memory_kb_per_request": round(peak_memory / 1024 / concurrency, 1) if peak_memory is not None else None,
+    }
+
+
+def compare(baseline, results):
+    """Print the relative change of every metric against a previous run"""
+    previous = {(level["target"], level["concurrency"]): level for level in baseline["levels"]}
+    print(f"\n--- COMPARED TO {baseline.get('commit')} ({baseline.get('timestamp')}) ---")
+    for level in results["levels"]:
+        old = previous.get((level["target"], level["concurrency"]))
+        if old is None:
+            continue
+        changes = []
+        for metric in ("throughput_rps", "latency_p50", "latency_p95", "latency_p99", "cpu_ms_per_request", "peak_memory_kb_per_request"):
+            if old.get(metric) and level.get(metric) is not None:
+                changes.append(f"{metric} {100 * (level[metric] - old[metric]) / old[metric]:+.1f}%")
+        print(f"|   {level['target']} x{level['concurrency']}: " + ", ".join(changes))
+
+
+async def run_benchmark(args):
+    targets = {"enhancer": enhancer_target, "api": api_target}
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "levels": [],
+    }
+
+    offset = 0
+    for target in args.targets.split(","):
+        handle = targets[target](args.model, args.profile)
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            requests = args.requests or max(20, 4 * concurrency)
+            level = {"target": target, **await run_level(handle, concurrency, requests, offset, args.memory)}
+            offset += requests
+            results["levels"].append(level)
+            print(f"|   {target} x{concurrency}: {level['throughput_rps']} req/s | p50 {level['latency_p50']} s | p95 {level['latency_p95']} s"
+                  f" | p99 {level['latency_p99']} s | {level['cpu_ms_per_request']} CPU ms/req | {level['errors']} errors")
+
+    from prompt_enhancer import client_provider
+    await client_provider.aclose()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the prompt pipelines against the mock OpenAI server")
+    parser.add_argument("--targets", default="enhancer,api", help="comma-separated targets: enhancer (PromptEnhancer) and/or api (FastAPI app)")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: max(20, 4 x concurrency))")
+    parser.add_argument("--profile", default="3-stage")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--latency", type=float, default=0.2, help="latency of a mock chat completion (seconds, median if lognormal)")
+    parser.add_argument("--latency-jitter", type=float, default=0.1, help="uniform extra latency, or sigma of the lognormal distribution")
+    parser.add_argument("--latency-distribution", default="uniform", choices=["uniform", "lognormal"])
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests hitting the slow tail")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="extra latency of the slow tail (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="approximate completion tokens of the mock responses")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the mock latency and fault draws")
+    parser.add_argument("--memory", action="store_true", help="also measure the peak memory per request with tracemalloc (about 3x the CPU time, compare runs with the same setting)")
+    parser.add_argument("--output", help="JSON file of the results (default: benchmarks/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    port = free_port()
+    server = start_mock_server(port, mock_server_args(args))
+
+    # the shared client, caches and rate limiter read their settings when prompt_enhancer is first imported
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock"
+    # every request must reach the mock server, and the client-side rate limiter must not be the bottleneck
+    os.environ.setdefault("PROMPT_CACHE_BACKEND", "none")
+    os.environ.setdefault("PIPELINE_CACHE_BACKEND", "none")
+    os.environ.setdefault("RATE_LIMIT_RPM", str(10**6))
+    os.environ.setdefault("RATE_LIMIT_TPM", str(10**9))
+    # the api target identifies each request as its own client with this header
+    os.environ.setdefault("TENANT_HEADER", "X-Client-ID")
+    sys.path.insert(0, ROOT)
+
+    print("-"*52)
+    print("||||||||||||||| PIPELINE BENCHMARK |||||||||||||||")
+    print("-"*52, "\n")
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{results['timestamp'].replace(':', '-')}_{results['commit'] or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Importing dependencies
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from prompt_enhancer.cache import make_cache_key
+
+
+# Local OpenAI-compatible server replaying canned outputs, to run the pipelines without burning credits:
+#   python mock_openai_server.py --port 8080 --replay wave_1_output.jsonl
+#   OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=mock python Advancd_Prompt_Generator.py --batch prompts.jsonl --batch-api
+# Replay files use the Batch API output format (see openai_batch.py), keyed by the content-addressed custom_id.
+
+
+app = FastAPI()
+app.state.replay = {}
+app.state.batch_delay = 0.0
+app.state.files = {}
+app.state.batches = {}
+# fault injection of the chat completions endpoint
+app.state.latency = 0.0 # base latency (seconds)
+app.state.latency_jitter = 0.0 # uniform extra latency (seconds)
+app.state.slow_rate = 0.0 # share of requests hitting the slow tail
+app.state.slow_latency = 0.0 # extra latency of the slow tail (seconds)
+app.state.error_rate = 0.0 # share of requests answered with a 500
+app.state.rate_limit_rate = 0.0 # share of requests answered with a 429
+app.state.latency_distribution = "uniform" # uniform: latency + U(0, jitter) | lognormal: median latency, sigma = jitter
+app.state.completion_tokens = 0 # approximate length of the placeholder completions (0: short echo of the prompt)
+
+
+def load_replay(path):
+    """Load canned chat completion bodies from a Batch API output file"""
+    replay = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                replay[record["custom_id"]] = record["response"]["body"]
+    return replay
+
+
+def completion_body(body):
+    """Return the canned chat completion of a request, or a deterministic placeholder"""
+    messages = body["messages"]
+    key = make_cache_key(body["model"], messages[0]["content"], messages[-1]["content"], body.get("temperature", 1.0), body.get("response_format"),
+                         body.get("max_tokens"))
+    if key in app.state.replay:
+        return app.state.replay[key]
+
+    prompt = messages[-1]["content"]
+    content = f"Mock response to: {' '.join(prompt.split())[-80:]}"
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        json_schema = response_format["json_schema"]["schema"]
+        content = json.dumps(mock_instance(json_schema, json_schema.get("$defs", {}), content))
+    elif app.state.completion_tokens:
+        # padding with ~4-character words, about one token each
+        content += " lorem" * max(0, app.state.completion_tokens - len(content) // 4)
+    finish_reason = "stop"
+    if body.get("max_tokens") and len(content) // 4 > body["max_tokens"]:
+        content, finish_reason = content[:body["max_tokens"] * 4], "length"
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4, "total_tokens": prompt_tokens + len(content) // 4},
+    }
+
+
+def mock_instance(schema, definitions, text):
+    """A placeholder value following a JSON schema (one item per array), for the structured-output calls"""
+    if "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if schema.get("type") == "object":
+        return {name: mock_instance(property_schema, definitions, text) for name, property_schema in schema.get("properties", {}).items()}
+    if schema.get("type") == "array":
+        return [mock_instance(schema["items"], definitions, text)]
+    if schema.get("type") in ("integer", "number"):
+        return 0
+    if schema.get("type") == "boolean":
+        return False
+    return text
+
+
+def file_object(file_id):
+    stored = app.state.files[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(stored["content"]),
+        "created_at": stored["created_at"],
+        "filename": stored["filename"],
+        "purpose": stored["purpose"],
+        "status": "processed",
+    }
+
+
+def store_file(filename, content, purpose):
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    app.state.files[file_id] = {"filename": filename, "content": content, "purpose": purpose, "created_at": int(time.time())}
+    return file_id
+
+
+def stream_chunks(completion):
+    """Split a chat completion into streamed chunks, the usage coming in a last chunk without choices"""
+    content = completion["choices"][0]["message"]["content"]
+    chunk = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+    words = content.split(" ")
+    for index, word in enumerate(words):
+        token = word if index == len(words) - 1 else word + " "
+        choice = {"index": 0, "delta": {"content": token}, "finish_reason": None}
+        yield f"data: {json.dumps({**chunk, 'choices': [choice]})}\n\n"
+    yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': completion['usage']})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def inject_faults():
+    """Sleep for the configured latency, and return an error response for the configured share of requests"""
+    state = app.state
+    if state.latency_distribution == "lognormal" and state.latency > 0:
+        delay = random.lognormvariate(math.log(state.latency), state.latency_jitter)
+    else:
+        delay = state.latency + random.uniform(0, state.latency_jitter)
+    if random.random() < state.slow_rate:
+        delay += state.slow_latency
+    await asyncio.sleep(delay)
+
+    draw = random.random()
+    if draw < state.error_rate:
+        return JSONResponse(status_code=500, content={"error": {"message": "Injected server error", "type": "server_error"}})
+    if draw < state.error_rate + state.rate_limit_rate:
+        return JSONResponse(status_code=429, headers={"retry-after": "0.1"},
+                            content={"error": {"message": "Injected rate limit", "type": "rate_limit_exceeded"}})
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chatCompletions(body: dict):
+    error = await inject_faults()
+    if error is not None:
+        return error
+    completion = completion_body(body)
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(completion), media_type="text/event-stream")
+    return completion
+
+
+@app.post("/v1/files")
+async def createFile(file: UploadFile = File(...), purpose: str = Form(...)):
+    content = (await file.read()).decode("utf-8")
+    return file_object(store_file(file.filename, content, purpose))
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+async def fileContent(file_id: str):
+    if file_id not in app.state.files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return app.state.files[file_id]["content"]
+
+
+@app.post("/v1/batches")
+async def createBatch(body: dict):
+    if body["input_file_id"] not in app.state.files:
+        raise HTTPException(status_code=404, detail="No such file")
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    app.state.batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"],
+        "completion_window": body["completion_window"],
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    return app.state.batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieveBatch(batch_id: str):
+    batch = app.state.batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+
+    # the batch completes once the configured delay is over
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= app.state.batch_delay:
+        lines = app.state.files[batch["input_file_id"]]["content"].splitlines()
+        outputs = []
+        for line in lines:
+            if line.strip():
+                request = json.loads(line)
+                outputs.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": completion_body(request["body"])},
+                    "error": None,
+                }))
+        batch["output_file_id"] = store_file(f"{batch_id}_output.jsonl", "\n".join(outputs) + "\n", "batch_output")
+        batch["status"] = "completed"
+        batch["request_counts"] = {"total": len(outputs), "completed": len(outputs), "failed": 0}
+
+    return batch
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--replay", help="Batch API output JSONL file of canned responses")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="seconds before a submitted batch completes")
+    parser.add_argument("--latency", type=float, default=0.0, help="base latency of a chat completion (seconds)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="uniform extra latency (seconds), or sigma of the lognormal distribution")
+    parser.add_argument("--latency-distribution", default="uniform", choices=["uniform", "lognormal"])
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests hitting the slow tail")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="extra latency of the slow tail (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--completion-tokens", type=int, default=0, help="approximate completion tokens of the placeholder responses")
+    parser.add_argument("--seed", type=int, help="seed of the latency and fault draws, for reproducible runs")
+    args = parser.parse_args()
+
+    if args.replay:
+        app.state.replay = load_replay(args.replay)
+    app.state.batch_delay = args.batch_delay
+    for name in ("latency", "latency_jitter", "latency_distribution", "slow_rate", "slow_latency", "error_rate", "rate_limit_rate", "completion_tokens"):
+        setattr(app.state, name, getattr(args, name))
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,4 @@
+# Advanced Prompt Generation pipelines, shared by the CLI, the FastAPI app and the Gradio app
+from prompt_enhancer.enhancer import PromptEnhancer
+from prompt_enhancer.profiles import PROFILES, get_profile
+from prompt_enhancer.runtime import client_provider, response_cache, pipeline_cache, rate_limiters, call_policy, telemetry, inflight_pipelines, inflight_calls, stage_classifier, model_router, pricing, cost_ledger, semantic_cache, stage_cache, stage_budgets, REQUEST_BUDGET
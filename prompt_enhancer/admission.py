@@ -0,0 +1,173 @@
+# Importing dependencies
+import os
+import math
+import time
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+
+
+# Raised when a request cannot be admitted: status 429 when the client exceeds its share of the queue,
+# 503 when the whole queue is full or the wait for a slot timed out
+class Overloaded(Exception):
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+# Defining the AdmissionController class: at most `max_inflight` pipelines run at once, the others wait in
+# per-client FIFO queues served round-robin, so one busy client cannot starve the others
+class AdmissionController:
+    def __init__(self, max_inflight=32, max_queue=128, max_queue_per_client=16, max_wait=30.0, telemetry=None):
+        self.max_inflight = max_inflight # 0: unbounded, nothing is ever queued
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait = max_wait # seconds a request may wait for a slot before being rejected
+        self.telemetry = telemetry
+        self.inflight = 0
+        self.queues = OrderedDict() # client -> deque of waiting futures, in round-robin order
+        self.queued = 0
+        self.service_time = None # moving average of the pipeline durations (seconds)
+        self.stats_counters = {"admitted": 0, "queued_total": 0, "rejected_client": 0, "rejected_full": 0, "rejected_timeout": 0, "wait_time": 0.0}
+
+
+    @classmethod
+    def from_env(cls, telemetry=None):
+        """Build a controller from the MAX_INFLIGHT_PIPELINES and ADMISSION_* environment variables"""
+        return cls(
+            max_inflight=int(os.getenv("MAX_INFLIGHT_PIPELINES", 32)),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 128)),
+            max_queue_per_client=int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", 16)),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", 30.0)),
+            telemetry=telemetry,
+        )
+
+
+    def retry_after(self):
+        """Seconds after which a rejected request has a fair chance to be admitted"""
+        service_time = self.service_time or 5.0
+        return max(1, math.ceil(service_time * (1 + self.queued / max(1, self.max_inflight))))
+
+
+    def reject(self, counter, status_code, detail):
+        self.stats_counters[counter] += 1
+        if self.telemetry is not None:
+            self.telemetry.observe_admission_rejection(counter[len("rejected_"):])
+        raise Overloaded(status_code, detail, self.retry_after())
+
+
+    def check(self, client):
+        """Reject right away if a request of this client would be rejected (without taking a slot)"""
+        if self.max_inflight <= 0 or self.inflight < self.max_inflight:
+            return
+        if self.queued >= self.max_queue:
+            self.reject("rejected_full", 503, "The service is overloaded, retry later")
+        if len(self.queues.get(client, ())) >= self.max_queue_per_client:
+            self.reject("rejected_client", 429, "Too many requests of this client are waiting")
+
+
+    async def acquire(self, client, bounded=True):
+        """Wait for a pipeline slot, and return the time waited; unbounded waits skip the queue limits and the timeout"""
+        if self.max_inflight <= 0 or (self.inflight < self.max_inflight and not self.queued):
+            self.inflight += 1
+            self.stats_counters["admitted"] += 1
+            return 0.0
+        if bounded:
+            self.check(client)
+
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client, deque()).append(future)
+        self.queued += 1
+        self.stats_counters["queued_total"] += 1
+        self.observe_queue()
+        start = time.perf_counter()
+        try:
+            if bounded:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            else:
+                await future
+        except asyncio.TimeoutError:
+            self.withdraw(client, future)
+            self.reject("rejected_timeout", 503, f"No pipeline slot freed up within {self.max_wait} s, retry later")
+        except asyncio.CancelledError:
+            # the client went away while waiting, or right after being granted the slot
+            self.withdraw(client, future)
+            raise
+
+        wait = time.perf_counter() - start
+        self.stats_counters["admitted"] += 1
+        self.stats_counters["wait_time"] += wait
+        if self.telemetry is not None:
+            self.telemetry.observe_admission_wait(wait)
+        return wait
+
+
+    def withdraw(self, client, future):
+        """Remove a waiter that gave up, handing its slot on if it had already been granted one"""
+        if future.done() and not future.cancelled():
+            self.release()
+            return
+        future.cancel()
+        queue = self.queues.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.queues[client]
+        self.observe_queue()
+
+
+    def release(self, service_time=None):
+        """Free a slot and grant it to the next client in round-robin order"""
+        self.inflight -= 1
+        if service_time is not None:
+            self.service_time = service_time if self.service_time is None else 0.9 * self.service_time + 0.1 * service_time
+        self.dispatch()
+
+
+    def dispatch(self):
+        while self.queues and (self.max_inflight <= 0 or self.inflight < self.max_inflight):
+            client, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            # the client goes to the back of the round, or leaves it when it has nothing left waiting
+            if queue:
+                self.queues.move_to_end(client)
+            else:
+                del self.queues[client]
+            if not future.done():
+                future.set_result(None)
+                self.inflight += 1
+        self.observe_queue()
+
+
+    @contextlib.asynccontextmanager
+    async def slot(self, client, bounded=True):
+        """Hold a pipeline slot for the duration of the block, which receives the time waited for it"""
+        wait = await self.acquire(client, bounded)
+        start = time.perf_counter()
+        try:
+            yield round(wait, 4)
+        finally:
+            self.release(time.perf_counter() - start)
+
+
+    def observe_queue(self):
+        if self.telemetry is not None:
+            self.telemetry.observe_admission_queue(self.queued, self.inflight)
+
+
+    def stats(self):
+        admitted = self.stats_counters["admitted"]
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "queued_per_client": {client: len(queue) for client, queue in self.queues.items()},
+            **{key: value for key, value in self.stats_counters.items() if key != "wait_time"},
+            "mean_wait_time": round(self.stats_counters["wait_time"] / admitted, 4) if admitted else 0.0,
+            "mean_service_time": round(self.service_time, 4) if self.service_time is not None else None,
+            "retry_after": self.retry_after(),
+        }
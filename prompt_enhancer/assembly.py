@@ -0,0 +1,34 @@
+# Defining a section of an assembled prompt: its title (None for no header) and the components it merges, in order
+class Section:
+    def __init__(self, title, components):
+        self.title = title
+        self.components = components
+
+
+# Defining the LocalAssembler class: a deterministic, template-based assembly of the stage outputs into the advanced prompt,
+# without any LLM call. Each section merges its components under one header, and the empty sections are left out.
+class LocalAssembler:
+    def __init__(self, sections, header="## {title}", separator="\n\n", renderers=None):
+        self.sections = sections
+        self.header = header
+        self.separator = separator
+        self.renderers = dict(renderers or {}) # component -> function turning its typed value into text (see structured.py)
+
+
+    def render(self, name, value):
+        """Text of one component"""
+        if name in self.renderers:
+            value = self.renderers[name](value)
+        return (value or "").strip()
+
+
+    def assemble(self, components):
+        """Merge the components into the advanced prompt, section by section"""
+        parts = []
+        for section in self.sections:
+            texts = [self.render(name, components.get(name)) for name in section.components]
+            body = self.separator.join(text for text in texts if text)
+            if not body:
+                continue
+            parts.append(f"{self.header.format(title=section.title)}\n{body}" if section.title else body)
+        return self.separator.join(parts)
@@ -0,0 +1,166 @@
+# Importing dependencies
+import os
+import json
+import time
+import asyncio
+
+
+def read_prompts(input_path, id_field="id", text_field="text"):
+    """Read the prompts of a JSONL file as (id, text, error) triples, the line number is used when the id is missing;
+    a malformed line gets an error (and no text) instead of stopping the whole file"""
+    # read as bytes, so a line that is not UTF-8 only fails itself
+    with open(input_path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            try:
+                line = line.decode("utf-8").strip()
+            except UnicodeDecodeError as error:
+                yield str(line_number), None, f"Line {line_number} is not UTF-8: {error}"
+                continue
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield str(line_number), None, f"Invalid JSON on line {line_number}: {error}"
+                continue
+            if isinstance(record, str):
+                yield str(line_number), record, None
+            elif not isinstance(record, dict):
+                yield str(line_number), None, f"Line {line_number} is neither a string nor an object"
+            elif not isinstance(record.get(text_field), str):
+                yield str(record.get(id_field, line_number)), None, f"Line {line_number} has no '{text_field}' text"
+            else:
+                yield str(record.get(id_field, line_number)), record[text_field], None
+
+
+def read_done_ids(output_path):
+    """Read the ids already enhanced successfully in a previous (possibly crashed) run, ignoring the records without one"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a crashed run may be truncated
+                continue
+            if isinstance(record, dict) and record.get("id") is not None and not record.get("error"):
+                done.add(str(record["id"]))
+    return done
+
+
+async def enhance_one(make_enhancer, prompt_id, input_prompt, slot=None, options=None):
+    """Run one pipeline and return its result record, errors are reported in the record instead of raised"""
+    enhancer = make_enhancer()
+    options = options or {}
+    start_time = time.time()
+    try:
+        if slot is None:
+            advanced_prompt = await enhancer.enhance_prompt(input_prompt, **options)
+        else:
+            async with slot():
+                advanced_prompt = await enhancer.enhance_prompt(input_prompt, **options)
+        error = None
+    except Exception as exception:
+        advanced_prompt = None
+        error = f"{type(exception).__name__}: {exception}"
+
+    return {
+        "id": prompt_id,
+        "model": enhancer.model,
+        "elapsed_time": round(time.time() - start_time, 4),
+        "prompt_tokens": enhancer.prompt_tokens,
+        "completion_tokens": enhancer.completion_tokens,
+        "cost": round(enhancer.cost, 8),
+        "input_prompt": input_prompt,
+        "advanced_prompt": advanced_prompt,
+        "error": error,
+    }
+
+
+async def enhance_many(items, make_enhancer, concurrency=8, slot=None, options=None):
+    """Enhance (id, text) pairs with at most `concurrency` pipelines in flight, yielding the results in completion order
+    (`slot`, if given, returns an async context manager held around each pipeline, e.g. an admission slot;
+    `options` are the profile options passed to enhance_prompt)"""
+    items = iter(items)
+    results = asyncio.Queue()
+    errors = []
+
+    # a fixed pool of workers pulls from the iterator, so huge corpora are never loaded as tasks at once
+    async def worker():
+        # the sentinel is always sent, or the consumer would wait forever on a worker that died;
+        # an error of the iterator ends the other workers too, and is raised once their results are yielded
+        try:
+            for prompt_id, input_prompt in items:
+                await results.put(await enhance_one(make_enhancer, prompt_id, input_prompt, slot, options))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            await results.put(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is None:
+                running -= 1
+            else:
+                yield result
+    finally:
+        for task in workers:
+            task.cancel()
+    if errors:
+        raise errors[0]
+
+
+def invalid_record(prompt_id, error):
+    """Result record of a line of the input file that could not be read"""
+    return {"id": prompt_id, "model": None, "elapsed_time": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+            "input_prompt": None, "advanced_prompt": None, "error": error}
+
+
+async def run_batch_file(input_path, output_path, make_enhancer, concurrency=8, id_field="id", text_field="text", options=None):
+    """Enhance every prompt of a JSONL file into an output JSONL file, skipping the ids already done there
+    (the malformed lines get an error record, and are retried by the next run)"""
+    done = read_done_ids(output_path)
+    invalid = []
+
+    def pending():
+        for prompt_id, text, error in read_prompts(input_path, id_field, text_field):
+            if prompt_id in done:
+                continue
+            if error is not None:
+                invalid.append(invalid_record(prompt_id, error))
+                continue
+            yield prompt_id, text
+
+    # making sure a truncated last line does not swallow the first appended record
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+        if needs_newline:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    summary = {"skipped": len(done), "enhanced": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    def write(f, result):
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        f.flush()
+        summary["failed" if result["error"] else "enhanced"] += 1
+        summary["prompt_tokens"] += result["prompt_tokens"]
+        summary["completion_tokens"] += result["completion_tokens"]
+        summary["cost"] += result["cost"]
+
+    with open(output_path, "a", encoding="utf-8") as f:
+        async for result in enhance_many(pending(), make_enhancer, concurrency, options=options):
+            # the malformed lines met by the workers so far
+            while invalid:
+                write(f, invalid.pop(0))
+            write(f, result)
+        while invalid:
+            write(f, invalid.pop(0))
+
+    return summary
@@ -0,0 +1,106 @@
+# Importing dependencies
+import os
+from prompt_enhancer.rate_limiter import get_encoding, count_tokens
+from prompt_enhancer.routing import parse_routes
+
+
+TRIM_MARKER = "\n[... {count} tokens trimmed ...]\n"
+
+
+def trim_text(model, text, max_tokens):
+    """Cut a text down to max_tokens deterministically, keeping its head (2/3) and its tail (1/3) around a marker,
+    as the instructions of a prompt usually open and close it"""
+    encoding = get_encoding(model)
+    # without tiktoken, 4 characters stand for one token
+    units = encoding.encode(text, disallowed_special=()) if encoding is not None else text
+    size = max_tokens if encoding is not None else max_tokens * 4
+    if len(units) <= size:
+        return text
+    head = units[:size * 2 // 3]
+    tail = units[len(units) - (size - len(head)):] if size > len(head) else units[:0]
+    if encoding is not None:
+        head, tail = encoding.decode(head), encoding.decode(tail)
+    count = len(units) - size if encoding is not None else (len(units) - size) // 4
+    return head + TRIM_MARKER.format(count=count) + tail
+
+
+def allocate(sizes, budget):
+    """Split a token budget among values: the small ones are kept whole, the largest ones share what is left equally"""
+    shares = {}
+    remaining = budget
+    pending = sorted(sizes.items(), key=lambda item: (item[1], item[0]))
+    for index, (name, size) in enumerate(pending):
+        shares[name] = min(size, remaining // (len(pending) - index))
+        remaining -= shares[name]
+    return shares
+
+
+# Defining the StageBudgets class: the token budget of the dynamic values of each stage prompt (the outputs of the earlier stages
+# and the input prompt), counted with tiktoken before the call and trimmed to fit, and the max_tokens of each stage completion.
+# Budgets are keyed on "stage" or "profile:stage", the latter taking precedence.
+class StageBudgets:
+    def __init__(self, input_budgets=None, max_tokens=None, default_input_budget=6000, default_max_tokens=None):
+        self.input_budgets = dict(input_budgets or {})
+        self.max_tokens = dict(max_tokens or {})
+        self.default_input_budget = default_input_budget # None: the stages without a budget are not trimmed
+        self.default_max_tokens = default_max_tokens # None: no cap on the completions
+        self.stats_counters = {"checked": 0, "trimmed": {}, "tokens_saved": {}}
+
+
+    @classmethod
+    def from_env(cls):
+        """Build the budgets from the STAGE_* environment variables, or None unless STAGE_BUDGETS is on
+        (off by default: trimming cuts into the stage inputs, the user's own prompt included, and changes the outputs)"""
+        if os.getenv("STAGE_BUDGETS", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            input_budgets={key: int(value) for key, value in parse_routes(os.getenv("STAGE_INPUT_BUDGETS")).items()},
+            max_tokens={key: int(value) for key, value in parse_routes(os.getenv("STAGE_MAX_TOKENS")).items()},
+            default_input_budget=int(os.getenv("STAGE_INPUT_BUDGET_DEFAULT", 6000)) or None,
+            default_max_tokens=int(os.getenv("STAGE_MAX_TOKENS_DEFAULT", 0)) or None,
+        )
+
+
+    def signature(self):
+        """Part of the pipeline memoization key: other budgets give other outputs"""
+        return [sorted(self.input_budgets.items()), sorted(self.max_tokens.items()), self.default_input_budget, self.default_max_tokens]
+
+
+    def lookup(self, table, profile, stage, default):
+        return table.get(f"{profile.name}:{stage}", table.get(stage, default))
+
+
+    def max_tokens_of(self, profile, stage):
+        """max_tokens of the completions of the stage, or None"""
+        return self.lookup(self.max_tokens, profile, stage, self.default_max_tokens)
+
+
+    def fit(self, model, profile, stage, values):
+        """Trim the text values of a stage prompt to the input budget of the stage,
+        returning (values, {"input_tokens", "tokens_saved"}) or (values, None) if they fit"""
+        budget = self.lookup(self.input_budgets, profile, stage, self.default_input_budget)
+        self.stats_counters["checked"] += 1
+        if budget is None:
+            return values, None
+        sizes = {name: count_tokens(model, value) for name, value in values.items() if isinstance(value, str)}
+        input_tokens = sum(sizes.values())
+        if input_tokens <= budget:
+            return values, None
+
+        shares = allocate(sizes, budget)
+        values = {name: trim_text(model, value, shares[name]) if name in sizes and sizes[name] > shares[name] else value
+                  for name, value in values.items()}
+        tokens_saved = input_tokens - sum(count_tokens(model, values[name]) for name in sizes)
+        self.stats_counters["trimmed"][stage] = self.stats_counters["trimmed"].get(stage, 0) + 1
+        self.stats_counters["tokens_saved"][stage] = self.stats_counters["tokens_saved"].get(stage, 0) + tokens_saved
+        return values, {"input_tokens": input_tokens, "tokens_saved": tokens_saved}
+
+
+    def stats(self):
+        return {
+            "input_budgets": self.input_budgets,
+            "max_tokens": self.max_tokens,
+            "default_input_budget": self.default_input_budget,
+            "default_max_tokens": self.default_max_tokens,
+            **self.stats_counters,
+        }
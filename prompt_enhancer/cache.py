@@ -0,0 +1,195 @@
+# Importing dependencies
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+from collections import OrderedDict
+
+
+def make_cache_key(model, system_message, prompt, temperature, response_format=None, max_tokens=None):
+    """Build a content-addressed key from everything that shapes the LLM response"""
+    values = [model, system_message, prompt, temperature]
+    # only the structured-output and capped calls have these, the keys of the plain calls stay the same
+    if response_format is not None:
+        values.append(response_format)
+    if max_tokens is not None:
+        values.append({"max_tokens": max_tokens})
+    payload = json.dumps(values, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different spellings of a prompt share a key"""
+    return " ".join(prompt.split()).lower()
+
+
+def make_pipeline_key(input_prompt, model, pipeline_version, **options):
+    """Build the key of a whole enhance_prompt run from the normalized input prompt"""
+    payload = json.dumps([normalize_prompt(input_prompt), model, pipeline_version, sorted(options.items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_stage_key(pipeline_version, stage, inputs, **settings):
+    """Build the key of one stage output from its exact inputs and the settings shaping it"""
+    payload = json.dumps([pipeline_version, stage, list(inputs), sorted(settings.items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Defining the base class shared by every cache backend (hit/miss counters)
+class CacheBackend:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key):
+        """Return the cached value for the key, or None"""
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value):
+        """Store a JSON-serializable value under the key"""
+        await self._set(key, value)
+
+    def stats(self):
+        """Return the hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# In-process LRU cache with a time-to-live and size-based eviction
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024**2, ttl=24 * 3600):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, size, value)
+        self.size = 0
+
+    async def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if self.ttl and expires_at < time.time():
+            self._remove(key)
+            return None
+        # marking the entry as most recently used
+        self.entries.move_to_end(key)
+        return value
+
+    async def _set(self, key, value):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.time() + self.ttl, size, value)
+        self.size += size
+        # evicting the least recently used entries
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"entries": len(self.entries), "bytes": self.size})
+        return stats
+
+
+# On-disk SQLite cache that can be shared by several processes (e.g. gunicorn workers)
+class SQLiteCache(CacheBackend):
+    def __init__(self, path="prompt_cache.sqlite", max_entries=100_000, ttl=7 * 24 * 3600):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self):
+        # a short-lived connection per operation keeps the backend safe across threads and processes
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _get_sync(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _set_sync(self, key, value):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now),
+            )
+            # evicting expired entries, then the least recently used ones above the size limit
+            connection.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def _get(self, key):
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def _set(self, key, value):
+        await asyncio.to_thread(self._set_sync, key, value)
+
+    def stats(self):
+        stats = super().stats()
+        with self._connect() as connection:
+            stats["entries"] = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
+
+
+def cache_from_env(prefix="PROMPT_CACHE", default_path="prompt_cache.sqlite"):
+    """Build the cache backend selected by the {prefix}_* environment variables"""
+    backend = os.getenv(f"{prefix}_BACKEND", "memory").lower()
+    ttl = float(os.getenv(f"{prefix}_TTL", 24 * 3600))
+
+    if backend == "memory":
+        return MemoryCache(
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.getenv(f"{prefix}_MAX_BYTES", 64 * 1024**2)),
+            ttl=ttl,
+        )
+    elif backend == "sqlite":
+        return SQLiteCache(
+            path=os.getenv(f"{prefix}_PATH", default_path),
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 100_000)),
+            ttl=ttl,
+        )
+    elif backend == "none":
+        return None
+    else:
+        raise ValueError(f"Unknown {prefix}_BACKEND: {backend}")
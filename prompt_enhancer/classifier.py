@@ -0,0 +1,122 @@
+# Importing dependencies
+import os
+import re
+import logging
+from prompt_enhancer.rate_limiter import count_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+# Words hinting that the output would benefit from reference material (documentation, papers, standards, ...)
+REFERENCE_KEYWORDS = {
+    "api", "algorithm", "analysis", "analyze", "architecture", "benchmark", "best", "cite", "citation", "citations", "compare", "comparison",
+    "compliance", "documentation", "docs", "evidence", "framework", "guideline", "guidelines", "history", "legal", "law", "library", "literature",
+    "medical", "paper", "papers", "protocol", "regulation", "regulations", "report", "research", "review", "scientific", "source", "sources",
+    "specification", "standard", "standards", "statistics", "study", "studies", "technical", "theory", "tutorial",
+}
+# Words hinting that the task needs external tools (live data, files, web, code execution, ...)
+TOOL_KEYWORDS = {
+    "api", "browse", "calculate", "compute", "convert", "crawl", "csv", "current", "database", "dataset", "download", "excel", "fetch", "file",
+    "files", "forecast", "image", "images", "json", "latest", "live", "pdf", "plot", "price", "prices", "query", "real-time", "realtime",
+    "scrape", "search", "spreadsheet", "sql", "stock", "today", "translate", "upload", "weather", "web", "website",
+}
+# Short creative tasks, which the few-shot examples show get no suggestions
+CREATIVE_KEYWORDS = {
+    "haiku", "poem", "limerick", "joke", "riddle", "slogan", "tagline", "tweet", "greeting", "caption", "pun", "rhyme", "toast", "motto",
+}
+
+WORD = re.compile(r"[a-z][a-z0-9+#\-]*")
+
+
+# Defining the StageClassifier class: a local, network-free look at the input prompt (tiktoken length and keywords)
+# deciding which of the skippable stages of a profile are worth an LLM call. Opt-in (STAGE_SKIPPING=true), as it changes the outputs
+class StageClassifier:
+    # bump when the rules change, so memoized results of the previous rules are not reused
+    version = "3"
+
+    def __init__(self, max_tokens=24):
+        self.max_tokens = max_tokens # prompts up to this length without a reference/tool keyword get no suggestion stage
+        self.static_tokens = {}
+        self.stats_counters = {"pipelines": 0, "skipped": {}, "tokens_saved": 0}
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a classifier from the STAGE_SKIPPING_* environment variables, or None unless STAGE_SKIPPING is on"""
+        if os.getenv("STAGE_SKIPPING", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            max_tokens=int(os.getenv("STAGE_SKIPPING_MAX_TOKENS", 24)),
+        )
+
+
+    def signature(self):
+        """Part of the pipeline memoization key: other thresholds may skip other stages"""
+        return f"{self.version}:{self.max_tokens}"
+
+
+    def features(self, model, input_prompt):
+        words = set(WORD.findall(input_prompt.lower()))
+        return {
+            "tokens": count_tokens(model, input_prompt),
+            "reference_keywords": sorted(words & REFERENCE_KEYWORDS),
+            "tool_keywords": sorted(words & TOOL_KEYWORDS),
+            "creative": bool(words & CREATIVE_KEYWORDS),
+            "code": "```" in input_prompt or "def " in input_prompt or "()" in input_prompt,
+        }
+
+
+    def skip_reason(self, kind, features, tools_dict):
+        """Why a stage of this kind (references | tools | enhancements) is not worth calling, or None
+        (a tools stage without any tool calls no LLM, there is nothing to skip)"""
+        short = features["tokens"] <= self.max_tokens and not features["code"]
+        if kind == "references":
+            if not features["reference_keywords"] and not features["tool_keywords"] and (short or features["creative"]):
+                return "short prompt without reference keywords" if short else "creative prompt"
+        elif kind == "tools":
+            if tools_dict and not features["tool_keywords"] and (short or features["creative"]):
+                return "short prompt without tool keywords" if short else "creative prompt"
+        elif kind == "enhancements":
+            # one stage suggesting both references and tools
+            references = self.skip_reason("references", features, tools_dict)
+            tools = self.skip_reason("tools", features, tools_dict) if tools_dict else references
+            if references is not None and tools is not None:
+                return references
+        return None
+
+
+    def estimate_tokens(self, profile, template, model, input_prompt):
+        """Tokens a call of the template costs: its recorded mean, or the static prefix plus the input prompt until it has one"""
+        usage = profile.templates.usage.get(template)
+        if usage is not None and usage["calls"]:
+            return round((usage["prompt_tokens"] + usage["completion_tokens"]) / usage["calls"])
+        if template not in self.static_tokens:
+            self.static_tokens[template] = count_tokens(model, profile.templates.templates[template].static)
+        return self.static_tokens[template] + count_tokens(model, input_prompt)
+
+
+    def decide(self, profile, stage_names, model, input_prompt, tools_dict):
+        """Return {stage: {"reason", "tokens_saved"}} for the stages of the pipeline to skip"""
+        features = self.features(model, input_prompt)
+        skipped = {}
+        for stage in stage_names:
+            if stage not in profile.skippable:
+                continue
+            kind, template = profile.skippable[stage]
+            reason = self.skip_reason(kind, features, tools_dict)
+            if reason is not None:
+                skipped[stage] = {"reason": reason, "tokens_saved": self.estimate_tokens(profile, template, model, input_prompt)}
+
+        self.stats_counters["pipelines"] += 1
+        for stage, decision in skipped.items():
+            self.stats_counters["skipped"][stage] = self.stats_counters["skipped"].get(stage, 0) + 1
+            self.stats_counters["tokens_saved"] += decision["tokens_saved"]
+        # logged so the thresholds can be tuned against the outputs
+        logger.info(f"Stage skipping ({profile.name}): skipped {sorted(skipped) or 'none'}, "
+                    f"~{sum(decision['tokens_saved'] for decision in skipped.values())} tokens saved, features {features}")
+        return skipped
+
+
+    def stats(self):
+        return {"max_tokens": self.max_tokens, **self.stats_counters}
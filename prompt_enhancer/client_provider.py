@@ -0,0 +1,79 @@
+# Importing dependencies
+import os
+import logging
+import importlib.util
+import httpx
+from openai import AsyncOpenAI
+
+
+logger = logging.getLogger(__name__)
+
+
+# Defining the ClientProvider class which owns one pooled AsyncOpenAI client per process,
+# so the stage calls of every PromptEnhancer reuse the same keep-alive connections
+class ClientProvider:
+    def __init__(self, api_key=None, base_url=None, max_connections=100, max_keepalive_connections=20,
+                 keepalive_expiry=30.0, http2=False, timeout=60.0, connect_timeout=5.0, max_retries=0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        # retries are left to resilience.CallPolicy, which knows about the stage deadlines
+        self.max_retries = max_retries
+        self.client = None
+        self.pid = None
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a provider from the OPENAI_* environment variables"""
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20)),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30.0)),
+            http2=os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes"),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", 60.0)),
+            connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5.0)),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 0)),
+        )
+
+
+    def get(self):
+        """Return the client of the current process, creating it on first use"""
+        # a forked worker (e.g. gunicorn with preload) must not share the sockets of its parent
+        if self.client is None or self.pid != os.getpid():
+            self.client = self.create_client()
+            self.pid = os.getpid()
+        return self.client
+
+
+    def create_client(self):
+        http2 = self.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("OPENAI_HTTP2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            http2=http2,
+        )
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=self.max_retries, http_client=http_client)
+
+
+    async def aclose(self):
+        """Close the pooled connections of the current process"""
+        if self.client is not None and self.pid == os.getpid():
+            await self.client.close()
+        self.client = None
+        self.pid = None
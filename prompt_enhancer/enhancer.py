@@ -0,0 +1,497 @@
+# Importing dependencies
+import time
+import asyncio
+from prompt_enhancer.cache import make_cache_key, make_pipeline_key, make_stage_key
+from prompt_enhancer.scheduler import Stage, StageScheduler, current_stage
+from prompt_enhancer.templates import cached_prompt_tokens
+from prompt_enhancer.rate_limiter import estimate_prompt_tokens
+from prompt_enhancer.ledger import BudgetExceeded
+from prompt_enhancer.resilience import RETRYABLE_ERRORS, StreamInterrupted
+from prompt_enhancer.profiles import get_profile
+from prompt_enhancer.runtime import client_provider, response_cache, pipeline_cache, rate_limiters, call_policy, telemetry, REQUEST_BUDGET
+from prompt_enhancer.runtime import inflight_pipelines, inflight_calls, stage_classifier, model_router, pricing, cost_ledger, semantic_cache, stage_cache, stage_budgets
+
+
+def pipeline_status(task):
+    """Ledger status of a finished pipeline task"""
+    if task.cancelled():
+        return "failed"
+    error = task.exception()
+    if error is None:
+        return "succeeded"
+    return "aborted" if isinstance(error, BudgetExceeded) else "failed"
+
+
+# Defining the PromptEnhancer class running a pipeline profile (3-stage, 8-stage, ...) on the shared
+# client, caches, rate limiter, retry policy and stage scheduler
+class PromptEnhancer:
+    def __init__(self, model="gpt-4o-mini", profile="3-stage", temperature=0.0, tools_dict={}, cache=response_cache, pipeline_cache=pipeline_cache,
+                 client=None, rate_limiters=rate_limiters, call_policy=call_policy, request_budget=REQUEST_BUDGET, telemetry=telemetry,
+                 inflight_pipelines=inflight_pipelines, inflight_calls=inflight_calls, stage_classifier=stage_classifier,
+                 model_router=model_router, pricing=pricing, cost_ledger=cost_ledger, tenant=None, semantic_cache=semantic_cache,
+                 stage_cache=stage_cache, stage_budgets=stage_budgets):
+        self.model = model # default model of the stages, unless the model router gives them another one
+        self.profile = get_profile(profile)
+        self.temperature = temperature # from 0 (precise and almost deterministic answer) to 2 (creative and almost random answer)
+        self.client = client if client is not None else client_provider.get()
+        self.rate_limiters = rate_limiters
+        self.rate_limit_wait = 0.0
+        self.call_policy = call_policy
+        self.request_budget = request_budget
+        self.call_stats = {"retries": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.tools_dict = tools_dict
+        self.stage_timings = {}
+        # per-stage breakdown of the LLM calls, tokens and cache hits
+        self.stage_usage = {}
+        # per-model breakdown of the LLM calls and tokens, as stages may run on different models
+        self.model_usage = {}
+        # per-stage model routing and cascade decisions (ModelRouter, None to run every stage on self.model)
+        self.model_router = model_router
+        self.routing = {}
+        # live cost of the request (PricingRegistry), recorded per tenant in the cost ledger, which also sets its cost budget
+        self.pricing = pricing
+        self.cost_ledger = cost_ledger
+        self.tenant = tenant
+        self.cost = 0.0
+        self.cost_limit = None
+        self.budget_downgrades = {}
+        self.telemetry = telemetry
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.pipeline_cache = pipeline_cache
+        self.pipeline_cache_hit = False
+        # index of the enhanced prompts serving near-duplicates from the pipeline cache (SemanticCache, None to disable)
+        self.semantic_cache = semantic_cache
+        self.semantic_similarity = None
+        # identical concurrent pipelines/calls share one in flight (SingleFlight registries, None to disable)
+        self.inflight_pipelines = inflight_pipelines
+        self.inflight_calls = inflight_calls
+        self.pipeline_coalesced = False
+        # task of the pipeline this enhancer leads for the coalesced requests, which outlives a leader that goes away
+        self.pipeline_task = None
+        self.coalesced_calls = 0
+        # local pre-classifier skipping the stages not worth an LLM call for the input prompt (None to run them all)
+        self.stage_classifier = stage_classifier
+        self.skipped_stages = {}
+        # outputs of the stages already run on the exact same inputs, reused instead of recomputed (cache backend, None to disable)
+        self.stage_cache = stage_cache
+        self.reused_stages = {}
+        # per-stage input budgets and max_tokens (StageBudgets, None to send every input whole and uncapped)
+        self.stage_budgets = stage_budgets
+        self.trimmed_stages = {}
+        self.components = {}
+        # optional coroutine function (stage, token) -> None; when set, the LLM responses are streamed through it
+        self.token_callback = None
+        # optional coroutine function (stage, output, timing) -> None, called as each stage finishes (e.g. job progress)
+        self.stage_callback = None
+        # optional backend replacing the direct API call (e.g. openai_batch.BatchAPIBackend for offline jobs)
+        self.llm_backend = None
+
+
+    async def call_llm(self, prompt, template=None, response_format=None):
+        """Call the LLM routed to the current stage with the given prompt (rendered from the named template of the profile, if any),
+        escalating to the cascade model of the stage if the output fails the router check
+        (response_format: JSON schema of a structured-output call, see structured.py)"""
+        stage = current_stage.get()
+        model = self.model_router.route(self.profile, stage, self.model) if self.model_router is not None else self.model
+        model = self.affordable_model(stage, model, prompt)
+        if self.model_router is None:
+            return await self.call_model(prompt, template, model, response_format)
+        
+        self.routing[stage] = {"model": model}
+        content = await self.call_model(prompt, template, model, response_format)
+        
+        # a streamed output is already forwarded to the client, it cannot be replaced
+        escalation = self.model_router.escalation(self.profile, stage, model) if self.token_callback is None else None
+        if escalation is not None:
+            reason = self.model_router.check(self.profile, stage, content)
+            # past the cost budget, the output of the cheaper model is kept
+            if reason is not None and self.within_budget(escalation, prompt):
+                self.model_router.record_escalation(escalation)
+                self.routing[stage].update(escalated_to=escalation, reason=reason)
+                content = await self.call_model(prompt, template, escalation, response_format)
+        return content
+
+
+    def estimate_cost(self, model, prompt):
+        """Dollar cost of a call of the model with the prompt, assuming the completion estimate of the cost ledger (or the max_tokens of the stage)"""
+        prompt_tokens = estimate_prompt_tokens(model, [{"content": self.profile.system_message}, {"content": prompt}])
+        completion_tokens = self.cost_ledger.completion_estimate
+        max_tokens = self.max_tokens_of(current_stage.get())
+        if max_tokens is not None:
+            completion_tokens = min(completion_tokens, max_tokens)
+        return self.pricing.cost(model, prompt_tokens, completion_tokens, batch=getattr(self.llm_backend, "batch", False))
+
+
+    def max_tokens_of(self, stage):
+        return self.stage_budgets.max_tokens_of(self.profile, stage) if self.stage_budgets is not None else None
+
+
+    def fit_budget(self, values):
+        """Trim the values of the current stage prompt to the input budget of the stage, recording the tokens saved"""
+        if self.stage_budgets is None:
+            return values
+        stage = current_stage.get()
+        # counted with the tokenizer of the model the stage is routed to
+        model = self.model_router.model_of(self.profile, stage, self.model) if self.model_router is not None else self.model
+        values, trimmed = self.stage_budgets.fit(model, self.profile, stage, values)
+        if trimmed is not None:
+            self.trimmed_stages[stage] = trimmed
+            self.telemetry.observe_trimmed_stage(self.profile.name, stage, trimmed["tokens_saved"])
+        return values
+
+
+    def within_budget(self, model, prompt):
+        # parallel stages are checked against what was spent when they start, so they may overspend by a call or two
+        return self.cost_limit is None or self.pricing is None or self.cost + self.estimate_cost(model, prompt) <= self.cost_limit
+
+
+    def affordable_model(self, stage, model, prompt):
+        """Return the model if the call fits in the cost budget of the request, else downgrade it to the cheaper model
+        of the ledger (COST_BUDGET_ACTION=downgrade) or abort the request with BudgetExceeded"""
+        if self.within_budget(model, prompt):
+            return model
+        downgrade_model = self.cost_ledger.downgrade_model if self.cost_ledger.action == "downgrade" else None
+        if downgrade_model is not None and downgrade_model != model and self.within_budget(downgrade_model, prompt):
+            self.budget_downgrades[stage] = {"from": model, "to": downgrade_model}
+            self.telemetry.observe_budget("downgraded")
+            return downgrade_model
+        self.telemetry.observe_budget("aborted")
+        raise self.cost_ledger.overspend(self.tenant, self.cost_limit, stage)
+
+
+    async def call_model(self, prompt, template, model, response_format=None):
+        """Call the given model with the prompt, through the response cache, single-flight and the rate limiter"""
+        system_message = self.profile.system_message
+        temperature = self.temperature
+        stage = current_stage.get()
+        max_tokens = self.max_tokens_of(stage)
+        usage_of_stage = self.usage_of(stage)
+        usage_of_stage["calls"] += 1
+        
+        with self.telemetry.span("llm_call", stage=stage, template=template, model=model) as span:
+            # cached responses are returned as is and cost zero tokens
+            cache_key = make_cache_key(model, system_message, prompt, temperature, response_format, max_tokens)
+            if self.cache is not None:
+                cached = await self.cache.get(cache_key)
+                self.telemetry.observe_cache(stage, model, cached is not None)
+                span.set_attribute("cache_hit", cached is not None)
+                if cached is not None:
+                    self.cache_hits += 1
+                    usage_of_stage["cache_hits"] += 1
+                    if self.token_callback is not None:
+                        await self.token_callback(stage, cached["content"])
+                    return cached["content"]
+                self.cache_misses += 1
+            
+            messages = [
+                {"role": "system", 
+                 "content": system_message
+                 },
+                {"role": "user", 
+                 "content": prompt
+                 } 
+                ]
+            
+            # an identical call already in flight (e.g. the same stage of the same prompt for another client) is joined,
+            # it costs zero tokens here like a cache hit
+            if self.inflight_calls is not None:
+                (content, usage), shared = await self.inflight_calls.do(cache_key, lambda: self.complete_llm(messages, temperature, model, response_format, max_tokens))
+            else:
+                (content, usage), shared = await self.complete_llm(messages, temperature, model, response_format, max_tokens), False
+            if shared:
+                self.coalesced_calls += 1
+                usage_of_stage["coalesced"] += 1
+                self.telemetry.observe_coalesced("call")
+                span.set_attribute("coalesced", True)
+                if self.token_callback is not None:
+                    await self.token_callback(stage, content)
+                return content
+            
+            # counting the I/O tokens, and those served from the provider-side prompt cache
+            cached_tokens = cached_prompt_tokens(usage)
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+            self.cached_prompt_tokens += cached_tokens
+            usage_of_stage["prompt_tokens"] += usage.prompt_tokens
+            usage_of_stage["completion_tokens"] += usage.completion_tokens
+            usage_of_stage["cached_prompt_tokens"] += cached_tokens
+            usage_of_model = self.model_usage.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0, "cost": 0.0})
+            usage_of_model["calls"] += 1
+            usage_of_model["prompt_tokens"] += usage.prompt_tokens
+            usage_of_model["completion_tokens"] += usage.completion_tokens
+            usage_of_model["cached_prompt_tokens"] += cached_tokens
+            # pricing the call, the cached prompt tokens at the cached input price and the Batch API calls at the batch discount
+            cost = self.pricing.cost(model, usage.prompt_tokens, usage.completion_tokens, cached_tokens, batch=getattr(usage, "batch", False)) if self.pricing is not None else 0.0
+            self.cost += cost
+            usage_of_stage["cost"] += cost
+            usage_of_model["cost"] += cost
+            self.telemetry.observe_cost(stage, model, cost)
+            if template is not None:
+                self.profile.templates.record_usage(template, usage)
+            self.telemetry.observe_usage(stage, model, usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+            span.set_attribute("prompt_tokens", usage.prompt_tokens)
+            span.set_attribute("completion_tokens", usage.completion_tokens)
+            span.set_attribute("cached_prompt_tokens", cached_tokens)
+
+            if self.cache is not None:
+                await self.cache.set(cache_key, {
+                    "content": content,
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                })
+
+            return content
+
+
+    async def complete_llm(self, messages, temperature, model, response_format=None, max_tokens=None):
+        """Get (content, usage) from the LLM backend if one is set, or from the API"""
+        if self.llm_backend is not None:
+            return await self.llm_backend.complete(model, messages, temperature, response_format, max_tokens)
+        return await self.request_llm(messages, temperature, model, response_format, max_tokens)
+
+
+    def usage_of(self, stage):
+        """Return the usage counters of a stage, creating them on first use"""
+        if stage not in self.stage_usage:
+            self.stage_usage[stage] = {"calls": 0, "cache_hits": 0, "coalesced": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0,
+                                       "cost": 0.0}
+        return self.stage_usage[stage]
+
+
+    async def request_llm(self, messages, temperature, model, response_format=None, max_tokens=None):
+        """Send the chat completion request with retries, hedging and the stage deadline, and return (content, usage)"""
+        send = lambda: self.send_llm(messages, temperature, model, response_format, max_tokens)
+        if self.call_policy is None:
+            return await send()
+        # a streamed response cannot be hedged, its tokens are already forwarded to the client
+        return await self.call_policy.call(model, send, self.call_stats, hedge=self.token_callback is None)
+
+
+    async def send_llm(self, messages, temperature, model, response_format=None, max_tokens=None):
+        """Send one chat completion request once the shared rate limiter admits it, and return (content, usage)"""
+        limiter = None
+        if self.rate_limiters is not None:
+            limiter = self.rate_limiters.get(model)
+            estimated_tokens = self.rate_limiters.estimate(model, messages)
+            wait = await limiter.acquire(estimated_tokens)
+            self.rate_limit_wait += wait
+            self.telemetry.observe_queue_wait(current_stage.get(), model, wait)
+        
+        # the structured-output calls constrain the response to a JSON schema, the stage budgets may cap its length
+        extra = {"response_format": response_format} if response_format is not None else {}
+        if max_tokens is not None:
+            extra["max_tokens"] = max_tokens
+        
+        # the raw response gives access to the x-ratelimit-* headers
+        if self.token_callback is None:
+            raw_response = await self.client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                **extra,
+            )
+            response = raw_response.parse()
+            content = response.choices[0].message.content
+            usage = response.usage
+        else:
+            raw_response = await self.client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}, # the last chunk carries the token usage
+                **extra,
+            )
+            content, usage = await self.stream_llm(raw_response.parse())
+        
+        if limiter is not None:
+            limiter.update_from_headers(raw_response.headers)
+            limiter.settle(estimated_tokens, usage.prompt_tokens + usage.completion_tokens)
+        
+        return content, usage
+
+
+    async def stream_llm(self, stream):
+        """Read a streamed LLM response, forwarding each token to the token callback tagged with the current stage"""
+        stage = current_stage.get()
+        parts = []
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    token = chunk.choices[0].delta.content
+                    parts.append(token)
+                    await self.token_callback(stage, token)
+        except RETRYABLE_ERRORS as error:
+            # the client already got part of the output, a retry would send it again
+            if parts:
+                raise StreamInterrupted(f"The {stage} stream failed after {len(parts)} tokens: {error}") from error
+            raise
+
+        return "".join(parts), usage
+
+
+    async def enhance_prompt(self, input_prompt, **options):
+        """Run the profile pipeline on the input prompt and return the advanced prompt
+        (profile options, e.g. perform_eval=True for the 8-stage profile, are part of the memoization key)"""
+        # the cost budget of the request: capped per request and by what its tenant has left
+        if self.cost_ledger is not None:
+            self.cost_limit = self.cost_ledger.budget_for(self.tenant)
+        
+        status = "failed"
+        try:
+            output_prompt = await self.enhance(input_prompt, options)
+            status = "succeeded"
+            return output_prompt
+        except BudgetExceeded:
+            status = "aborted"
+            raise
+        finally:
+            if self.cost_ledger is None:
+                pass
+            elif self.pipeline_task is not None and not self.pipeline_task.done():
+                # the leader went away (e.g. a closed stream) while the shared pipeline keeps running and spending on this enhancer:
+                # its cost is recorded once the pipeline ends
+                self.pipeline_task.add_done_callback(lambda task: self.cost_ledger.record(self, pipeline_status(task)))
+            else:
+                self.cost_ledger.record(self, status)
+
+
+    async def enhance(self, input_prompt, options):
+        """Return the memoized advanced prompt of the input prompt, or join or run its pipeline"""
+        with self.telemetry.span("enhance_prompt", profile=self.profile.name, model=self.model) as span:
+            start_time = time.perf_counter()
+            
+            # short-circuiting the whole pipeline if this prompt was already enhanced
+            stage_skipping = self.stage_classifier.signature() if self.stage_classifier is not None else None
+            routing = self.model_router.signature() if self.model_router is not None else None
+            budgets = self.stage_budgets.signature() if self.stage_budgets is not None else None
+            settings = dict(tools_dict=str(self.tools_dict), temperature=self.temperature, stage_skipping=stage_skipping, routing=routing, budgets=budgets,
+                            **options)
+            pipeline_key = make_pipeline_key(input_prompt, self.model, self.profile.version, **settings)
+            # what a near-duplicate must share besides a close wording: the same pipeline settings
+            scope_key = make_pipeline_key("", self.model, self.profile.version, **settings)
+            if self.pipeline_cache is not None:
+                memoized = await self.pipeline_cache.get(pipeline_key)
+                self.telemetry.observe_pipeline_cache(self.profile.name, self.model, memoized is not None)
+                span.set_attribute("pipeline_cache_hit", memoized is not None)
+                # else, the result of a near-duplicate prompt already enhanced
+                if memoized is None and self.semantic_cache is not None:
+                    match = await self.semantic_cache.lookup(input_prompt, scope_key)
+                    self.telemetry.observe_semantic_cache(match is not None)
+                    if match is not None:
+                        matched_key, similarity = match
+                        memoized = await self.pipeline_cache.get(matched_key)
+                        if memoized is not None:
+                            self.semantic_similarity = similarity
+                            span.set_attribute("semantic_similarity", similarity)
+                if memoized is not None:
+                    self.pipeline_cache_hit = True
+                    self.components = memoized["components"]
+                    if self.token_callback is not None:
+                        await self.token_callback("pipeline_cache", memoized["advanced_prompt"])
+                    return memoized["advanced_prompt"]
+            
+            # an identical pipeline already in flight is joined instead of run a second time; under a cost budget,
+            # only the requests of the same tenant with the same budget share one (its aborts and downgrades are theirs)
+            if self.inflight_pipelines is not None:
+                flight_key = pipeline_key if self.cost_limit is None else make_pipeline_key(
+                    input_prompt, self.model, self.profile.version, pipeline_key=pipeline_key, tenant=self.tenant, cost_limit=self.cost_limit)
+                (output_prompt, components), shared = await self.inflight_pipelines.do(
+                    flight_key, lambda: self.lead_pipeline(input_prompt, options, pipeline_key, scope_key))
+            else:
+                (output_prompt, components), shared = await self.run_pipeline(input_prompt, options, pipeline_key, scope_key), False
+            
+            self.components = components
+            if shared:
+                self.pipeline_coalesced = True
+                self.telemetry.observe_coalesced("pipeline")
+                span.set_attribute("coalesced", True)
+                if self.token_callback is not None:
+                    await self.token_callback("coalesced", output_prompt)
+            else:
+                self.telemetry.observe_request(self.profile.name, self.model, time.perf_counter() - start_time, self.stage_timings)
+                span.set_attribute("prompt_tokens", self.prompt_tokens)
+                span.set_attribute("completion_tokens", self.completion_tokens)
+            
+            return output_prompt
+
+
+    async def lead_pipeline(self, input_prompt, options, pipeline_key, scope_key):
+        """Run the pipeline shared with the coalesced requests, in its own task"""
+        self.pipeline_task = asyncio.current_task()
+        return await self.run_pipeline(input_prompt, options, pipeline_key, scope_key)
+
+
+    async def run_pipeline(self, input_prompt, options, pipeline_key, scope_key):
+        """Run the stages and the assembly of the profile, memoize the result and return (advanced_prompt, components)"""
+        stages = self.profile.build_stages(self, options)
+        
+        # the stages the classifier finds not worth calling are replaced by their empty output (the evaluation, which only runs
+        # when perform_eval asks for it, is never skipped)
+        if self.stage_classifier is not None:
+            self.skipped_stages = self.stage_classifier.decide(self.profile, [stage.name for stage in stages], self.model, input_prompt, self.tools_dict)
+            stages = [self.profile.skip_stage(stage) if stage.name in self.skipped_stages else stage for stage in stages]
+            for stage, decision in self.skipped_stages.items():
+                self.telemetry.observe_skipped_stage(self.profile.name, stage, decision["tokens_saved"])
+        
+        # the stages already run on the exact same inputs reuse their stored output, so an edited prompt only recomputes
+        # the stages downstream of what actually changed
+        if self.stage_cache is not None:
+            routing = self.model_router.signature() if self.model_router is not None else None
+            budgets = self.stage_budgets.signature() if self.stage_budgets is not None else None
+            settings = dict(model=self.model, temperature=self.temperature, routing=routing, budgets=budgets)
+            stages = [
+                stage if stage.name in self.skipped_stages else self.reusable(stage, {**settings, **self.profile.stage_settings(self, stage.name, options)})
+                for stage in stages
+            ]
+        
+        # each stage runs in its own span, nested under the request one
+        stages = [
+            Stage(stage.name, self.telemetry.traced(stage.name, stage.func, profile=self.profile.name, model=self.model), stage.inputs)
+            for stage in stages
+        ]
+        scheduler = StageScheduler(stages, budget=self.request_budget, on_stage_done=self.stage_callback)
+        results, self.stage_timings = await scheduler.run(input_prompt=input_prompt)
+        
+        output_prompt, components = await self.profile.assemble(self, results, options)
+        
+        # a pipeline downgraded to stay within its budget is not the one the key stands for
+        if self.pipeline_cache is not None and not self.budget_downgrades:
+            await self.pipeline_cache.set(pipeline_key, {"advanced_prompt": output_prompt, "components": components})
+            if self.semantic_cache is not None:
+                await self.semantic_cache.add(input_prompt, scope_key, pipeline_key)
+        
+        return output_prompt, components
+
+
+    def reusable(self, stage, settings):
+        """Wrap a stage so that its output is served from the stage cache when it already ran on the exact same inputs"""
+        async def run(*values):
+            key = make_stage_key(self.profile.version, stage.name, values, **settings)
+            stored = await self.stage_cache.get(key)
+            if stored is not None:
+                self.reused_stages[stage.name] = {"tokens_saved": stored["tokens"], "cost_saved": stored["cost"]}
+                self.telemetry.observe_reused_stage(self.profile.name, stage.name, stored["tokens"])
+                if self.token_callback is not None:
+                    await self.token_callback(stage.name, stored["output"])
+                return stored["output"]
+            
+            output = await stage.func(*values)
+            # an output downgraded to stay within the cost budget is not the one the key stands for
+            if stage.name not in self.budget_downgrades:
+                usage = self.stage_usage.get(stage.name, {})
+                await self.stage_cache.set(key, {
+                    "output": output,
+                    "tokens": usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0),
+                    "cost": usage.get("cost", 0.0),
+                })
+            return output
+        return Stage(stage.name, run, stage.inputs)
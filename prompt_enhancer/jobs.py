@@ -0,0 +1,356 @@
+# Importing dependencies
+import os
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import socket
+import sqlite3
+import ipaddress
+import httpx
+from urllib.parse import urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+# Fields of a job record
+JOB_FIELDS = ("id", "status", "request", "webhook_url", "stages", "result", "error", "webhook", "created_at", "started_at", "finished_at", "updated_at")
+JSON_FIELDS = ("request", "stages", "result", "webhook")
+
+
+def new_job(request, webhook_url=None):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": "queued", # queued -> running -> succeeded | failed
+        "request": request,
+        "webhook_url": webhook_url,
+        "stages": {}, # per-stage partial results, filled in as the stages finish
+        "result": None,
+        "error": None,
+        "webhook": None, # delivery report of the completion callback
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "updated_at": now,
+    }
+
+
+# Defining the base class of the job stores
+class JobStore:
+    async def create(self, job):
+        raise NotImplementedError
+
+    async def get(self, job_id):
+        raise NotImplementedError
+
+    async def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    async def claim(self, job_id):
+        """Move a queued job to running, return False if another worker got it first"""
+        raise NotImplementedError
+
+    async def recoverable(self, stale_after):
+        """Ids of the jobs to (re)run: queued ones, and running ones not updated for `stale_after` seconds"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+# Defining the in-process job store (lost on restart, for development)
+class MemoryJobStore(JobStore):
+    def __init__(self):
+        self.jobs = {}
+
+    async def create(self, job):
+        self.jobs[job["id"]] = dict(job)
+
+    async def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update(self, job_id, **fields):
+        self.jobs[job_id].update(fields, updated_at=time.time())
+
+    async def claim(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] != "queued":
+            return False
+        job.update(status="running", started_at=time.time(), updated_at=time.time())
+        return True
+
+    async def recoverable(self, stale_after):
+        now = time.time()
+        return [job["id"] for job in self.jobs.values()
+                if job["status"] == "queued" or (job["status"] == "running" and now - job["updated_at"] > stale_after)]
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+
+# Defining the SQLite job store, shared by the workers of a container and kept across restarts
+class SQLiteJobStore(JobStore):
+    def __init__(self, path="jobs.sqlite"):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT, webhook_url TEXT, stages TEXT, result TEXT, error TEXT, "
+                "webhook TEXT, created_at REAL, started_at REAL, finished_at REAL, updated_at REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _connect(self):
+        # a short-lived connection per operation keeps the store safe across threads and processes
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _encode(self, fields):
+        return {key: json.dumps(value, ensure_ascii=False) if key in JSON_FIELDS and value is not None else value for key, value in fields.items()}
+
+    def _decode(self, row):
+        job = dict(zip(JOB_FIELDS, row))
+        for key in JSON_FIELDS:
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def _create_sync(self, job):
+        fields = self._encode(job)
+        with self._connect() as connection:
+            connection.execute(f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                               [fields[key] for key in JOB_FIELDS])
+
+    def _get_sync(self, job_id):
+        with self._connect() as connection:
+            row = connection.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def _update_sync(self, job_id, fields):
+        fields = self._encode({**fields, "updated_at": time.time()})
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?", [*fields.values(), job_id])
+
+    def _claim_sync(self, job_id):
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute("UPDATE jobs SET status = 'running', started_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                                        (now, now, job_id))
+        return cursor.rowcount == 1
+
+    def _recoverable_sync(self, stale_after):
+        now = time.time()
+        with self._connect() as connection:
+            # stale running jobs (their worker died) are put back in the queue first
+            connection.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?", (now - stale_after,))
+            rows = connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+
+    async def create(self, job):
+        await asyncio.to_thread(self._create_sync, job)
+
+    async def get(self, job_id):
+        return await asyncio.to_thread(self._get_sync, job_id)
+
+    async def update(self, job_id, **fields):
+        await asyncio.to_thread(self._update_sync, job_id, fields)
+
+    async def claim(self, job_id):
+        return await asyncio.to_thread(self._claim_sync, job_id)
+
+    async def recoverable(self, stale_after):
+        return await asyncio.to_thread(self._recoverable_sync, stale_after)
+
+    def stats(self):
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def job_store_from_env():
+    """Build the job store selected by JOB_STORE_BACKEND (sqlite | memory) and JOB_STORE_PATH"""
+    backend = os.getenv("JOB_STORE_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteJobStore(os.getenv("JOB_STORE_PATH", "jobs.sqlite"))
+    elif backend == "memory":
+        return MemoryJobStore()
+    else:
+        raise ValueError(f"Unknown JOB_STORE_BACKEND: {backend}")
+
+
+def sign_payload(body, secret):
+    """HMAC-SHA256 signature of a webhook body, so the receiver can check it comes from this service"""
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+async def check_webhook_url(url, allowed_hosts=None):
+    """Raise ValueError unless the webhook URL is an http(s) URL of an allowed host, or, without an allow-list,
+    of a host resolving only to public addresses (no loopback, private, link-local, ... target for the server to POST to)"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("The webhook URL must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f"The webhook host {host} is not allowed")
+        return
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as error:
+        raise ValueError(f"The webhook host {host} does not resolve: {error}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            raise ValueError(f"The webhook host {host} resolves to a non-public address ({address})")
+
+
+# Defining the JobRunner class: a pool of in-process workers running the queued jobs through a handler
+# coroutine function (job, on_stage) -> result, then calling the webhook of the job
+class JobRunner:
+    def __init__(self, store, handler, workers=4, max_queue=1000, stale_after=600.0, webhook_secret=None, webhook_attempts=3,
+                 webhook_allowed_hosts=None):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stale_after = stale_after # seconds without progress after which a running job is considered orphaned
+        self.webhook_secret = webhook_secret
+        self.webhook_attempts = webhook_attempts
+        self.webhook_allowed_hosts = {host.lower() for host in webhook_allowed_hosts or ()} # empty: any public host
+        self.queue = None
+        self.tasks = []
+        self.running = set()
+        self.http_client = None
+
+
+    @classmethod
+    def from_env(cls, store, handler):
+        """Build a runner from the JOB_* environment variables"""
+        return cls(
+            store,
+            handler,
+            workers=int(os.getenv("JOB_WORKERS", 4)),
+            max_queue=int(os.getenv("JOB_MAX_QUEUE", 1000)),
+            stale_after=float(os.getenv("JOB_STALE_AFTER", 600.0)),
+            webhook_secret=os.getenv("JOB_WEBHOOK_SECRET") or None,
+            webhook_attempts=int(os.getenv("JOB_WEBHOOK_ATTEMPTS", 3)),
+            webhook_allowed_hosts=[host.strip() for host in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()],
+        )
+
+
+    async def start(self):
+        """Start the workers, re-queuing the jobs a previous process left unfinished"""
+        self.queue = asyncio.Queue()
+        self.http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+        for job_id in await self.store.recoverable(self.stale_after):
+            self.queue.put_nowait(job_id)
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # the interrupted jobs are run again by the next process
+        for job_id in self.running:
+            await self.store.update(job_id, status="queued")
+        self.running.clear()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+
+    def full(self):
+        # not started yet: nothing is queued
+        return self.queue is not None and self.queue.qsize() >= self.max_queue
+
+
+    async def submit(self, request, webhook_url=None):
+        """Store a new job and queue it, returning its record (ValueError if the webhook URL is not allowed)"""
+        if self.queue is None:
+            raise RuntimeError("The job runner is not started, call start() first")
+        if webhook_url is not None:
+            await check_webhook_url(webhook_url, self.webhook_allowed_hosts)
+        job = new_job(request, webhook_url)
+        await self.store.create(job)
+        self.queue.put_nowait(job["id"])
+        return job
+
+
+    async def worker(self):
+        while True:
+            job_id = await self.queue.get()
+            # another worker (or process sharing the store) may have taken it already
+            if not await self.store.claim(job_id):
+                continue
+            self.running.add(job_id)
+            try:
+                await self.run(job_id)
+            except Exception:
+                # e.g. a locked store: the worker stays in the pool, and the job is run again once stale (see recoverable)
+                logger.exception(f"Worker failed on job {job_id}")
+            finally:
+                self.running.discard(job_id)
+
+
+    async def run(self, job_id):
+        job = await self.store.get(job_id)
+        stages = {}
+
+        async def on_stage(stage, output, timing):
+            stages[stage] = {"output": output, **timing}
+            await self.store.update(job_id, stages=stages)
+
+        try:
+            result = await self.handler(job, on_stage)
+        except Exception as error:
+            logger.exception(f"Job {job_id} failed")
+            await self.store.update(job_id, status="failed", error=f"{type(error).__name__}: {error}", finished_at=time.time())
+        else:
+            await self.store.update(job_id, status="succeeded", result=result, finished_at=time.time())
+
+        if job["webhook_url"]:
+            await self.store.update(job_id, webhook=await self.call_webhook(await self.store.get(job_id)))
+
+
+    async def call_webhook(self, job):
+        """POST the finished job to its webhook, retrying with backoff, and return the delivery report"""
+        body = json.dumps({key: job[key] for key in JOB_FIELDS if key != "webhook"}, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers["X-Webhook-Signature"] = sign_payload(body, self.webhook_secret)
+
+        # checked again at delivery, as the host may resolve to another address by now
+        try:
+            await check_webhook_url(job["webhook_url"], self.webhook_allowed_hosts)
+        except ValueError as error:
+            logger.warning(f"Webhook of job {job['id']} rejected: {error}")
+            return {"status": "rejected", "attempts": 0, "error": str(error)}
+
+        error = None
+        for attempt in range(1, self.webhook_attempts + 1):
+            try:
+                response = await self.http_client.post(job["webhook_url"], content=body, headers=headers)
+                if response.status_code < 300:
+                    return {"status": "delivered", "attempts": attempt, "status_code": response.status_code}
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as exception:
+                error = f"{type(exception).__name__}: {exception}"
+            if attempt < self.webhook_attempts:
+                await asyncio.sleep(2 ** (attempt - 1))
+        logger.warning(f"Webhook of job {job['id']} failed: {error}")
+        return {"status": "failed", "attempts": self.webhook_attempts, "error": error}
+
+
+    def stats(self):
+        return {"workers": self.workers, "queued": self.queue.qsize() if self.queue is not None else 0, "running": len(self.running),
+                "jobs": self.store.stats() if self.store is not None else {}}
@@ -0,0 +1,197 @@
+# Importing dependencies
+import os
+import json
+import time
+import uuid
+import asyncio
+
+
+# Raised when a request cannot be run within its cost budget: status 429 when the tenant spent its budget of the window,
+# 402 when the request itself would overspend
+class BudgetExceeded(Exception):
+    def __init__(self, status_code, detail, retry_after=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+# Defining the CostLedger class: the cost of every request per stage, model and tenant, kept in memory and
+# appended to a JSONL file periodically, with the budget caps of the requests and tenants. A request reserves its whole budget
+# against its tenant until it is recorded, so concurrent requests of a tenant cannot overspend its cap together.
+# The tenant spends are per process: with several gunicorn workers, the cap applies to each worker (see the README)
+class CostLedger:
+    def __init__(self, path="cost_ledger.jsonl", flush_interval=30.0, max_per_request=None, max_per_tenant=None, tenant_window=86400.0,
+                 action="abort", downgrade_model="gpt-4o-mini", completion_estimate=512):
+        self.path = path # None: the entries are only kept in memory until the next flush
+        self.flush_interval = flush_interval
+        self.max_per_request = max_per_request # dollars, None: no cap
+        self.max_per_tenant = max_per_tenant # dollars per window, None: no cap
+        self.tenant_window = tenant_window
+        self.action = action # what a request about to overspend does: abort, or downgrade to a cheaper model
+        self.downgrade_model = downgrade_model
+        self.completion_estimate = completion_estimate # completion tokens assumed when checking a call against the budget
+        self.entries = [] # not flushed yet
+        self.tenant_spend = {} # tenant -> [start of its current window, dollars spent in it], the idle tenants expired periodically
+        self.tenant_reserved = {} # tenant -> dollars reserved by its requests in flight
+        self.totals = {"requests": 0, "cost": 0.0, "aborted": 0, "downgraded": 0, "tenants": {}, "stages": {}, "models": {}}
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a ledger from the COST_* environment variables"""
+        max_per_request = float(os.getenv("COST_MAX_PER_REQUEST", 0)) or None
+        max_per_tenant = float(os.getenv("COST_MAX_PER_TENANT", 0)) or None
+        return cls(
+            path=os.getenv("COST_LEDGER_PATH", "cost_ledger.jsonl") or None,
+            flush_interval=float(os.getenv("COST_LEDGER_FLUSH_INTERVAL", 30.0)),
+            max_per_request=max_per_request,
+            max_per_tenant=max_per_tenant,
+            tenant_window=float(os.getenv("COST_TENANT_WINDOW", 86400.0)),
+            action=os.getenv("COST_BUDGET_ACTION", "abort").lower(),
+            downgrade_model=os.getenv("COST_DOWNGRADE_MODEL", "gpt-4o-mini"),
+            completion_estimate=int(os.getenv("COST_COMPLETION_ESTIMATE", 512)),
+        )
+
+
+    def spend_of(self, tenant):
+        """The [window start, dollars spent] of a tenant, starting a new window when the previous one is over"""
+        window_start = time.time() // self.tenant_window * self.tenant_window
+        spend = self.tenant_spend.get(tenant)
+        if spend is None or spend[0] != window_start:
+            spend = self.tenant_spend[tenant] = [window_start, 0.0]
+        return spend
+
+
+    def expire_tenants(self):
+        """Forget the tenants without a request in the current window: their spend and their totals (kept in the ledger file)"""
+        window_start = time.time() // self.tenant_window * self.tenant_window
+        for tenant in [tenant for tenant, spend in self.tenant_spend.items() if spend[0] < window_start and tenant not in self.tenant_reserved]:
+            del self.tenant_spend[tenant]
+            self.totals["tenants"].pop(tenant, None)
+
+
+    def available(self, tenant):
+        """Dollars of the tenant budget of the window neither spent nor reserved by its requests in flight"""
+        tenant = tenant or "default"
+        return self.max_per_tenant - self.spend_of(tenant)[1] - self.tenant_reserved.get(tenant, 0.0)
+
+
+    def tenant_exceeded(self, tenant):
+        window_start, spent = self.spend_of(tenant or "default")
+        if spent < self.max_per_tenant:
+            # what is left is held by the requests in flight of the tenant, released as soon as they end
+            return BudgetExceeded(429, f"The cost budget of ${self.max_per_tenant} of this client is held by its requests in flight, retry later",
+                                  retry_after=1)
+        return BudgetExceeded(429, f"The cost budget of ${self.max_per_tenant} of this client is spent, retry later",
+                              retry_after=max(1, int(window_start + self.tenant_window - time.time())))
+
+
+    def check(self, tenant):
+        """Reject right away a tenant that spent (or reserved) its budget of the window"""
+        if self.max_per_tenant is not None and self.available(tenant) <= 0:
+            raise self.tenant_exceeded(tenant)
+
+
+    def overspend(self, tenant, cost_limit, stage):
+        """The error of a request about to overspend: 429 when the tenant budget is what limits it, 402 otherwise"""
+        if self.max_per_tenant is not None and (self.max_per_request is None or cost_limit < self.max_per_request):
+            return self.tenant_exceeded(tenant)
+        return BudgetExceeded(402, f"The request would exceed its cost budget of ${cost_limit:.4f} at the '{stage}' stage")
+
+
+    def budget_for(self, tenant):
+        """Dollars a new request of the tenant may spend, or None if nothing caps it.
+        Under a tenant cap, the budget is reserved until the request is recorded"""
+        self.check(tenant)
+        if self.max_per_tenant is None:
+            return self.max_per_request
+        limit = self.available(tenant)
+        if self.max_per_request is not None:
+            limit = min(limit, self.max_per_request)
+        tenant = tenant or "default"
+        self.tenant_reserved[tenant] = self.tenant_reserved.get(tenant, 0.0) + limit
+        return limit
+
+
+    def release(self, tenant, amount):
+        """Give back the budget a finished request had reserved"""
+        tenant = tenant or "default"
+        reserved = self.tenant_reserved.get(tenant, 0.0) - amount
+        if reserved > 1e-12:
+            self.tenant_reserved[tenant] = reserved
+        else:
+            self.tenant_reserved.pop(tenant, None)
+
+
+    def record(self, enhancer, status="succeeded"):
+        """Add the cost of a finished (or aborted) request"""
+        tenant = enhancer.tenant or "default"
+        entry = {
+            "id": uuid.uuid4().hex,
+            "timestamp": round(time.time(), 3),
+            "tenant": tenant,
+            "profile": enhancer.profile.name,
+            "model": enhancer.model,
+            "status": status,
+            "cost": round(enhancer.cost, 8),
+            "prompt_tokens": enhancer.prompt_tokens,
+            "cached_prompt_tokens": enhancer.cached_prompt_tokens,
+            "completion_tokens": enhancer.completion_tokens,
+            "stages": {stage: round(usage["cost"], 8) for stage, usage in enhancer.stage_usage.items() if usage["cost"]},
+            "models": {model: round(usage["cost"], 8) for model, usage in enhancer.model_usage.items()},
+            "downgraded": sorted(enhancer.budget_downgrades),
+            # a request served by an identical pipeline in flight costs nothing, the shared run is charged to its leader
+            "coalesced": enhancer.pipeline_coalesced,
+        }
+        self.entries.append(entry)
+
+        self.spend_of(tenant)[1] += enhancer.cost
+        if self.max_per_tenant is not None and enhancer.cost_limit is not None:
+            self.release(tenant, enhancer.cost_limit)
+        self.totals["requests"] += 1
+        self.totals["cost"] += enhancer.cost
+        self.totals["aborted"] += status == "aborted"
+        self.totals["downgraded"] += bool(enhancer.budget_downgrades)
+        self.totals["tenants"][tenant] = self.totals["tenants"].get(tenant, 0.0) + enhancer.cost
+        for stage, cost in entry["stages"].items():
+            self.totals["stages"][stage] = self.totals["stages"].get(stage, 0.0) + cost
+        for model, cost in entry["models"].items():
+            self.totals["models"][model] = self.totals["models"].get(model, 0.0) + cost
+        return entry
+
+
+    def flush(self):
+        """Append the pending entries to the ledger file (blocking, run it off the event loop)"""
+        entries, self.entries = self.entries, []
+        if not entries or self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # a single append per flush, so the lines of the workers sharing the file do not interleave
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+
+
+    async def flush_periodically(self):
+        """Flush the ledger every `flush_interval` seconds, expiring the idle tenants, and a last time when cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self.expire_tenants()
+                await asyncio.to_thread(self.flush)
+        except asyncio.CancelledError:
+            self.flush()
+            raise
+
+
+    def stats(self):
+        return {
+            "max_per_request": self.max_per_request,
+            "max_per_tenant": self.max_per_tenant,
+            "reserved": round(sum(self.tenant_reserved.values()), 6),
+            "action": self.action,
+            "pending_entries": len(self.entries),
+            **{key: round(value, 6) if isinstance(value, float) else value for key, value in self.totals.items() if not isinstance(value, dict)},
+            **{key: {name: round(cost, 6) for name, cost in value.items()} for key, value in self.totals.items() if isinstance(value, dict)},
+        }
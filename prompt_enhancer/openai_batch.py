@@ -0,0 +1,165 @@
+# Importing dependencies
+import os
+import json
+import types
+import asyncio
+
+from prompt_enhancer.cache import make_cache_key
+
+
+# Batch statuses after which polling stops
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# Defining the BatchAPIBackend class: an alternative to the direct chat completion call of PromptEnhancer.call_llm,
+# which gathers the stage requests of many pipelines into OpenAI Batch API jobs (half the price, no per-minute rate limits).
+# Every pipeline waits on its own request, so the dependent stages (expand -> decompose) naturally form successive waves.
+class BatchAPIBackend:
+    batch = True # its calls are billed at the Batch API discount (see PricingRegistry.cost)
+
+    def __init__(self, client, collect_window=2.0, max_requests=50_000, poll_interval=30.0,
+                 completion_window="24h", work_dir="batch_jobs"):
+        self.client = client
+        self.collect_window = collect_window # seconds without new request before a wave is submitted
+        self.max_requests = max_requests # Batch API limit of requests per file
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.work_dir = work_dir
+        self.pending = {} # custom_id -> (body, [futures])
+        self.last_arrival = 0.0
+        self.flush_task = None
+        self.waves = []
+
+
+    async def complete(self, model, messages, temperature, response_format=None, max_tokens=None):
+        """Queue a chat completion in the next wave and return (content, usage) once its batch is done"""
+        loop = asyncio.get_running_loop()
+        body = {"model": model, "messages": messages, "temperature": temperature}
+        if response_format is not None:
+            body["response_format"] = response_format
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+        # content-addressed ids: identical requests of a wave are sent once, and outputs can be replayed across runs
+        custom_id = make_cache_key(model, messages[0]["content"], messages[-1]["content"], temperature, response_format, max_tokens)
+
+        future = loop.create_future()
+        if custom_id in self.pending:
+            self.pending[custom_id][1].append(future)
+        else:
+            self.pending[custom_id] = (body, [future])
+        self.last_arrival = loop.time()
+
+        if len(self.pending) >= self.max_requests:
+            self.submit_wave()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_when_idle())
+
+        return await future
+
+
+    async def flush_when_idle(self):
+        """Submit the pending requests once no new request arrived for collect_window seconds"""
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            idle_time = loop.time() - self.last_arrival
+            if idle_time >= self.collect_window:
+                self.flush_task = None
+                self.submit_wave()
+                return
+            await asyncio.sleep(self.collect_window - idle_time)
+        self.flush_task = None
+
+
+    def submit_wave(self):
+        """Move the pending requests into a new batch job running in the background"""
+        requests, self.pending = self.pending, {}
+        if requests:
+            self.waves.append(asyncio.create_task(self.run_wave(len(self.waves) + 1, requests)))
+
+
+    async def run_wave(self, wave_number, requests):
+        """Upload, submit and poll one batch job, then resolve the futures of its requests"""
+        try:
+            results = await self.run_batch(wave_number, {custom_id: body for custom_id, (body, _) in requests.items()})
+        except Exception as error:
+            for _, futures in requests.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+
+        for custom_id, (_, futures) in requests.items():
+            result = results.get(custom_id)
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                elif result is None:
+                    future.set_exception(RuntimeError(f"Batch request {custom_id} has no output"))
+                else:
+                    future.set_result(result)
+
+
+    async def run_batch(self, wave_number, bodies):
+        """Write the Batch API JSONL file, submit it, wait for it and parse its output"""
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}, ensure_ascii=False)
+            for custom_id, body in bodies.items()
+        ]
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+
+        # keeping a copy of each wave for inspection and manual re-submission
+        if self.work_dir:
+            await asyncio.to_thread(write_file, os.path.join(self.work_dir, f"wave_{wave_number}_input.jsonl"), content)
+
+        input_file = await self.client.files.create(file=(f"wave_{wave_number}.jsonl", content), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window,
+        )
+
+        while batch.status not in FINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} (wave {wave_number}) ended with status '{batch.status}'")
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            output = (await self.client.files.content(file_id)).text
+            if self.work_dir:
+                await asyncio.to_thread(write_file, os.path.join(self.work_dir, f"wave_{wave_number}_{file_id}.jsonl"), output.encode("utf-8"))
+            for line in output.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    results[record["custom_id"]] = parse_batch_result(record)
+
+        return results
+
+
+def write_file(path, content):
+    """Write bytes to a file of the work directory (blocking, run it off the event loop)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def parse_batch_result(record):
+    """Turn one line of a batch output file into (content, usage), or an exception for failed requests"""
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return RuntimeError(f"Batch request {record['custom_id']} failed: {record.get('error') or response.get('body')}")
+
+    body = response["body"]
+    usage = types.SimpleNamespace(
+        prompt_tokens=body["usage"]["prompt_tokens"],
+        completion_tokens=body["usage"]["completion_tokens"],
+        prompt_tokens_details=body["usage"].get("prompt_tokens_details"),
+        batch=True, # billed at the Batch API discount
+    )
+    return body["choices"][0]["message"]["content"], usage
@@ -0,0 +1,69 @@
+# Importing dependencies
+import os
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# Prices in dollars per million tokens: (input, cached input, output)
+DEFAULT_PRICES = {
+    "gpt-4o": (5.0, 2.5, 15.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+}
+
+
+# Defining the PricingRegistry class: the one place the token prices live, used for the cost of every LLM call
+class PricingRegistry:
+    def __init__(self, prices=None, default=None, batch_discount=0.5):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self.default = default # prices of the unknown models, None: they are counted as free (and reported)
+        self.batch_discount = batch_discount # share of the price billed for the calls made through the Batch API
+        self.unpriced = set()
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a registry from PRICING_FILE (JSON {model: [input, cached input, output]} per million tokens, merged over the defaults)
+        PRICING_DEFAULT_MODEL (model whose prices apply to the unknown ones) and PRICING_BATCH_DISCOUNT (share billed for Batch API calls)"""
+        prices = dict(DEFAULT_PRICES)
+        path = os.getenv("PRICING_FILE")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                prices.update({model: tuple(values) for model, values in json.load(f).items()})
+        default_model = os.getenv("PRICING_DEFAULT_MODEL")
+        return cls(prices, default=prices.get(default_model) if default_model else None,
+                   batch_discount=float(os.getenv("PRICING_BATCH_DISCOUNT", 0.5)))
+
+
+    def price(self, model):
+        """(input, cached input, output) prices of the model, dated snapshots (gpt-4o-mini-2024-07-18) using their base model ones"""
+        if model in self.prices:
+            return self.prices[model]
+        bases = [name for name in self.prices if model.startswith(name + "-")]
+        if bases:
+            return self.prices[max(bases, key=len)]
+        if model not in self.unpriced:
+            self.unpriced.add(model)
+            logger.warning(f"No price for the model '{model}', " + ("using the default prices" if self.default else "its calls are counted as free"))
+        return self.default
+
+
+    def cost(self, model, prompt_tokens, completion_tokens, cached_prompt_tokens=0, batch=False):
+        """Dollar cost of a call, the prompt tokens served from the provider-side cache being billed at the cached input price,
+        and the calls made through the Batch API at the batch discount"""
+        price = self.price(model)
+        if price is None:
+            return 0.0
+        input_price, cached_input_price, output_price = price
+        cost = ((prompt_tokens - cached_prompt_tokens) * input_price + cached_prompt_tokens * cached_input_price + completion_tokens * output_price) / 10**6
+        return cost * self.batch_discount if batch else cost
+
+
+    def stats(self):
+        return {
+            "prices": {model: dict(zip(("input", "cached_input", "output"), price)) for model, price in self.prices.items()},
+            "unpriced_models": sorted(self.unpriced),
+            "batch_discount": self.batch_discount,
+        }
@@ -0,0 +1,17 @@
+# Importing dependencies
+from prompt_enhancer.profiles.base import PipelineProfile
+from prompt_enhancer.profiles.three_stage import ThreeStageProfile
+from prompt_enhancer.profiles.eight_stage import EightStageProfile
+
+
+# The available pipeline profiles, by name
+PROFILES = {profile.name: profile for profile in (ThreeStageProfile(), EightStageProfile())}
+
+
+def get_profile(profile):
+    """Return the profile with the given name (profile instances are returned as is)"""
+    if isinstance(profile, PipelineProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown pipeline profile '{profile}', choose one of {list(PROFILES)}")
+    return PROFILES[profile]
@@ -0,0 +1,52 @@
+# Importing dependencies
+from prompt_enhancer.scheduler import Stage
+
+
+# Defining the base class of the pipeline profiles: the stage graph, prompts and assembly of one pipeline design,
+# run by the shared PromptEnhancer (client, caches, rate limiter, retries and scheduler)
+class PipelineProfile:
+    name = None
+    # bump the version whenever a prompt or the assembly changes, so memoized results are not reused
+    version = None
+    # system message sent with every stage call (also part of the response cache key)
+    system_message = None
+    templates = None
+    # LocalAssembler turning the stage outputs into the advanced prompt without an LLM call (see assembly.py)
+    assembler = None
+    # stages the StageClassifier may skip: stage name -> (kind of stage, template it renders)
+    skippable = {}
+    # stages whose output may rightly be empty (nothing to suggest), not a failure for the cascade check
+    optional_stages = ()
+    # stages reading the tools_dict of the enhancer besides their declared inputs (part of their stage cache key)
+    tools_stages = ()
+
+
+    def build_stages(self, enhancer, options):
+        """Return the scheduler stages of the pipeline, the initial value being `input_prompt`"""
+        raise NotImplementedError
+
+
+    def stage_settings(self, enhancer, stage, options):
+        """Settings shaping the output of a stage besides its declared inputs (part of its stage cache key)"""
+        return {"tools_dict": str(enhancer.tools_dict)} if stage in self.tools_stages else {}
+
+
+    def skip_stage(self, stage):
+        """Stand-in of a skipped stage, returning an empty output without calling the LLM"""
+        async def skipped(*args):
+            return ""
+        return Stage(stage.name, skipped, stage.inputs)
+
+
+    async def assemble(self, enhancer, results, options):
+        """Turn the stage outputs into (advanced_prompt, components)"""
+        raise NotImplementedError
+
+
+    async def call_template(self, enhancer, name, response_format=None, **values):
+        """Render a stage prompt from the profile templates and send it through the enhancer
+        (response_format: JSON schema of a structured-output stage, see structured.py)"""
+        # the values forwarded from the earlier stages are trimmed to the input budget of the stage
+        values = enhancer.fit_budget(values)
+        prompt = self.templates.render(name, **values)
+        return await enhancer.call_llm(prompt, template=name, response_format=response_format)
@@ -0,0 +1,356 @@
+# Importing dependencies
+from prompt_enhancer.scheduler import Stage
+from prompt_enhancer.templates import PromptTemplate, TemplateRegistry
+from prompt_enhancer.structured import ReferenceSuggestions, ToolSuggestions, response_format, parse_output, empty_output
+from prompt_enhancer.structured import render_references, render_tools
+from prompt_enhancer.assembly import LocalAssembler, Section
+from prompt_enhancer.profiles.base import PipelineProfile
+
+
+# Stage prompts (the static parts are plain text, only the dynamic parts are formatted)
+
+ANALYZE_INPUT = PromptTemplate(
+    name="analyze_input",
+    static="""\
+Analyze the following {prompt} and generate brief answers to these key information that will be beneficial to enhance the prompt:
+1. Main topic of the prompt
+2. The most convenient output format for the prompt
+3. Specific requirements for the prompt, if necessary
+4. Suggested strategies to enhance the prompt for better output result
+
+Your output will be only the result of the information required above in text format.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {basic_prompt}
+""",
+)
+
+
+EXPAND_INSTRUCTIONS = PromptTemplate(
+    name="expand_instructions",
+    static="""\
+Based on the given {analysis}, expand the following {basic_prompt} following these instructions:
+1. Add relevant details to clarify the prompt only if necessary
+2. Suggest an appropriate persona for the AI Model
+3. Generate 1-2 related examples to guide the output generation
+4. Suggest an optimal output length
+5. Use delimiter, { }, to clearly indicate the parts of the input that should be concidered as variables
+
+Your output will be only the result of the information required above in text format and not a dictionary format.
+Make sure the generated output maintains the sructure of a prompt for an AI Model.
+Make sure the generated output maintains the goal and context of the {basic_prompt}.
+Do not include the instructions headers in the generated answer.
+Do not return a general explanation of the generation process.
+Do not generate an answer for the prompt.
+""",
+    dynamic="""\
+
+{{analysis}}:
+{analysis}
+
+{{basic_prompt}}: {basic_prompt}
+""",
+)
+
+
+DECOMPOSE_TASK = PromptTemplate(
+    name="decompose_task",
+    static="""\
+Break down the following {prompt} into subtasks for better output generation and follow these instructions:
+1. Identify main task components and their corresponding subtasks
+2. Create specific instructions for each subtask
+3. Define success criteria for each subtask
+
+Your output will be only the result of the task required above in text format.
+Follow the (Main-task/ Sub-task/ Instructions/ Success-criteria) format.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {expanded_prompt}
+""",
+)
+
+
+ADD_REASONING = PromptTemplate(
+    name="add_reasoning",
+    static="""\
+Based on the following {prompt}, suggest instructions in order to guide the AI Model to:
+1. Show reasoning through using the chain-of-thought process
+2. Use inner-monologue only if it is recommended to hide parts of the thought process
+3. Self-review and check for missed information
+
+Your output will be only the set of instructions in text format.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {expanded_prompt}
+""",
+)
+
+
+CREATE_EVAL_CRITERIA = PromptTemplate(
+    name="create_eval_criteria",
+    static="""\
+Create evaluation criteria for assessing the quality of the output for this {prompt}:
+1. List 1-3 specific criteria
+2. Briefly explain how to measure each criterion
+
+Your output will be only the result of the information required above in text format.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {expanded_prompt}
+""",
+)
+
+
+SUGGEST_REFERENCES = PromptTemplate(
+    name="suggest_references",
+    static="""\
+For the following {prompt}, suggest relevant reference texts or sources that could help enhance the output of the prompt if possible,
+and if not, do not return anything:
+1. List 0-3 potential references
+2. Briefly explain how to incorporate these references to enhance the prompt
+
+Your output will be only the result of the information required above, as a "references" list of objects with the "title" of a reference,
+and the explanation of its "incorporation". If no references will be suggested, return an empty list.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {expanded_prompt}
+""",
+)
+
+
+SUGGEST_TOOLS = PromptTemplate(
+    name="suggest_tools",
+    static="""\
+For the following {prompt}, suggest relevant external tools from the provided {tools_dict} that can enhance the prompt for better execution.
+If the prompt does not require tools for its output, it is highly-recommended to not return any tools:
+1. List 0-3 potential tools/APIs
+2. Briefly explain how to use these tools within the prompt
+
+Your output will be only the result of the information required above, as a "tools" list of objects with the "name" of a suggested tool,
+and its "usage" with the prompt. If no tools will be suggested, return an empty list.
+Do not return a general explanation of the generation process.
+""",
+    dynamic="""\
+
+{{prompt}}: {expanded_prompt}
+{{tools_dict}}: {tools_dict}
+""",
+)
+
+
+ASSEMBLE_PROMPT = PromptTemplate(
+    name="assemble_prompt",
+    static="""\
+Assemble all the following {components} into a cohesive, and well-structured advanced prompt and do not generate a response for the prompt.
+Make sure to combine the {reasoning_process} and {subtasks} sections into one section called {reasoning_process_and_subtasks}.
+
+Your output will be only the result of the tasks required above,
+which is an advanced coherent prompt generated from the combination of the given components sections.
+Keep only the {reasoning_process_and_subtasks} section instead of the {reasoning_process} and {subtasks} sections in the output.
+Ensure that the assembled prompt maintains the delimiter structure of variables and the suggested persona.
+Make sure that each sub-section of the prompt is clear and has a title.
+The output is in plain text format and not a dictionary format.
+Do not return a general explanation of the generation process.
+Take the return-to-line symbol into consideration.
+Remove the "**Expanded Prompt**" header.
+""",
+    dynamic="""\
+
+{{components}}:
+{components}
+""",
+)
+
+
+AUTO_EVAL = PromptTemplate(
+    name="auto_eval",
+    static="""\
+Perform any minor adjustments on the given {prompt} based on how likely its output will satisfy these {evaluation_criteria}.
+Only perform minor changes if it is necessary and return the updated prompt as output.
+If no changes are necessary, do not change the prompt and return it as output.
+
+Your output will be only the result of the tasks required above, which is an updated version of the {prompt}, in text format.
+Make sure to keep the {evaluation_criteria} in the output prompt.
+Do not return a general explanation of the generation process.
+Make sure there is no generated answer for the prompt.
+Make sure to maintain the stucture of the {prompt}.
+""",
+    dynamic="""\
+
+{{prompt}}: {assembled_prompt}
+{{evaluation_criteria}}: {evaluation_criteria}
+""",
+)
+
+
+# The registry of the stage prompts, built once when the module is imported
+TEMPLATES = TemplateRegistry([
+    ANALYZE_INPUT,
+    EXPAND_INSTRUCTIONS,
+    DECOMPOSE_TASK,
+    ADD_REASONING,
+    CREATE_EVAL_CRITERIA,
+    SUGGEST_REFERENCES,
+    SUGGEST_TOOLS,
+    ASSEMBLE_PROMPT,
+    AUTO_EVAL,
+])
+
+
+# Stage outputs handed to the assembly, in the order they appear in the components dictionary
+COMPONENT_NAMES = ["expanded_prompt", "references", "subtasks", "tools", "reasoning_process", "evaluation_criteria"]
+# Typed stage outputs (structured outputs), rendered as text sections before the assembly
+STRUCTURED_COMPONENTS = {
+    "references": (ReferenceSuggestions, render_references),
+    "tools": (ToolSuggestions, render_tools),
+}
+# Assemblers of the advanced prompt: local (default, no LLM call) or llm (the assemble_prompt stage prompt, opt-in)
+ASSEMBLERS = ("local", "llm")
+
+
+# Defining the 8-stage profile: analysis and expansion of the input prompt, five parallel stages on the expanded prompt
+# (the references and tools being structured outputs), the assembly of all the components (local, or an LLM call with assembler="llm"),
+# and an optional auto-evaluation (perform_eval=True)
+class EightStageProfile(PipelineProfile):
+    name = "8-stage"
+    version = "8-stage-v4"
+    system_message = (
+        "You are an assistant designed to provide concise and specific information based solely on the given tasks.\
+                     Do not include any additional information, explanations, or context beyond what is explicitly requested."
+    )
+    templates = TEMPLATES
+    # the sections the LLM assembly was asked for, the reasoning process and subtasks merged into one
+    assembler = LocalAssembler([
+        Section(None, ["expanded_prompt"]),
+        Section("Reasoning Process and Subtasks", ["reasoning_process", "subtasks"]),
+        Section("References", ["references"]),
+        Section("Tools", ["tools"]),
+        Section("Evaluation Criteria", ["evaluation_criteria"]),
+    ], renderers={name: render for name, (_, render) in STRUCTURED_COMPONENTS.items()})
+    skippable = {
+        "references": ("references", "suggest_references"),
+        "tools": ("tools", "suggest_tools"),
+    }
+    optional_stages = ("references", "tools")
+    tools_stages = ("tools",)
+
+
+    def build_stages(self, enhancer, options):
+        tools_dict = enhancer.tools_dict
+        assembler = self.assembler_of(options)
+        if assembler == "llm":
+            assemble = lambda components: self.assemble_prompt(enhancer, components)
+        else:
+            assemble = self.assemble_locally
+        
+        stages = [
+            Stage("analysis", lambda prompt: self.analyze_input(enhancer, prompt), inputs=["input_prompt"]),
+            Stage("expanded_prompt", lambda prompt, analysis: self.expand_instructions(enhancer, prompt, analysis), inputs=["input_prompt", "analysis"]),
+            Stage("evaluation_criteria", lambda expanded: self.create_eval_criteria(enhancer, expanded), inputs=["expanded_prompt"]),
+            Stage("references", lambda expanded: self.suggest_references(enhancer, expanded), inputs=["expanded_prompt"]),
+            Stage("subtasks", lambda expanded: self.decompose_task(enhancer, expanded), inputs=["expanded_prompt"]),
+            Stage("reasoning_process", lambda expanded: self.add_reasoning(enhancer, expanded), inputs=["expanded_prompt"]),
+            Stage("tools", lambda expanded: self.suggest_tools(enhancer, expanded, tools_dict), inputs=["expanded_prompt"]),
+            Stage("assembled_prompt", lambda *values: assemble(self.components(*values)), inputs=COMPONENT_NAMES),
+        ]
+        if options.get("perform_eval", False):
+            stages.append(Stage("evaluated_prompt", lambda assembled, criteria: self.auto_eval(enhancer, assembled, criteria), inputs=["assembled_prompt", "evaluation_criteria"]))
+        return stages
+
+
+    def assembler_of(self, options):
+        assembler = options.get("assembler", "local")
+        if assembler not in ASSEMBLERS:
+            raise ValueError(f"Unknown assembler '{assembler}', choose one of {list(ASSEMBLERS)}")
+        return assembler
+
+
+    def stage_settings(self, enhancer, stage, options):
+        settings = super().stage_settings(enhancer, stage, options)
+        if stage == "assembled_prompt":
+            settings["assembler"] = self.assembler_of(options)
+        return settings
+
+
+    def skip_stage(self, stage):
+        # a skipped suggestion is the empty list the prompts ask for
+        async def skipped(*args):
+            return empty_output(STRUCTURED_COMPONENTS[stage.name][0])
+        return Stage(stage.name, skipped, stage.inputs)
+
+
+    def components(self, *values):
+        return dict(zip(COMPONENT_NAMES, values))
+
+
+    def render_components(self, components):
+        """Text sections of the components for the LLM assembly, the typed ones rendered locally and the empty ones left out"""
+        texts = {name: self.assembler.render(name, value) for name, value in components.items()}
+        return "\n\n".join(f"## {name}\n{text}" for name, text in texts.items() if text)
+
+
+    async def assemble(self, enhancer, results, options):
+        components = self.components(*(results[name] for name in COMPONENT_NAMES))
+        advanced_prompt = results.get("evaluated_prompt", results["assembled_prompt"])
+        return advanced_prompt, components
+
+
+    async def analyze_input(self, enhancer, basic_prompt):
+        """Analyze the input prompt to determine its key information"""
+        return await self.call_template(enhancer, "analyze_input", basic_prompt=basic_prompt)
+
+    async def expand_instructions(self, enhancer, basic_prompt, analysis):
+        """Expand the basic prompt with clear, detailed instructions"""
+        return await self.call_template(enhancer, "expand_instructions", basic_prompt=basic_prompt, analysis=analysis)
+
+    async def decompose_task(self, enhancer, expanded_prompt):
+        """Break down complex tasks into subtasks"""
+        return await self.call_template(enhancer, "decompose_task", expanded_prompt=expanded_prompt)
+
+    async def add_reasoning(self, enhancer, expanded_prompt):
+        """Add instructions for showing reasoning, chain-of-thought, and self-review"""
+        return await self.call_template(enhancer, "add_reasoning", expanded_prompt=expanded_prompt)
+    
+    async def create_eval_criteria(self, enhancer, expanded_prompt):
+        """Generate evaluation criteria for the prompt output"""
+        return await self.call_template(enhancer, "create_eval_criteria", expanded_prompt=expanded_prompt)
+    
+    async def suggest_references(self, enhancer, expanded_prompt):
+        """Suggest relevant references and explain how to use them"""
+        content = await self.call_template(enhancer, "suggest_references", response_format=response_format(ReferenceSuggestions),
+                                           expanded_prompt=expanded_prompt)
+        return parse_output(ReferenceSuggestions, content)
+
+    async def suggest_tools(self, enhancer, expanded_prompt, tools_dict):
+        """Suggest relevant external tools or APIs"""
+        # the schema only allows the available tools, so there is nothing to ask without any
+        if not tools_dict:
+            return empty_output(ToolSuggestions)
+        content = await self.call_template(enhancer, "suggest_tools", response_format=response_format(ToolSuggestions, {"Tool.name": sorted(tools_dict)}),
+                                           expanded_prompt=expanded_prompt, tools_dict=tools_dict)
+        suggestions = parse_output(ToolSuggestions, content)
+        # backends ignoring the schema (e.g. some OpenAI-compatible servers) may still name unavailable tools
+        suggestions["tools"] = [tool for tool in suggestions["tools"] if tool["name"] in tools_dict]
+        return suggestions
+
+    async def assemble_locally(self, components):
+        """Assemble all components into the advanced prompt with the local assembler"""
+        return self.assembler.assemble(components)
+
+    async def assemble_prompt(self, enhancer, components):
+        """Assemble all components into a cohesive advanced prompt with an LLM call"""
+        return await self.call_template(enhancer, "assemble_prompt", components=self.render_components(components))
+    
+    async def auto_eval(self, enhancer, assembled_prompt, evaluation_criteria):
+        """Perform Auto-Evaluation and Auto-Adjustment"""
+        return await self.call_template(enhancer, "auto_eval", assembled_prompt=assembled_prompt, evaluation_criteria=evaluation_criteria)
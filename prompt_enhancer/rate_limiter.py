@@ -0,0 +1,190 @@
+# Importing dependencies
+import os
+import re
+import time
+import asyncio
+import functools
+
+
+# Default per-model limits (requests/min, tokens/min), refined at runtime from the x-ratelimit-* response headers
+DEFAULT_LIMITS = {
+    "gpt-4o": (500, 30_000),
+    "gpt-4o-mini": (500, 200_000),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """Return the tiktoken encoding of the model (loaded once), or None if tiktoken cannot provide it"""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # e.g. no network access to download the encoding files
+        return None
+
+
+def count_tokens(model, text):
+    """Count the tokens of a text, approximating with 4 characters per token without tiktoken"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_prompt_tokens(model, messages):
+    """Estimate the input tokens of a chat completion request"""
+    # each message costs a few formatting tokens on top of its content
+    return sum(count_tokens(model, message["content"]) + 4 for message in messages) + 3
+
+
+def parse_reset(value):
+    """Parse a reset duration header such as '1s', '6m0s' or '20ms' into seconds"""
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value or ""):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+# Defining a token bucket refilled continuously up to its capacity
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until(self, amount):
+        """Seconds to wait before the amount can be taken (0 if available now)"""
+        self.refill()
+        # an amount larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def consume(self, amount):
+        self.refill()
+        self.level -= amount
+
+    def resize(self, capacity):
+        self.capacity = capacity
+        self.refill_per_second = capacity / 60
+        self.level = min(self.level, capacity)
+
+
+# Defining the rate limiter of one model: a request bucket and a token bucket served in FIFO order
+class ModelRateLimiter:
+    def __init__(self, model, requests_per_minute, tokens_per_minute):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.lock = asyncio.Lock() # asyncio locks wake their waiters in arrival order
+        # metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+
+    async def acquire(self, estimated_tokens):
+        """Wait until both buckets allow the request, and return the time spent waiting"""
+        start = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            async with self.lock:
+                while True:
+                    wait = max(self.requests.time_until(1), self.tokens.time_until(estimated_tokens))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        return waited
+
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Give back (or take) the difference between the estimated and the actual token usage"""
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual_tokens)
+
+
+    def update_from_headers(self, headers):
+        """Adapt the buckets to the limits and remaining budgets reported by the API"""
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if limit and float(limit) != bucket.capacity:
+                bucket.resize(float(limit))
+            if remaining is not None:
+                # the server also sees the traffic of the other processes sharing the API key
+                remaining = float(remaining)
+                if remaining <= 0:
+                    # nothing left: holding the queue until the reported reset time
+                    remaining = -parse_reset(headers.get(f"x-ratelimit-reset-{kind}")) * bucket.refill_per_second
+                bucket.refill()
+                bucket.level = min(bucket.level, remaining)
+
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "requests_per_minute": self.requests.capacity,
+            "tokens_per_minute": self.tokens.capacity,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "average_wait_time": round(self.total_wait_time / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_time": round(self.max_wait_time, 4),
+        }
+
+
+# Defining the registry holding one limiter per model, shared by every PromptEnhancer of the process
+class RateLimiterRegistry:
+    def __init__(self, limits=None, completion_estimate=512):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.completion_estimate = completion_estimate
+        self.limiters = {}
+
+    @classmethod
+    def from_env(cls):
+        """Build a registry from RATE_LIMIT_RPM/RATE_LIMIT_TPM (all models) and RATE_LIMIT_COMPLETION_ESTIMATE"""
+        limits = dict(DEFAULT_LIMITS)
+        if os.getenv("RATE_LIMIT_RPM") or os.getenv("RATE_LIMIT_TPM"):
+            for model, (rpm, tpm) in limits.items():
+                limits[model] = (int(os.getenv("RATE_LIMIT_RPM", rpm)), int(os.getenv("RATE_LIMIT_TPM", tpm)))
+        return cls(limits, completion_estimate=int(os.getenv("RATE_LIMIT_COMPLETION_ESTIMATE", 512)))
+
+    def get(self, model):
+        if model not in self.limiters:
+            rpm, tpm = self.limits.get(model, (int(os.getenv("RATE_LIMIT_RPM", 500)), int(os.getenv("RATE_LIMIT_TPM", 30_000))))
+            self.limiters[model] = ModelRateLimiter(model, rpm, tpm)
+        return self.limiters[model]
+
+    def warm_up(self):
+        """Load the tiktoken encodings of the known models (file reads, or downloads, that must not happen on the event loop)"""
+        for model in self.limits:
+            get_encoding(model)
+
+    def estimate(self, model, messages):
+        """Estimate the tokens a request will count against the tokens/min budget"""
+        return estimate_prompt_tokens(model, messages) + self.completion_estimate
+
+    def stats(self):
+        return {model: limiter.stats() for model, limiter in self.limiters.items()}
@@ -0,0 +1,167 @@
+# Importing dependencies
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import deque
+
+import openai
+
+
+# Absolute deadline (time.monotonic) of the stage being executed by the current task, set by the StageScheduler
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+# Errors worth another attempt: timeouts, connection problems, 429s and 5xx
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs out of its share of the request budget"""
+
+
+class StreamInterrupted(Exception):
+    """Raised when a streamed response fails after some of its tokens were forwarded: not retried, as a new attempt
+    would forward them again"""
+
+
+# Defining a sliding window of call latencies, used to pick the hedging delay
+class LatencyTracker:
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def quantile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Defining the CallPolicy class: jittered exponential retries, optional hedged requests, and stage deadlines
+class CallPolicy:
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, hedging=False, hedge_quantile=0.95,
+                 min_hedge_delay=1.0, min_samples=20):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples # latencies needed before the hedging delay is trusted
+        self.trackers = {} # model -> LatencyTracker
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a policy from the LLM_MAX_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY and LLM_HEDGING variables"""
+        return cls(
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", 3)),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 8.0)),
+            hedging=os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes"),
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", 0.95)),
+        )
+
+
+    def tracker(self, model):
+        if model not in self.trackers:
+            self.trackers[model] = LatencyTracker()
+        return self.trackers[model]
+
+
+    def hedge_delay(self, model):
+        """Delay after which a duplicate request is sent, or None while there is not enough latency data"""
+        tracker = self.tracker(model)
+        if not self.hedging or len(tracker.latencies) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, tracker.quantile(self.hedge_quantile))
+
+
+    def backoff(self, attempt, error, deadline=None):
+        """Full-jitter exponential backoff, or the Retry-After of a 429 when the API gives one"""
+        response = getattr(error, "response", None)
+        if response is not None and response.headers.get("retry-after"):
+            try:
+                retry_after = max(0.0, float(response.headers["retry-after"]))
+            except ValueError:
+                pass
+            else:
+                # under a stage deadline the full wait is kept so that call() gives up when it does not fit
+                return retry_after if deadline is not None else min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+    async def call(self, model, send, stats, hedge=True):
+        """Run send() (a coroutine function) with retries, hedging and the current stage deadline"""
+        deadline = current_deadline.get()
+
+        for attempt in range(self.max_attempts):
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise DeadlineExceeded(f"No time left for the {model} call (attempt {attempt + 1})")
+
+            start = time.monotonic()
+            try:
+                if hedge:
+                    result = await asyncio.wait_for(self.hedged(model, send, stats), timeout)
+                else:
+                    result = await asyncio.wait_for(send(), timeout)
+            except RETRYABLE_ERRORS as error:
+                if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+                    stats["timeouts"] += 1
+                # the attempt used the whole remaining stage time
+                if isinstance(error, asyncio.TimeoutError) and deadline is not None:
+                    raise DeadlineExceeded(f"The {model} call exceeded the stage deadline") from error
+                if attempt + 1 == self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, error, deadline)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                stats["retries"] += 1
+                await asyncio.sleep(delay)
+            else:
+                self.tracker(model).record(time.monotonic() - start)
+                return result
+
+
+    async def hedged(self, model, send, stats):
+        """Send the request, and a duplicate if it is slower than the p95 latency; the first answer wins"""
+        delay = self.hedge_delay(model)
+        primary = asyncio.ensure_future(send())
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        stats["hedged"] += 1
+        backup = asyncio.ensure_future(send())
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            stats["hedge_wins"] += 1
+                        return task.result()
+            # both failed: surfacing the error of the original request
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                task.cancel()
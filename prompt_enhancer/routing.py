@@ -0,0 +1,88 @@
+# Importing dependencies
+import os
+
+
+# Opening words of an answer refusing the task, a failed output whatever its length
+REFUSAL_MARKERS = ("i'm sorry", "i am sorry", "sorry, i", "i cannot", "i can't", "i can not", "i'm unable", "i am unable", "as an ai")
+
+
+def parse_routes(value):
+    """Parse 'stage=model,profile:stage=model,...' into a dictionary"""
+    routes = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            key, model = item.split("=", 1)
+            routes[key.strip()] = model.strip()
+    return routes
+
+
+# Defining the ModelRouter class: the model of each pipeline stage (cheap ones for the analysis and suggestions,
+# stronger ones for the assembly, ...), with an optional cascade re-running a stage on a bigger model when its output fails a check.
+# Routes and cascades are keyed on "stage" or "profile:stage", the latter taking precedence.
+class ModelRouter:
+    def __init__(self, routes=None, cascade=None, min_chars=20):
+        self.routes = dict(routes or {})
+        self.cascade = dict(cascade or {}) # stage -> model to escalate to
+        self.min_chars = min_chars # shorter outputs of a non-optional stage fail the check
+        self.stats_counters = {"routed": {}, "checked": 0, "escalated": {}}
+
+
+    @classmethod
+    def from_env(cls):
+        """Build a router from MODEL_ROUTES, MODEL_CASCADE and MODEL_CASCADE_MIN_CHARS, or None if no route nor cascade is set"""
+        routes = parse_routes(os.getenv("MODEL_ROUTES"))
+        cascade = parse_routes(os.getenv("MODEL_CASCADE"))
+        if not routes and not cascade:
+            return None
+        return cls(routes, cascade, min_chars=int(os.getenv("MODEL_CASCADE_MIN_CHARS", 20)))
+
+
+    def signature(self):
+        """Part of the pipeline memoization key: other routes give other outputs"""
+        return [sorted(self.routes.items()), sorted(self.cascade.items()), self.min_chars]
+
+
+    def lookup(self, table, profile, stage):
+        return table.get(f"{profile.name}:{stage}", table.get(stage))
+
+
+    def model_of(self, profile, stage, default_model):
+        """Model of the stage, or the default model of the enhancer if it has no route (not counted in the stats)"""
+        return self.lookup(self.routes, profile, stage) or default_model
+
+
+    def route(self, profile, stage, default_model):
+        """Model of the stage, or the default model of the enhancer if it has no route"""
+        model = self.model_of(profile, stage, default_model)
+        self.stats_counters["routed"][model] = self.stats_counters["routed"].get(model, 0) + 1
+        return model
+
+
+    def escalation(self, profile, stage, model):
+        """Model to re-run the stage on when its output fails the check, or None"""
+        escalation = self.lookup(self.cascade, profile, stage)
+        return escalation if escalation != model else None
+
+
+    def check(self, profile, stage, output):
+        """Cheap local check of a stage output: the reason it failed, or None if it passed"""
+        self.stats_counters["checked"] += 1
+        text = (output or "").strip()
+        if text.lower().startswith(REFUSAL_MARKERS):
+            return "refusal"
+        # the suggestion stages may have nothing to suggest
+        if stage in profile.optional_stages:
+            return None
+        if not text:
+            return "empty output"
+        if len(text) < self.min_chars:
+            return "output too short"
+        return None
+
+
+    def record_escalation(self, model):
+        self.stats_counters["escalated"][model] = self.stats_counters["escalated"].get(model, 0) + 1
+
+
+    def stats(self):
+        return {"routes": self.routes, "cascade": self.cascade, **self.stats_counters}
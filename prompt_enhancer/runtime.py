@@ -0,0 +1,66 @@
+# Importing dependencies
+import os
+from dotenv import load_dotenv
+
+from prompt_enhancer.cache import cache_from_env
+from prompt_enhancer.resilience import CallPolicy
+from prompt_enhancer.telemetry import Telemetry
+from prompt_enhancer.single_flight import SingleFlight
+from prompt_enhancer.classifier import StageClassifier
+from prompt_enhancer.routing import ModelRouter
+from prompt_enhancer.pricing import PricingRegistry
+from prompt_enhancer.ledger import CostLedger
+from prompt_enhancer.semantic_cache import SemanticCache
+from prompt_enhancer.budgets import StageBudgets
+from prompt_enhancer.client_provider import ClientProvider
+from prompt_enhancer.rate_limiter import RateLimiterRegistry
+
+
+# Process-wide resources shared by every PromptEnhancer, whichever frontend (CLI, FastAPI, Gradio) runs it
+
+# Setting up the API key for single project
+# 1/ create a .env file and add to it:
+# OPENAI_API_KEY = "sk-proj-..."
+# 2/ load variables from .env file
+load_dotenv()
+# 3/ set up the provider of the pooled client
+# (OPENAI_MAX_CONNECTIONS, OPENAI_HTTP2, OPENAI_TIMEOUT, ... see client_provider.py)
+client_provider = ClientProvider.from_env()
+# 4/ set up the response cache (PROMPT_CACHE_BACKEND = memory | sqlite | none, see cache.py)
+response_cache = cache_from_env()
+# 5/ set up the store of whole enhance_prompt results, keyed on the normalized input prompt
+# (PIPELINE_CACHE_BACKEND = memory | sqlite | none)
+pipeline_cache = cache_from_env("PIPELINE_CACHE", "pipeline_cache.sqlite")
+# 6/ set up the per-model request/token budgets
+# (RATE_LIMIT_RPM, RATE_LIMIT_TPM, RATE_LIMIT_COMPLETION_ESTIMATE, see rate_limiter.py)
+rate_limiters = RateLimiterRegistry.from_env()
+# 7/ set up the retry/hedging policy of the stage calls
+# (LLM_MAX_ATTEMPTS, LLM_HEDGING, ... see resilience.py) and the optional overall time budget of a request
+call_policy = CallPolicy.from_env()
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", 0)) or None
+# 8/ set up the per-stage metrics (Prometheus) and spans (OpenTelemetry)
+# (TELEMETRY_METRICS, TELEMETRY_TRACING, see telemetry.py)
+telemetry = Telemetry.from_env()
+# 9/ set up the coalescing of identical concurrent pipelines and LLM calls (SINGLE_FLIGHT = true | false)
+single_flight_enabled = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+inflight_pipelines = SingleFlight() if single_flight_enabled else None
+inflight_calls = SingleFlight() if single_flight_enabled else None
+# 10/ set up the local classifier skipping the suggestion stages of trivial prompts
+# (STAGE_SKIPPING = false | true, off by default as it changes the outputs, STAGE_SKIPPING_MAX_TOKENS, ... see classifier.py)
+stage_classifier = StageClassifier.from_env()
+# 11/ set up the per-stage model routes and cascades
+# (MODEL_ROUTES = "analysis=gpt-4o-mini,8-stage:assembled_prompt=gpt-4o", MODEL_CASCADE, see routing.py)
+model_router = ModelRouter.from_env()
+# 12/ set up the token prices (PRICING_FILE, see pricing.py) and the cost ledger with the budget caps
+# (COST_LEDGER_PATH, COST_MAX_PER_REQUEST, COST_MAX_PER_TENANT per worker process, COST_BUDGET_ACTION = abort | downgrade, ... see ledger.py)
+pricing = PricingRegistry.from_env()
+cost_ledger = CostLedger.from_env()
+# 13/ set up the optional near-duplicate lookup in front of the pipeline cache
+# (SEMANTIC_CACHE = true | false, SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_THRESHOLD, ... see semantic_cache.py)
+semantic_cache = SemanticCache.from_env()
+# 14/ set up the store of the stage outputs, keyed on the exact inputs of each stage, so a resubmitted prompt
+# only recomputes the stages whose inputs changed (STAGE_CACHE_BACKEND = memory | sqlite | none)
+stage_cache = cache_from_env("STAGE_CACHE", "stage_cache.sqlite")
+# 15/ set up the per-stage token budgets trimming the oversized stage inputs, and the max_tokens of the stages
+# (STAGE_BUDGETS = false | true, off by default as it changes the outputs, STAGE_INPUT_BUDGETS = "assembled_prompt=4000", STAGE_MAX_TOKENS, ... see budgets.py)
+stage_budgets = StageBudgets.from_env()
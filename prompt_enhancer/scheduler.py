@@ -0,0 +1,134 @@
+# Importing dependencies
+import time
+import asyncio
+import contextvars
+
+from prompt_enhancer.resilience import current_deadline
+
+
+# Name of the stage being executed by the current task (read by PromptEnhancer.call_llm to tag streamed tokens)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+# Defining a pipeline stage: a coroutine function plus the names of the values it needs
+class Stage:
+    def __init__(self, name, func, inputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+
+
+# Defining the StageScheduler class that runs the pipeline stages as a dependency graph (DAG)
+class StageScheduler:
+    def __init__(self, stages, budget=None, on_stage_done=None):
+        self.stages = list(stages)
+        self.budget = budget # optional overall time budget (seconds) shared out between the stages
+        self.on_stage_done = on_stage_done # optional coroutine function (stage, output, timing) -> None
+        self.check_graph()
+
+
+    def check_graph(self):
+        """Make sure stage names are unique and the dependency graph has no cycles"""
+        names = [stage.name for stage in self.stages]
+        if len(names) != len(set(names)):
+            raise ValueError(f"Duplicated stage names in {names}")
+
+        by_name = {stage.name: stage for stage in self.stages}
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done or name not in by_name:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at stage '{name}'")
+            visiting.add(name)
+            for dependency in by_name[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in names:
+            visit(name)
+
+
+    def remaining_depths(self):
+        """Number of stages on the longest path from each stage to the end of the pipeline (itself included)"""
+        dependents = {stage.name: [] for stage in self.stages}
+        for stage in self.stages:
+            for dependency in stage.inputs:
+                if dependency in dependents:
+                    dependents[dependency].append(stage.name)
+
+        depths = {}
+
+        def depth(name):
+            if name not in depths:
+                depths[name] = 1 + max((depth(dependent) for dependent in dependents[name]), default=0)
+            return depths[name]
+
+        for stage in self.stages:
+            depth(stage.name)
+        return depths
+
+
+    async def run(self, **initial_values):
+        """Run every stage as soon as its inputs are available, and return (results, timings)"""
+        stage_names = {stage.name for stage in self.stages}
+        for stage in self.stages:
+            for dependency in stage.inputs:
+                if dependency not in stage_names and dependency not in initial_values:
+                    raise ValueError(f"Stage '{stage.name}' needs '{dependency}' which is neither a stage nor an initial value")
+
+        results = dict(initial_values)
+        timings = {}
+        tasks = {}
+        pipeline_start = time.perf_counter()
+        depths = self.remaining_depths()
+        deadline = time.monotonic() + self.budget if self.budget else None
+
+        async def run_stage(stage):
+            # waiting only for the stages this one depends on
+            args = []
+            for dependency in stage.inputs:
+                if dependency in tasks:
+                    args.append(await tasks[dependency])
+                else:
+                    args.append(results[dependency])
+
+            # each task runs in its own context copy, so this only tags the calls made by this stage
+            current_stage.set(stage.name)
+            if deadline is not None:
+                # a stage gets an equal share of what is left for the stages still ahead on its path
+                current_deadline.set(time.monotonic() + (deadline - time.monotonic()) / depths[stage.name])
+            start = time.perf_counter()
+            output = await stage.func(*args)
+            end = time.perf_counter()
+
+            timings[stage.name] = {
+                "started_at": round(start - pipeline_start, 4),
+                "elapsed_time": round(end - start, 4),
+            }
+            results[stage.name] = output
+            if self.on_stage_done is not None:
+                await self.on_stage_done(stage.name, output, timings[stage.name])
+            return output
+
+        # the tasks only start running at the first await, so every stage is registered before any dependency lookup
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        total_time = time.perf_counter() - pipeline_start
+        timings["total"] = {
+            "elapsed_time": round(total_time, 4),
+            # what the same stages would have cost if awaited one after another
+            "sequential_time": round(sum(t["elapsed_time"] for t in timings.values()), 4),
+        }
+
+        return results, timings
@@ -0,0 +1,162 @@
+# Importing dependencies
+import os
+import re
+import zlib
+import asyncio
+import hashlib
+import logging
+import contextlib
+import numpy as np
+
+try:
+    import fcntl # serializes the writers of the workers sharing the index (not available on Windows)
+except ImportError:
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN = re.compile(r"[a-z0-9]+")
+NUMBER = re.compile(r"\d+")
+
+
+def embed(text, dim=512):
+    """Embed a prompt with a hashing vectorizer (words, word pairs and character trigrams), L2-normalized"""
+    words = TOKEN.findall(text.lower())
+    features = [(word, 1.0) for word in words] + [(f"{first} {second}", 1.0) for first, second in zip(words, words[1:])]
+    # the character trigrams make spelling variants (eco-friendly / eco friendly, 10-year-old / 10 year old) close
+    for word in words:
+        padded = f"<{word}>"
+        features += [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def scope_of(scope_key, text):
+    """64-bit scope of a prompt: the pipeline settings plus the numbers of the prompt, which must match exactly
+    ("... to a 10 year old" is never served the result of "... to a 16 year old")"""
+    payload = scope_key + "|" + ",".join(NUMBER.findall(text))
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "big") or 1
+
+
+# Defining the SemanticCache class: a flat vector index of the enhanced prompts, pointing at their memoized results
+# in the pipeline cache, so near-duplicates of an enhanced prompt get its result. Kept in memory-mapped .npy files
+# (vectors, scopes, pipeline keys) that load instantly and are shared by the workers, or in plain arrays without a path.
+class SemanticCache:
+    def __init__(self, path=None, dim=512, capacity=10_000, threshold=0.92):
+        self.path = path
+        self.dim = dim
+        self.capacity = capacity # the oldest entries are overwritten once it is reached
+        self.threshold = threshold # minimal cosine similarity of a hit
+        self.hits = 0
+        self.misses = 0
+
+        if path is None:
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self.scopes = np.zeros(capacity, dtype=np.uint64) # 0: empty slot
+            self.keys = np.zeros((capacity, 32), dtype=np.uint8)
+            self.count = np.zeros(1, dtype=np.int64) # entries ever added
+        else:
+            os.makedirs(path, exist_ok=True)
+            with self.lock():
+                self.vectors = self.open_array("vectors", (capacity, dim), np.float32)
+                self.scopes = self.open_array("scopes", (capacity,), np.uint64)
+                self.keys = self.open_array("keys", (capacity, 32), np.uint8)
+                self.count = self.open_array("count", (1,), np.int64)
+
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from the SEMANTIC_CACHE_* environment variables, or None if SEMANTIC_CACHE is off"""
+        if os.getenv("SEMANTIC_CACHE", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("SEMANTIC_CACHE_PATH", "semantic_index") or None,
+            dim=int(os.getenv("SEMANTIC_CACHE_DIM", 512)),
+            capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", 10_000)),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92)),
+        )
+
+
+    def open_array(self, name, shape, dtype):
+        """Map an .npy file of the index, (re)creating it if it is missing or was built with other settings"""
+        filename = os.path.join(self.path, f"{name}.npy")
+        if os.path.exists(filename):
+            array = np.load(filename, mmap_mode="r+")
+            if array.shape == shape and array.dtype == dtype:
+                return array
+            logger.warning(f"The semantic index {filename} has the shape {array.shape} instead of {shape}, it is rebuilt")
+            del array
+        return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+
+
+    @contextlib.contextmanager
+    def lock(self):
+        if self.path is None or fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def _lookup_sync(self, text, scope_key):
+        size = int(min(self.count[0], self.capacity))
+        if not size:
+            return None
+        in_scope = np.flatnonzero(self.scopes[:size] == np.uint64(scope_of(scope_key, text)))
+        if not in_scope.size:
+            return None
+        similarities = self.vectors[in_scope] @ embed(text, self.dim)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return bytes(self.keys[in_scope[best]]).hex(), round(float(similarities[best]), 4)
+
+
+    def _add_sync(self, text, scope_key, pipeline_key):
+        vector = embed(text, self.dim)
+        with self.lock():
+            slot = int(self.count[0] % self.capacity)
+            self.scopes[slot] = 0 # the slot is not matched while it is rewritten
+            self.vectors[slot] = vector
+            self.keys[slot] = np.frombuffer(bytes.fromhex(pipeline_key), dtype=np.uint8)
+            self.scopes[slot] = scope_of(scope_key, text)
+            self.count[0] += 1
+
+
+    async def lookup(self, text, scope_key):
+        """Return (pipeline key, similarity) of the closest enhanced prompt with the same scope above the threshold, or None"""
+        match = await asyncio.to_thread(self._lookup_sync, text, scope_key)
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return match
+
+
+    async def add(self, text, scope_key, pipeline_key):
+        """Index an enhanced prompt, whose result is memoized under pipeline_key"""
+        await asyncio.to_thread(self._add_sync, text, scope_key, pipeline_key)
+
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "mmap" if self.path is not None else "memory",
+            "entries": int(min(self.count[0], self.capacity)),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,38 @@
+# Importing dependencies
+import asyncio
+
+
+# Defining the SingleFlight class: concurrent callers of the same key share one in-flight task instead of
+# each running their own, so identical requests cost one upstream call even before any cache entry is written
+class SingleFlight:
+    def __init__(self):
+        self.calls = {} # key -> task in flight
+        self.leaders = 0
+        self.followers = 0
+
+
+    async def do(self, key, func):
+        """Run func() once for all the concurrent callers of the key, and return (result, shared)"""
+        task = self.calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            # the work runs in its own task: a caller going away does not cancel it for the others
+            task = asyncio.ensure_future(func())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task), shared
+
+
+    def forget(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # every caller may be gone already, the error must not be reported as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+
+    def stats(self):
+        return {"in_flight": len(self.calls), "leaders": self.leaders, "followers": self.followers}
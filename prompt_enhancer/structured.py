@@ -0,0 +1,71 @@
+# Importing dependencies
+import copy
+import logging
+from typing import List
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Typed outputs of the suggestion stages, requested from the model as strict JSON schemas (structured outputs)
+# instead of a "dictionary" described in prose, so they are read without another LLM round-trip
+class Reference(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    title: str
+    incorporation: str # how the reference enhances the prompt and how to use it
+
+
+class ReferenceSuggestions(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    references: List[Reference]
+
+
+class Tool(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    name: str # a key of the tools_dict
+    usage: str # how to use the tool within the prompt
+
+
+class ToolSuggestions(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    tools: List[Tool]
+
+
+def response_format(schema, enums=None):
+    """The response_format of a structured-output call returning the Pydantic model `schema`,
+    with optional {"Definition.field": [allowed values]} restrictions (e.g. the available tools)"""
+    json_schema = copy.deepcopy(schema.model_json_schema())
+    for path, values in (enums or {}).items():
+        definition, field = path.split(".")
+        json_schema["$defs"][definition]["properties"][field]["enum"] = list(values)
+    return {"type": "json_schema", "json_schema": {"name": schema.__name__, "strict": True, "schema": json_schema}}
+
+
+def parse_output(schema, content):
+    """Validate the JSON output of a structured-output call, returning it as a plain dictionary
+    (JSON-serializable for the caches), or the empty output if the model did not follow the schema"""
+    try:
+        return schema.model_validate_json(content or "").model_dump()
+    except ValidationError as error:
+        logger.warning(f"The output does not follow the {schema.__name__} schema, it is dropped: {error.errors()[0]['msg']}")
+        return empty_output(schema)
+
+
+def empty_output(schema):
+    """The output of a schema whose list is empty (nothing suggested)"""
+    return schema.model_validate({field: [] for field in schema.model_fields}).model_dump()
+
+
+def render_references(suggestions):
+    """Render the suggested references as a deterministic text section ("" if there is none)"""
+    return "\n".join(f"- {reference['title']}: {reference['incorporation']}" for reference in suggestions["references"])
+
+
+def render_tools(suggestions):
+    """Render the suggested tools as a deterministic text section ("" if there is none)"""
+    return "\n".join(f"- {tool['name']}: {tool['usage']}" for tool in suggestions["tools"])
@@ -0,0 +1,253 @@
+# Importing dependencies
+import os
+import time
+import asyncio
+import logging
+import contextlib
+import importlib.util
+
+
+logger = logging.getLogger(__name__)
+
+
+# Buckets of the latency histograms (seconds) and of the token histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+# Span used when OpenTelemetry is not installed
+class NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+
+# Defining the Telemetry class exporting per-stage/per-model histograms to Prometheus and
+# OpenTelemetry spans (request > stage > LLM call); each exporter is skipped if its package is missing
+class Telemetry:
+    def __init__(self, metrics=True, tracing=True):
+        self.metrics_enabled = metrics and importlib.util.find_spec("prometheus_client") is not None
+        self.tracing_enabled = tracing and importlib.util.find_spec("opentelemetry") is not None
+        if metrics and not self.metrics_enabled:
+            logger.warning("The 'prometheus_client' package is not installed, the metrics are disabled")
+
+        self.tracer = None
+        if self.tracing_enabled:
+            from opentelemetry import trace
+            self.tracer = trace.get_tracer("prompt_enhancer")
+
+        if self.metrics_enabled:
+            self.create_metrics()
+
+
+    @classmethod
+    def from_env(cls):
+        """Build the telemetry from the TELEMETRY_* environment variables"""
+        return cls(
+            metrics=os.getenv("TELEMETRY_METRICS", "true").lower() in ("1", "true", "yes"),
+            tracing=os.getenv("TELEMETRY_TRACING", "true").lower() in ("1", "true", "yes"),
+        )
+
+
+    def create_metrics(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.request_latency = Histogram("prompt_enhancer_request_latency_seconds", "Latency of a whole enhance_prompt run",
+                                         ["profile", "model"], buckets=LATENCY_BUCKETS)
+        self.stage_latency = Histogram("prompt_enhancer_stage_latency_seconds", "Latency of a pipeline stage",
+                                       ["profile", "stage", "model"], buckets=LATENCY_BUCKETS)
+        self.queue_wait = Histogram("prompt_enhancer_queue_wait_seconds", "Time an LLM call waited for the rate limiter",
+                                    ["stage", "model"], buckets=LATENCY_BUCKETS)
+        self.input_tokens = Histogram("prompt_enhancer_input_tokens", "Prompt tokens of an LLM call",
+                                      ["stage", "model"], buckets=TOKEN_BUCKETS)
+        self.output_tokens = Histogram("prompt_enhancer_output_tokens", "Completion tokens of an LLM call",
+                                       ["stage", "model"], buckets=TOKEN_BUCKETS)
+        self.cached_input_tokens = Counter("prompt_enhancer_cached_input_tokens", "Prompt tokens served from the provider-side prompt cache",
+                                           ["stage", "model"])
+        self.cache_lookups = Counter("prompt_enhancer_cache_lookups", "Response cache lookups of the LLM calls",
+                                     ["stage", "model", "result"])
+        self.loop_lag = Histogram("prompt_enhancer_event_loop_lag_seconds", "Delay of the event loop in waking up a sleeping task",
+                                  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+        self.loop_lag_max = Gauge("prompt_enhancer_event_loop_lag_max_seconds", "Worst event loop delay seen by a worker", multiprocess_mode="max")
+        self.admission_wait = Histogram("prompt_enhancer_admission_wait_seconds", "Time a request waited in the admission queue",
+                                        buckets=LATENCY_BUCKETS)
+        self.admission_queue = Gauge("prompt_enhancer_admission_queue_length", "Requests waiting for a pipeline slot", multiprocess_mode="livesum")
+        self.admission_inflight = Gauge("prompt_enhancer_admission_inflight", "Pipelines running", multiprocess_mode="livesum")
+        self.admission_rejections = Counter("prompt_enhancer_admission_rejections", "Requests rejected by the admission control", ["reason"])
+        self.coalesced = Counter("prompt_enhancer_coalesced", "Pipelines and LLM calls served by an identical one already in flight", ["kind"])
+        self.skipped_stages = Counter("prompt_enhancer_skipped_stages", "Stages skipped by the local stage classifier", ["profile", "stage"])
+        self.skipped_tokens = Counter("prompt_enhancer_skipped_tokens", "Estimated tokens saved by skipping stages", ["profile", "stage"])
+        self.reused_stages = Counter("prompt_enhancer_reused_stages", "Stages whose output was reused from the stage cache", ["profile", "stage"])
+        self.reused_tokens = Counter("prompt_enhancer_reused_tokens", "Tokens the reused stages cost when they ran", ["profile", "stage"])
+        self.trimmed_stages = Counter("prompt_enhancer_trimmed_stages", "Stage prompts whose inputs were trimmed to the stage budget", ["profile", "stage"])
+        self.trimmed_tokens = Counter("prompt_enhancer_trimmed_tokens", "Input tokens saved by trimming the stage prompts", ["profile", "stage"])
+        self.cost = Counter("prompt_enhancer_cost_dollars", "Dollar cost of the LLM calls", ["stage", "model"])
+        self.budget_actions = Counter("prompt_enhancer_budget_actions", "Calls downgraded or requests aborted to stay within their cost budget", ["action"])
+        self.semantic_cache_lookups = Counter("prompt_enhancer_semantic_cache_lookups", "Near-duplicate lookups of the prompts missing the pipeline cache", ["result"])
+        self.pipeline_cache_lookups = Counter("prompt_enhancer_pipeline_cache_lookups", "Lookups of memoized enhance_prompt results",
+                                              ["profile", "model", "result"])
+
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Open a span nested under the current one (request > stage > LLM call)"""
+        if self.tracer is None:
+            yield NoopSpan()
+            return
+        with self.tracer.start_as_current_span(name) as span:
+            for key, value in attributes.items():
+                if value is not None:
+                    span.set_attribute(key, value)
+            yield span
+
+
+    def traced(self, stage, func, **attributes):
+        """Wrap a stage coroutine function in its own span"""
+        async def run(*args):
+            with self.span(f"stage {stage}", stage=stage, **attributes):
+                return await func(*args)
+        return run
+
+
+    def observe_request(self, profile, model, elapsed_time, stage_timings):
+        if not self.metrics_enabled:
+            return
+        self.request_latency.labels(profile, model).observe(elapsed_time)
+        for stage, timing in stage_timings.items():
+            if stage != "total":
+                self.stage_latency.labels(profile, stage, model).observe(timing["elapsed_time"])
+
+
+    def observe_pipeline_cache(self, profile, model, hit):
+        if self.metrics_enabled:
+            self.pipeline_cache_lookups.labels(profile, model, "hit" if hit else "miss").inc()
+
+
+    def observe_semantic_cache(self, hit):
+        if self.metrics_enabled:
+            self.semantic_cache_lookups.labels("hit" if hit else "miss").inc()
+
+
+    def observe_coalesced(self, kind):
+        if self.metrics_enabled:
+            self.coalesced.labels(kind).inc()
+
+
+    def observe_skipped_stage(self, profile, stage, tokens_saved):
+        if self.metrics_enabled:
+            self.skipped_stages.labels(profile, stage).inc()
+            self.skipped_tokens.labels(profile, stage).inc(tokens_saved)
+
+
+    def observe_reused_stage(self, profile, stage, tokens_saved):
+        if self.metrics_enabled:
+            self.reused_stages.labels(profile, stage).inc()
+            self.reused_tokens.labels(profile, stage).inc(tokens_saved)
+
+
+    def observe_trimmed_stage(self, profile, stage, tokens_saved):
+        if self.metrics_enabled:
+            self.trimmed_stages.labels(profile, stage).inc()
+            self.trimmed_tokens.labels(profile, stage).inc(tokens_saved)
+
+
+    def observe_cost(self, stage, model, cost):
+        if self.metrics_enabled and cost:
+            self.cost.labels(stage or "none", model).inc(cost)
+
+
+    def observe_budget(self, action):
+        if self.metrics_enabled:
+            self.budget_actions.labels(action).inc()
+
+
+    def observe_cache(self, stage, model, hit):
+        if self.metrics_enabled:
+            self.cache_lookups.labels(stage or "none", model, "hit" if hit else "miss").inc()
+
+
+    def observe_queue_wait(self, stage, model, wait):
+        if self.metrics_enabled:
+            self.queue_wait.labels(stage or "none", model).observe(wait)
+
+
+    def observe_usage(self, stage, model, prompt_tokens, completion_tokens, cached_tokens):
+        if not self.metrics_enabled:
+            return
+        stage = stage or "none"
+        self.input_tokens.labels(stage, model).observe(prompt_tokens)
+        self.output_tokens.labels(stage, model).observe(completion_tokens)
+        if cached_tokens:
+            self.cached_input_tokens.labels(stage, model).inc(cached_tokens)
+
+
+    def observe_admission_wait(self, wait):
+        if self.metrics_enabled:
+            self.admission_wait.observe(wait)
+
+
+    def observe_admission_queue(self, queued, inflight):
+        if self.metrics_enabled:
+            self.admission_queue.set(queued)
+            self.admission_inflight.set(inflight)
+
+
+    def observe_admission_rejection(self, reason):
+        if self.metrics_enabled:
+            self.admission_rejections.labels(reason).inc()
+
+
+    async def monitor_event_loop(self, interval=0.1):
+        """Measure how late the event loop wakes up a sleeping task: anything blocking the loop
+        (synchronous I/O, heavy CPU work on the hot path) shows up as lag"""
+        worst = 0.0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - start - interval)
+            if lag > worst:
+                worst = lag
+                if self.metrics_enabled:
+                    self.loop_lag_max.set(worst)
+            if self.metrics_enabled:
+                self.loop_lag.observe(lag)
+            if lag > 10 * interval:
+                logger.warning(f"The event loop was blocked for {lag:.3f} s")
+
+
+    def metrics_text(self):
+        """Return (body, content_type) of the Prometheus exposition of the metrics"""
+        if not self.metrics_enabled:
+            return "# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+        # with several gunicorn workers, each one writes its samples in PROMETHEUS_MULTIPROC_DIR
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry).decode("utf-8"), CONTENT_TYPE_LATEST
+
+
+def setup_tracing(service_name="prompt-enhancer"):
+    """Export the spans over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set (and the SDK and exporter are installed)"""
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return False
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk/opentelemetry-exporter-otlp are not installed")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", service_name)}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    return True
@@ -0,0 +1,63 @@
+# Importing dependencies
+import string
+
+
+def cached_prompt_tokens(usage):
+    """Read the prompt tokens served from the provider-side prompt cache (usage.prompt_tokens_details)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
+
+
+# Defining a stage prompt: a byte-stable static prefix (instructions and few-shot examples) followed by
+# a short dynamic part holding the user content, so consecutive calls share the longest possible cacheable prefix
+class PromptTemplate:
+    def __init__(self, name, static, dynamic):
+        self.name = name
+        self.static = static
+        self.dynamic = dynamic
+        # the placeholders of the dynamic part, checked once when the template is registered
+        self.fields = {field for _, field, _, _ in string.Formatter().parse(dynamic) if field}
+
+    def render(self, **values):
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Missing values {sorted(missing)} for the '{self.name}' template")
+        return self.static + self.dynamic.format(**values)
+
+
+# Defining the TemplateRegistry class holding the stage prompts, with their token and prompt-cache usage
+class TemplateRegistry:
+    def __init__(self, templates=()):
+        self.templates = {}
+        self.usage = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template):
+        self.templates[template.name] = template
+        self.usage[template.name] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+
+    def render(self, name, **values):
+        return self.templates[name].render(**values)
+
+    def record_usage(self, name, usage):
+        """Add the usage of one call made with the template"""
+        if name not in self.usage:
+            return
+        stats = self.usage[name]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += usage.prompt_tokens
+        stats["completion_tokens"] += usage.completion_tokens
+        stats["cached_prompt_tokens"] += cached_prompt_tokens(usage)
+
+    def stats(self):
+        report = {}
+        for name, stats in self.usage.items():
+            report[name] = dict(stats)
+            report[name]["static_prefix_chars"] = len(self.templates[name].static)
+            report[name]["cache_hit_rate"] = round(stats["cached_prompt_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+        return report
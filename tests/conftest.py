@@ -0,0 +1,54 @@
+# Importing dependencies
+import os
+import sys
+import time
+import socket
+import threading
+import pytest
+
+# the tests import the shared prompt_enhancer package from the root of the repository
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# in-memory, network-free runtime: no on-disk caches, ledger or job store, and the local mock server as the API
+MOCK_PORT = free_port()
+os.environ["OPENAI_API_KEY"] = "mock"
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{MOCK_PORT}/v1"
+os.environ.setdefault("PROMPT_CACHE_BACKEND", "none")
+os.environ.setdefault("PIPELINE_CACHE_BACKEND", "none")
+os.environ.setdefault("STAGE_CACHE_BACKEND", "none")
+os.environ.setdefault("JOB_STORE_BACKEND", "memory")
+os.environ.setdefault("COST_LEDGER_PATH", "")
+os.environ.setdefault("TELEMETRY_METRICS", "false")
+
+
+@pytest.fixture(scope="session")
+def mock_openai():
+    """The mock OpenAI server (mock_openai_server.py) running in a background thread, its app state reset by each test"""
+    import uvicorn
+    from mock_openai_server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=MOCK_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield app
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def mock_api(mock_openai):
+    """The mock server with its default behaviour (no latency, no injected errors)"""
+    defaults = {key: value for key, value in vars(mock_openai.state)["_state"].items() if isinstance(value, (int, float, str))}
+    yield mock_openai
+    for key, value in defaults.items():
+        setattr(mock_openai.state, key, value)
@@ -0,0 +1,72 @@
+# Importing dependencies
+import asyncio
+import pytest
+
+from prompt_enhancer.admission import AdmissionController, Overloaded
+
+
+def test_waiting_clients_are_served_round_robin():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=10, max_queue_per_client=10)
+        order = []
+
+        async def request(client, index):
+            async with admission.slot(client):
+                order.append(f"{client}{index}")
+                await asyncio.sleep(0.01)
+
+        holder = asyncio.create_task(request("x", 0))
+        await asyncio.sleep(0)
+        # a busy client queues three requests before another client queues one
+        tasks = [asyncio.create_task(request("a", index)) for index in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("b", 0)))
+        await asyncio.gather(holder, *tasks)
+        return order, admission
+
+    order, admission = asyncio.run(scenario())
+    assert order == ["x0", "a0", "b0", "a1", "a2"]
+    assert admission.inflight == 0 and admission.queued == 0
+
+
+def test_queue_limits_reject_fast():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=2, max_queue_per_client=1)
+        await admission.acquire("x")
+        waiter = asyncio.create_task(admission.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as per_client:
+            await admission.acquire("a")
+        other = asyncio.create_task(admission.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            await admission.acquire("c")
+        for task in (waiter, other):
+            task.cancel()
+        await asyncio.gather(waiter, other, return_exceptions=True)
+        return per_client.value, full.value, admission
+
+    per_client, full, admission = asyncio.run(scenario())
+    assert per_client.status_code == 429 and full.status_code == 503
+    assert per_client.retry_after >= 1
+    assert admission.queued == 0 and admission.inflight == 1
+
+
+def test_wait_timeout_and_cancelled_waiters_free_their_place():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_wait=0.05)
+        await admission.acquire("x")
+        with pytest.raises(Overloaded) as timeout:
+            await admission.acquire("a")
+        waiter = asyncio.create_task(admission.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release()
+        # the slot is free again, not held by a waiter that went away
+        assert await admission.acquire("c") == 0.0
+        return timeout.value, admission
+
+    timeout, admission = asyncio.run(scenario())
+    assert timeout.status_code == 503
+    assert admission.queued == 0 and admission.inflight == 1
@@ -0,0 +1,97 @@
+# Importing dependencies
+import json
+import asyncio
+import pytest
+
+from prompt_enhancer.batch import read_prompts, enhance_many, run_batch_file
+
+
+# Stand-in of PromptEnhancer echoing the prompt, failing on the prompts containing "fail"
+class EchoEnhancer:
+    model = "echo"
+    prompt_tokens = 1
+    completion_tokens = 1
+    cost = 0.0
+
+    async def enhance_prompt(self, input_prompt, **options):
+        if "fail" in input_prompt:
+            raise RuntimeError("failed")
+        return input_prompt.upper() + "".join(f" {key}={value}" for key, value in sorted(options.items()))
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_read_prompts_reports_malformed_lines(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    write_lines(path, ['{"id": "1", "text": "a"}', '{"id": "2"}', "not json", '"plain"', "[1]"])
+    rows = list(read_prompts(path))
+    assert rows[0] == ("1", "a", None)
+    assert rows[1][0] == "2" and rows[1][1] is None and "text" in rows[1][2]
+    assert rows[2][0] == "3" and rows[2][1] is None and "Invalid JSON" in rows[2][2]
+    assert rows[3] == ("4", "plain", None)
+    assert rows[4][1] is None
+
+
+def test_run_batch_file_keeps_going_after_a_bad_line(tmp_path):
+    input_path, output_path = tmp_path / "prompts.jsonl", tmp_path / "output.jsonl"
+    write_lines(input_path, ['{"id": "1", "text": "a"}', '{"id": "2"}', '{"id": "3", "text": "b"}', "{broken", '{"id": "5", "text": "c"}'])
+
+    summary = asyncio.run(asyncio.wait_for(run_batch_file(input_path, output_path, EchoEnhancer, concurrency=2), timeout=5))
+
+    records = {record["id"]: record for record in map(json.loads, output_path.read_text(encoding="utf-8").splitlines())}
+    assert sorted(records) == ["1", "2", "3", "4", "5"]
+    assert records["3"]["advanced_prompt"] == "B" and records["5"]["advanced_prompt"] == "C"
+    assert records["2"]["error"] and records["4"]["error"]
+    assert summary["enhanced"] == 3 and summary["failed"] == 2
+
+
+def test_run_batch_file_resumes_only_the_missing_ids(tmp_path):
+    input_path, output_path = tmp_path / "prompts.jsonl", tmp_path / "output.jsonl"
+    write_lines(input_path, ['{"id": "1", "text": "a"}', '{"id": "2", "text": "fail"}'])
+    asyncio.run(run_batch_file(input_path, output_path, EchoEnhancer))
+    write_lines(input_path, ['{"id": "1", "text": "a"}', '{"id": "2", "text": "b"}'])
+
+    summary = asyncio.run(run_batch_file(input_path, output_path, EchoEnhancer))
+
+    assert summary["skipped"] == 1 and summary["enhanced"] == 1
+
+
+def test_enhance_many_raises_the_error_of_the_items():
+    def items():
+        yield "1", "a"
+        raise KeyError("text")
+
+    results = []
+
+    async def collect():
+        async for result in enhance_many(items(), EchoEnhancer, concurrency=2):
+            results.append(result)
+
+    # the iteration error is raised once the results already made are yielded, and does not hang the consumer
+    with pytest.raises(KeyError):
+        asyncio.run(asyncio.wait_for(collect(), timeout=5))
+    assert [result["id"] for result in results] == ["1"]
+
+
+def test_run_batch_file_reports_non_utf8_lines_and_id_less_records(tmp_path):
+    input_path, output_path = tmp_path / "prompts.jsonl", tmp_path / "output.jsonl"
+    input_path.write_bytes(b'{"id": "1", "text": "a"}\n{"id": "2", "text": "\xff\xfe"}\n{"id": "3", "text": "c"}\n')
+    # a record of another tool without an id does not stop the resume
+    output_path.write_text('{"advanced_prompt": "x"}\n', encoding="utf-8")
+    summary = asyncio.run(run_batch_file(input_path, output_path, EchoEnhancer))
+
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()[1:]]
+    assert summary["enhanced"] == 2 and summary["failed"] == 1
+    assert {record["id"]: bool(record["error"]) for record in records} == {"1": False, "2": True, "3": False}
+    assert "not UTF-8" in next(record["error"] for record in records if record["id"] == "2")
+
+
+def test_run_batch_file_passes_the_profile_options(tmp_path):
+    input_path, output_path = tmp_path / "prompts.jsonl", tmp_path / "output.jsonl"
+    write_lines(input_path, ['{"id": "1", "text": "a"}'])
+
+    asyncio.run(run_batch_file(input_path, output_path, EchoEnhancer, options={"assembler": "llm"}))
+
+    assert json.loads(output_path.read_text(encoding="utf-8"))["advanced_prompt"] == "A assembler=llm"
@@ -0,0 +1,58 @@
+# Importing dependencies
+from prompt_enhancer import PromptEnhancer, get_profile
+from prompt_enhancer.budgets import StageBudgets, allocate, trim_text
+from prompt_enhancer.rate_limiter import count_tokens
+from prompt_enhancer.routing import ModelRouter
+from prompt_enhancer.scheduler import current_stage
+
+
+LONG_TEXT = " ".join(f"word{index}" for index in range(2000))
+
+
+def test_allocate_keeps_small_values_whole():
+    assert allocate({"a": 10, "b": 500, "c": 800}, 400) == {"a": 10, "b": 195, "c": 195}
+    assert allocate({"a": 10, "b": 20}, 100) == {"a": 10, "b": 20}
+
+
+def test_trim_text_keeps_head_and_tail():
+    trimmed = trim_text("gpt-4o-mini", LONG_TEXT, 100)
+    assert trimmed.startswith("word0 ") and trimmed.endswith("word1999")
+    assert "tokens trimmed" in trimmed
+    assert count_tokens("gpt-4o-mini", trimmed) < 130
+    assert trim_text("gpt-4o-mini", "short text", 100) == "short text"
+
+
+def test_fit_trims_to_the_stage_budget():
+    profile = get_profile("3-stage")
+    budgets = StageBudgets(input_budgets={"3-stage:expanded_prompt": 200}, default_input_budget=None)
+    values, trimmed = budgets.fit("gpt-4o-mini", profile, "expanded_prompt", {"input_prompt": LONG_TEXT, "analysis": "short", "count": 3})
+    assert trimmed["input_tokens"] > 200 and trimmed["tokens_saved"] > 0
+    assert values["analysis"] == "short" and values["count"] == 3
+    assert budgets.fit("gpt-4o-mini", profile, "analysis", {"input_prompt": LONG_TEXT}) == ({"input_prompt": LONG_TEXT}, None)
+
+
+def test_fit_budget_counts_with_the_routed_model():
+    models = []
+
+    class RecordingBudgets(StageBudgets):
+        def fit(self, model, profile, stage, values):
+            models.append(model)
+            return values, None
+
+    router = ModelRouter(routes={"expanded_prompt": "gpt-4o"})
+    enhancer = PromptEnhancer("gpt-4o-mini", model_router=router, stage_budgets=RecordingBudgets())
+    current_stage.set("expanded_prompt")
+    enhancer.fit_budget({"input_prompt": "a"})
+    current_stage.set("analysis")
+    enhancer.fit_budget({"input_prompt": "a"})
+    assert models == ["gpt-4o", "gpt-4o-mini"]
+    assert router.stats_counters["routed"] == {}
+
+
+def test_stage_budgets_are_opt_in(monkeypatch):
+    monkeypatch.delenv("STAGE_BUDGETS", raising=False)
+    assert StageBudgets.from_env() is None
+    monkeypatch.setenv("STAGE_BUDGETS", "true")
+    monkeypatch.setenv("STAGE_INPUT_BUDGETS", "8-stage:assembled_prompt=4000")
+    budgets = StageBudgets.from_env()
+    assert budgets.input_budgets == {"8-stage:assembled_prompt": 4000} and budgets.default_input_budget == 6000
@@ -0,0 +1,56 @@
+# Importing dependencies
+import asyncio
+
+from prompt_enhancer.cache import MemoryCache, SQLiteCache, make_cache_key, make_pipeline_key, make_stage_key
+
+
+def test_keys_cover_what_shapes_the_output():
+    key = make_cache_key("gpt-4o-mini", "system", "prompt", 0.0)
+    assert key == make_cache_key("gpt-4o-mini", "system", "prompt", 0.0)
+    assert len({key, make_cache_key("gpt-4o", "system", "prompt", 0.0), make_cache_key("gpt-4o-mini", "system", "prompt", 0.5),
+                make_cache_key("gpt-4o-mini", "system", "prompt", 0.0, max_tokens=100),
+                make_cache_key("gpt-4o-mini", "system", "prompt", 0.0, response_format={"type": "json_object"})}) == 5
+
+
+def test_pipeline_key_normalizes_the_prompt_but_not_the_options():
+    assert make_pipeline_key("Write  a Poem", "m", "v1") == make_pipeline_key("write a poem", "m", "v1")
+    assert make_pipeline_key("write a poem", "m", "v1", perform_eval=True) != make_pipeline_key("write a poem", "m", "v1")
+    assert make_pipeline_key("write a poem", "m", "v1") != make_pipeline_key("write a poem", "m", "v2")
+
+
+def test_stage_key_covers_inputs_and_settings():
+    key = make_stage_key("v1", "tools", ["a"], tools_dict="{}")
+    assert key == make_stage_key("v1", "tools", ["a"], tools_dict="{}")
+    assert len({key, make_stage_key("v1", "tools", ["b"], tools_dict="{}"), make_stage_key("v1", "tools", ["a"], tools_dict="{'x': 1}"),
+                make_stage_key("v1", "references", ["a"], tools_dict="{}")}) == 4
+
+
+def test_memory_cache_evicts_least_recently_used_and_expired():
+    async def scenario():
+        cache = MemoryCache(max_entries=2, ttl=60)
+        await cache.set("a", {"content": "1"})
+        await cache.set("b", {"content": "2"})
+        await cache.get("a")
+        await cache.set("c", {"content": "3"})
+        kept = [await cache.get(key) for key in ("a", "b", "c")]
+        expiring = MemoryCache(ttl=-1)
+        await expiring.set("a", {"content": "1"})
+        return kept, await expiring.get("a"), cache
+
+    kept, expired, cache = asyncio.run(scenario())
+    assert kept == [{"content": "1"}, None, {"content": "3"}]
+    assert expired is None
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    async def scenario():
+        path = tmp_path / "cache.sqlite"
+        await SQLiteCache(str(path), max_entries=2).set("a", {"content": "1"})
+        other = SQLiteCache(str(path), max_entries=2)
+        value = await other.get("a")
+        await other.set("b", {"content": "2"})
+        await other.set("c", {"content": "3"})
+        return value, other.stats()["entries"]
+
+    assert asyncio.run(scenario()) == ({"content": "1"}, 2)
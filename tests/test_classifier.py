@@ -0,0 +1,37 @@
+# Importing dependencies
+from prompt_enhancer import get_profile
+from prompt_enhancer.classifier import StageClassifier
+
+
+STAGES = ["analysis", "expanded_prompt", "references", "tools", "assembled_prompt", "evaluated_prompt"]
+
+
+def test_stage_skipping_is_opt_in(monkeypatch):
+    monkeypatch.delenv("STAGE_SKIPPING", raising=False)
+    assert StageClassifier.from_env() is None
+    monkeypatch.setenv("STAGE_SKIPPING", "true")
+    assert isinstance(StageClassifier.from_env(), StageClassifier)
+
+
+def test_short_prompt_skips_the_suggestions_but_never_the_eval():
+    profile = get_profile("8-stage")
+    skipped = StageClassifier().decide(profile, STAGES, "gpt-4o-mini", "Write a haiku", {"search": "web search"})
+    assert set(skipped) == {"references", "tools"}
+    assert all(decision["tokens_saved"] > 0 for decision in skipped.values())
+
+
+def test_tools_stage_without_tools_is_not_counted_as_saved():
+    profile = get_profile("8-stage")
+    classifier = StageClassifier()
+    # without tools the stage calls no LLM: there is nothing to skip, nor any token saved
+    skipped = classifier.decide(profile, STAGES, "gpt-4o-mini", "Write a haiku", {})
+    assert set(skipped) == {"references"}
+    assert classifier.stats()["skipped"] == {"references": 1}
+    assert classifier.stats()["tokens_saved"] == skipped["references"]["tokens_saved"]
+
+
+def test_keywords_keep_the_suggestion_stages():
+    profile = get_profile("8-stage")
+    skipped = StageClassifier().decide(profile, STAGES, "gpt-4o-mini", "Fetch the latest stock prices and cite research papers",
+                                       {"search": "web search"})
+    assert "references" not in skipped and "tools" not in skipped
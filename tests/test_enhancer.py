@@ -0,0 +1,33 @@
+# Importing dependencies
+import asyncio
+
+from prompt_enhancer import PromptEnhancer
+from prompt_enhancer.cache import MemoryCache
+
+
+def test_profiles_run_end_to_end_against_the_mock_server(mock_api):
+    async def scenario():
+        results = {}
+        for profile, options in (("3-stage", {}), ("8-stage", {"perform_eval": True})):
+            enhancer = PromptEnhancer("gpt-4o-mini", profile=profile, pipeline_cache=None, cache=None, cost_ledger=None)
+            results[profile] = (await enhancer.enhance_prompt("Write a detailed tutorial on SQL joins", **options), enhancer)
+        return results
+
+    results = asyncio.run(scenario())
+    for profile, (advanced_prompt, enhancer) in results.items():
+        assert advanced_prompt, profile
+        assert enhancer.prompt_tokens > 0 and enhancer.cost > 0
+    assert "evaluated_prompt" in results["8-stage"][1].stage_usage
+
+
+def test_memoized_pipeline_costs_nothing(mock_api):
+    pipeline_cache = MemoryCache()
+
+    async def run():
+        enhancer = PromptEnhancer("gpt-4o-mini", pipeline_cache=pipeline_cache, cache=None, cost_ledger=None)
+        return await enhancer.enhance_prompt("Explain  closures in Python"), enhancer
+
+    first, cold = asyncio.run(run())
+    second, warm = asyncio.run(run())
+    assert first == second
+    assert cold.prompt_tokens > 0 and warm.prompt_tokens == 0 and warm.pipeline_cache_hit
@@ -0,0 +1,157 @@
+# Importing dependencies
+import sys
+import asyncio
+import importlib
+import pytest
+from pathlib import Path
+
+from prompt_enhancer.jobs import JobRunner, MemoryJobStore, SQLiteJobStore, check_webhook_url, new_job
+
+
+async def echo_handler(job, on_stage):
+    return {"advanced_prompt": job["request"]["text"].upper()}
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http://127.0.0.1:8000/hook",
+    "http://localhost/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://[::1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_webhook_rejects_non_public_targets(url):
+    with pytest.raises(ValueError):
+        asyncio.run(check_webhook_url(url))
+
+
+def test_webhook_allow_list():
+    asyncio.run(check_webhook_url("http://127.0.0.1:9000/hook", allowed_hosts={"127.0.0.1"}))
+    with pytest.raises(ValueError):
+        asyncio.run(check_webhook_url("http://8.8.8.8/hook", allowed_hosts={"127.0.0.1"}))
+
+
+def test_submit_rejects_private_webhook_before_storing():
+    async def scenario():
+        runner = JobRunner(MemoryJobStore(), echo_handler, workers=1)
+        await runner.start()
+        try:
+            with pytest.raises(ValueError):
+                await runner.submit({"text": "a"}, "http://169.254.169.254/")
+            assert runner.store.jobs == {}
+        finally:
+            await runner.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_and_stats_before_start():
+    runner = JobRunner(MemoryJobStore(), echo_handler, max_queue=1)
+    assert runner.full() is False
+    assert runner.stats()["queued"] == 0
+
+
+def test_runner_runs_jobs_and_records_stages():
+    async def handler(job, on_stage):
+        await on_stage("initial_prompt", "draft", {"elapsed": 0.0})
+        return {"advanced_prompt": job["request"]["text"].upper()}
+
+    async def scenario():
+        runner = JobRunner(MemoryJobStore(), handler, workers=2)
+        await runner.start()
+        try:
+            jobs = [await runner.submit({"text": f"prompt {index}"}) for index in range(5)]
+            while True:
+                records = [await runner.store.get(job["id"]) for job in jobs]
+                if all(record["status"] not in ("queued", "running") for record in records):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await runner.stop()
+        return records
+
+    records = asyncio.run(scenario())
+    assert [record["status"] for record in records] == ["succeeded"] * 5
+    assert records[2]["result"] == {"advanced_prompt": "PROMPT 2"}
+    assert records[2]["stages"]["initial_prompt"]["output"] == "draft"
+
+
+def test_importing_the_app_creates_no_job_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("JOB_STORE_BACKEND", "sqlite")
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1] / "Docker-FastAPI-app"))
+    sys.modules.pop("app.main", None)
+    importlib.import_module("app.main")
+    assert not (tmp_path / "jobs.sqlite").exists()
+
+
+def test_sqlite_job_is_claimed_once_and_stale_jobs_recovered(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite"))
+        job = new_job({"text": "a"})
+        await store.create(job)
+        claims = await asyncio.gather(*(store.claim(job["id"]) for _ in range(5)))
+        fresh = await store.recoverable(stale_after=600.0)
+        # its worker died: the running job stops being updated
+        stale = await store.recoverable(stale_after=-1.0)
+        return claims, fresh, stale, (await store.get(job["id"]))["status"], job["id"]
+
+    claims, fresh, stale, status, job_id = asyncio.run(scenario())
+    assert sorted(claims) == [False] * 4 + [True]
+    assert fresh == [] and stale == [job_id] and status == "queued"
+
+
+def test_submit_before_start_is_a_clear_error():
+    with pytest.raises(RuntimeError, match="not started"):
+        asyncio.run(JobRunner(MemoryJobStore(), echo_handler).submit({"text": "a"}))
+
+
+def test_worker_survives_a_failing_store():
+    class FlakyStore(MemoryJobStore):
+        broken_id = None
+
+        async def get(self, job_id):
+            if job_id == self.broken_id:
+                self.broken_id = None
+                raise RuntimeError("database is locked")
+            return await super().get(job_id)
+
+    async def scenario():
+        runner = JobRunner(FlakyStore(), echo_handler, workers=1)
+        await runner.start()
+        try:
+            first = await runner.submit({"text": "a"})
+            runner.store.broken_id = first["id"]
+            second = await runner.submit({"text": "b"})
+            while (await runner.store.get(second["id"]))["status"] in ("queued", "running"):
+                await asyncio.sleep(0.01)
+            return (await runner.store.get(first["id"]))["status"], (await runner.store.get(second["id"]))["status"]
+        finally:
+            await runner.stop()
+
+    # the job hit by the store error is left to the stale recovery, the next one still runs on the same worker
+    assert asyncio.run(scenario()) == ("running", "succeeded")
+
+
+def test_job_is_only_visible_to_its_tenant_under_api_keys(monkeypatch):
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1] / "Docker-FastAPI-app"))
+    main = importlib.import_module("app.main")
+    monkeypatch.setattr(main, "TENANT_API_KEYS", {"key-a": "a", "key-b": "b"})
+    monkeypatch.setattr(main.job_runner, "store", MemoryJobStore())
+    job = new_job({"text": "x", "tenant": "a"})
+    asyncio.run(main.job_runner.store.create(job))
+
+    def request(key):
+        return Request({"type": "http", "headers": [(b"authorization", f"Bearer {key}".encode())], "client": ("10.0.0.1", 1)})
+
+    assert asyncio.run(main.getJob(job["id"], request("key-a")))["id"] == job["id"]
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.getJob(job["id"], request("key-b")))
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.jobsStats(request("wrong")))
+    assert error.value.status_code == 401
@@ -0,0 +1,15 @@
+# Importing dependencies
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FRONTENDS = [ROOT / "Docker-FastAPI-app" / "app", ROOT / "Gradio-app", ROOT]
+
+
+def test_frontends_share_the_prompt_enhancer_package():
+    """The pipeline modules live only in prompt_enhancer/: no frontend carries its own drifting copy"""
+    modules = {path.name for path in (ROOT / "prompt_enhancer").glob("*.py")} - {"__init__.py"}
+    copies = [str(path.relative_to(ROOT)) for frontend in FRONTENDS for path in frontend.glob("*.py") if path.name in modules]
+    assert copies == []
+    for frontend in (ROOT / "Docker-FastAPI-app" / "app" / "main.py", ROOT / "Gradio-app" / "app.py", ROOT / "Advancd_Prompt_Generator.py"):
+        assert "from prompt_enhancer import" in frontend.read_text(encoding="utf-8")
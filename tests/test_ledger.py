@@ -0,0 +1,85 @@
+# Importing dependencies
+import types
+import pytest
+from pathlib import Path
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from prompt_enhancer.ledger import CostLedger, BudgetExceeded
+
+
+def finished_request(tenant, cost, cost_limit=None):
+    return types.SimpleNamespace(tenant=tenant, profile=types.SimpleNamespace(name="3-stage"), model="gpt-4o-mini", cost=cost,
+                                 cost_limit=cost_limit, prompt_tokens=10, cached_prompt_tokens=0, completion_tokens=5, stage_usage={},
+                                 model_usage={}, budget_downgrades=set(), pipeline_coalesced=False)
+
+
+def test_tenant_budget_is_enforced_per_window():
+    ledger = CostLedger(path=None, max_per_tenant=1.0, max_per_request=0.5)
+    limit = ledger.budget_for("a")
+    assert limit == 0.5
+    ledger.record(finished_request("a", 0.8, limit))
+    limit = ledger.budget_for("a")
+    assert limit == pytest.approx(0.2)
+    ledger.record(finished_request("a", 0.3, limit))
+    with pytest.raises(BudgetExceeded) as error:
+        ledger.check("a")
+    assert error.value.status_code == 429 and error.value.retry_after >= 1
+    assert ledger.budget_for("b") == 0.5
+
+
+def test_concurrent_requests_reserve_the_tenant_budget():
+    ledger = CostLedger(path=None, max_per_tenant=1.0, max_per_request=0.4)
+    limits = [ledger.budget_for("a"), ledger.budget_for("a"), ledger.budget_for("a")]
+    # the three requests in flight together may not spend more than the cap
+    assert limits == [0.4, 0.4, pytest.approx(0.2)]
+    with pytest.raises(BudgetExceeded) as error:
+        ledger.budget_for("a")
+    assert error.value.retry_after == 1 and "in flight" in error.value.detail
+    # a request spending less than its budget gives the rest back
+    ledger.record(finished_request("a", 0.1, limits[0]))
+    assert ledger.budget_for("a") == pytest.approx(0.3)
+    assert ledger.stats()["reserved"] == pytest.approx(0.9)
+
+
+def test_idle_tenants_expire():
+    ledger = CostLedger(path=None, max_per_tenant=1.0)
+    ledger.record(finished_request("a", 0.1, ledger.budget_for("a")))
+    ledger.record(finished_request("b", 0.1, ledger.budget_for("b")))
+    ledger.budget_for("c")
+    # "a" last spent in an earlier window
+    ledger.tenant_spend["a"][0] -= ledger.tenant_window
+    # "c" has a request in flight: its reservation keeps it
+    ledger.tenant_spend["c"][0] -= ledger.tenant_window
+    ledger.expire_tenants()
+    assert set(ledger.tenant_spend) == {"b", "c"}
+    assert set(ledger.totals["tenants"]) == {"b"}
+
+
+@pytest.fixture
+def app_main(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[1] / "Docker-FastAPI-app"))
+    import app.main
+    return app.main
+
+
+def make_request(headers, host="10.0.0.7"):
+    return Request({"type": "http", "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+                    "client": (host, 1234)})
+
+
+def test_client_id_ignores_self_declared_header(app_main, monkeypatch):
+    monkeypatch.setattr(app_main, "TENANT_API_KEYS", {})
+    monkeypatch.setattr(app_main, "TENANT_HEADER", None)
+    assert app_main.client_id(make_request({"X-Client-ID": "someone-else"})) == "10.0.0.7"
+    monkeypatch.setattr(app_main, "TENANT_HEADER", "X-Client-ID")
+    assert app_main.client_id(make_request({"X-Client-ID": "gateway-user"})) == "gateway-user"
+
+
+def test_client_id_from_api_key(app_main, monkeypatch):
+    monkeypatch.setattr(app_main, "TENANT_API_KEYS", {"secret-key": "acme"})
+    assert app_main.client_id(make_request({"Authorization": "Bearer secret-key"})) == "acme"
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "Basic secret-key"}, {"X-Client-ID": "acme"}):
+        with pytest.raises(HTTPException) as error:
+            app_main.client_id(make_request(headers))
+        assert error.value.status_code == 401
@@ -0,0 +1,40 @@
+# Importing dependencies
+import json
+import asyncio
+
+from prompt_enhancer import PromptEnhancer
+from prompt_enhancer.client_provider import ClientProvider
+from prompt_enhancer.openai_batch import BatchAPIBackend
+
+
+def test_pipelines_run_in_successive_waves_through_the_mock_batch_api(mock_api, tmp_path):
+    async def scenario():
+        # a client of its own: the pooled connections of the shared one belong to the event loop of another test
+        client = ClientProvider.from_env().create_client()
+        backend = BatchAPIBackend(client, collect_window=0.05, poll_interval=0.05, work_dir=str(tmp_path))
+        enhancers = [PromptEnhancer("gpt-4o-mini", cache=None, pipeline_cache=None, cost_ledger=None, inflight_calls=None,
+                                    inflight_pipelines=None) for _ in range(2)]
+        for enhancer in enhancers:
+            enhancer.llm_backend = backend
+        try:
+            outputs = await asyncio.gather(enhancers[0].enhance_prompt("Explain closures in Python"),
+                                           enhancers[1].enhance_prompt("Write a guide to SQL joins"))
+        finally:
+            await client.close()
+        return backend, enhancers, outputs
+
+    backend, enhancers, outputs = asyncio.run(scenario())
+    assert all(outputs)
+    waves = {}
+    for path in sorted(tmp_path.glob("wave_*_input.jsonl")):
+        wave = int(path.name.split("_")[1])
+        waves[wave] = [json.loads(line)["body"]["messages"][-1]["content"] for line in path.read_text(encoding="utf-8").splitlines()]
+    # the stages of both pipelines are gathered per wave: expand (with the suggestions), then decompose the expanded prompts
+    assert len(waves) >= 2 and len(waves) == len(backend.waves)
+    assert len(waves[1]) == 4 and len(waves[2]) == 2
+    assert all(enhancer.stage_usage["decomposition_and_reasoning"]["calls"] == 1 for enhancer in enhancers)
+    # each wave has its output file next to its input
+    assert len(list(tmp_path.glob("wave_*_file-*.jsonl"))) >= len(waves)
+    # billed at the Batch API discount
+    full_price = enhancers[0].pricing.cost("gpt-4o-mini", enhancers[0].prompt_tokens, enhancers[0].completion_tokens)
+    assert abs(enhancers[0].cost - full_price * 0.5) < 1e-12
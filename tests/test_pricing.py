@@ -0,0 +1,23 @@
+# Importing dependencies
+import pytest
+
+from prompt_enhancer.pricing import PricingRegistry
+from prompt_enhancer.openai_batch import parse_batch_result
+
+
+def test_cost_of_cached_and_batch_calls():
+    pricing = PricingRegistry({"model": (2.0, 1.0, 4.0)})
+    assert pricing.cost("model", 1000, 500) == pytest.approx(0.004)
+    assert pricing.cost("model", 1000, 500, cached_prompt_tokens=400) == pytest.approx(0.0036)
+    assert pricing.cost("model", 1000, 500, batch=True) == pytest.approx(0.002)
+    assert pricing.cost("model-2024-07-18", 1000, 500) == pytest.approx(0.004)
+
+
+def test_batch_results_are_marked_as_batch_usage():
+    record = {"custom_id": "a", "response": {"status_code": 200, "body": {
+        "choices": [{"message": {"content": "out"}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "prompt_tokens_details": {"cached_tokens": 4}},
+    }}}
+    content, usage = parse_batch_result(record)
+    assert content == "out"
+    assert usage.batch is True and usage.prompt_tokens_details == {"cached_tokens": 4}
@@ -0,0 +1,55 @@
+# Importing dependencies
+import time
+import asyncio
+import pytest
+
+from prompt_enhancer.rate_limiter import ModelRateLimiter, TokenBucket, parse_reset
+
+
+def test_parse_reset():
+    assert parse_reset("1s") == 1.0
+    assert parse_reset("6m0s") == 360.0
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset(None) == 0.0
+
+
+def test_bucket_waits_for_its_refill():
+    bucket = TokenBucket(capacity=10, refill_per_second=100)
+    assert bucket.time_until(10) == 0.0
+    bucket.consume(10)
+    assert bucket.time_until(5) == pytest.approx(0.05, abs=0.01)
+    # more than the capacity only waits for a full bucket
+    assert bucket.time_until(1000) == pytest.approx(0.1, abs=0.01)
+
+
+def test_requests_are_admitted_in_arrival_order_at_the_limit():
+    async def scenario():
+        # 600 requests per minute: 10 per second, with a burst of 600 already spent but 2
+        limiter = ModelRateLimiter("model", requests_per_minute=600, tokens_per_minute=10**6)
+        limiter.requests.level = 2
+        order = []
+
+        async def request(index):
+            await limiter.acquire(100)
+            order.append(index)
+
+        start = time.monotonic()
+        await asyncio.gather(*(request(index) for index in range(5)))
+        return order, time.monotonic() - start, limiter
+
+    order, elapsed, limiter = asyncio.run(scenario())
+    assert order == [0, 1, 2, 3, 4]
+    # three requests waited for the refill, at 10 per second
+    assert 0.25 <= elapsed < 1.0
+    assert limiter.admitted == 5 and limiter.queue_depth == 0
+
+
+def test_headers_shrink_the_buckets():
+    limiter = ModelRateLimiter("model", requests_per_minute=600, tokens_per_minute=10**6)
+    limiter.update_from_headers({"x-ratelimit-limit-tokens": "60000", "x-ratelimit-remaining-tokens": "1000",
+                                 "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+    assert limiter.tokens.capacity == 60000 and limiter.tokens.level <= 1000
+    # no request left: the queue is held until the reset
+    assert limiter.requests.time_until(1) == pytest.approx(2.0 + 0.1, abs=0.05)
+    limiter.settle(estimated_tokens=500, actual_tokens=200)
+    assert limiter.tokens.level <= 1300
@@ -0,0 +1,117 @@
+# Importing dependencies
+import types
+import random
+import asyncio
+import httpx
+import openai
+import pytest
+
+from prompt_enhancer import PromptEnhancer
+from prompt_enhancer.resilience import CallPolicy, StreamInterrupted
+from prompt_enhancer.scheduler import current_stage
+
+
+def new_stats():
+    return {"retries": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0}
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://mock/v1/chat/completions"))
+
+
+@pytest.mark.parametrize("attempts", [0, -1])
+def test_policy_needs_one_attempt(attempts, monkeypatch):
+    with pytest.raises(ValueError):
+        CallPolicy(max_attempts=attempts)
+    monkeypatch.setenv("LLM_MAX_ATTEMPTS", str(attempts))
+    with pytest.raises(ValueError):
+        CallPolicy.from_env()
+
+
+def test_policy_retries_retryable_errors():
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) < 3:
+            raise connection_error()
+        return "ok"
+
+    stats = new_stats()
+    policy = CallPolicy(max_attempts=3, base_delay=0.0)
+    assert asyncio.run(policy.call("model", send, stats)) == "ok"
+    assert len(calls) == 3 and stats["retries"] == 2
+
+    calls.clear()
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(CallPolicy(max_attempts=2, base_delay=0.0).call("model", send, new_stats()))
+    assert len(calls) == 2
+
+
+def rate_limit_error(retry_after):
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "http://mock/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_retry_after_is_capped_without_a_deadline():
+    policy = CallPolicy(max_delay=8.0)
+    assert policy.backoff(0, rate_limit_error("3")) == 3.0
+    assert policy.backoff(0, rate_limit_error("3600")) == 8.0
+    # under a deadline the full wait is kept, call() then gives up instead of retrying too early
+    assert policy.backoff(0, rate_limit_error("3600"), deadline=100.0) == 3600.0
+
+
+def test_api_timeouts_are_counted():
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) < 2:
+            raise openai.APITimeoutError(request=httpx.Request("POST", "http://mock/v1/chat/completions"))
+        return "ok"
+
+    stats = new_stats()
+    assert asyncio.run(CallPolicy(max_attempts=2, base_delay=0.0).call("model", send, stats, hedge=False)) == "ok"
+    assert stats["timeouts"] == 1 and stats["retries"] == 1
+
+
+def test_interrupted_stream_is_not_retried():
+    forwarded = []
+
+    async def forward(stage, token):
+        forwarded.append(token)
+
+    def chunk(content):
+        return types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+    async def broken_stream():
+        yield chunk("Hello")
+        yield chunk(" world")
+        raise connection_error()
+
+    async def scenario():
+        enhancer = PromptEnhancer("gpt-4o-mini")
+        enhancer.token_callback = forward
+        current_stage.set("analysis")
+        await enhancer.stream_llm(broken_stream())
+
+    with pytest.raises(StreamInterrupted):
+        asyncio.run(scenario())
+    assert forwarded == ["Hello", " world"]
+
+
+def test_failing_api_is_retried_through_the_mock_server(mock_api):
+    mock_api.state.error_rate = 0.5
+    # the server draws its faults from the random module: seeded, the run is reproducible
+    random.seed(3)
+
+    async def scenario():
+        enhancer = PromptEnhancer("gpt-4o-mini", call_policy=CallPolicy(max_attempts=8, base_delay=0.0), rate_limiters=None,
+                                  inflight_calls=None)
+        messages = [{"role": "user", "content": "hi"}]
+        results = [await enhancer.request_llm(messages, 0.0, "gpt-4o-mini") for _ in range(6)]
+        return enhancer, results
+
+    enhancer, results = asyncio.run(scenario())
+    assert all(content for content, usage in results)
+    assert enhancer.call_stats["retries"] > 0
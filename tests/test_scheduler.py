@@ -0,0 +1,73 @@
+# Importing dependencies
+import time
+import asyncio
+import pytest
+
+from prompt_enhancer.scheduler import Stage, StageScheduler, current_stage
+from prompt_enhancer.resilience import current_deadline
+
+
+def delayed(value, delay=0.0):
+    async def run(*args):
+        await asyncio.sleep(delay)
+        return value(*args) if callable(value) else value
+    return run
+
+
+def test_independent_stages_run_concurrently():
+    scheduler = StageScheduler([
+        Stage("analysis", delayed(lambda prompt: prompt + " analysed", 0.05), inputs=["input_prompt"]),
+        Stage("references", delayed("refs", 0.2), inputs=["analysis"]),
+        Stage("tools", delayed("tools", 0.2), inputs=["analysis"]),
+        Stage("assembled", delayed(lambda *values: " | ".join(values)), inputs=["analysis", "references", "tools"]),
+    ])
+    results, timings = asyncio.run(scheduler.run(input_prompt="prompt"))
+    assert results["assembled"] == "prompt analysed | refs | tools"
+    # the two suggestion stages overlap: the run takes about one of them after the analysis, not both
+    assert timings["total"]["elapsed_time"] < 0.4
+    assert timings["total"]["sequential_time"] >= 0.45
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        StageScheduler([Stage("a", delayed(1), inputs=["b"]), Stage("b", delayed(2), inputs=["a"])])
+    with pytest.raises(ValueError, match="Duplicated"):
+        StageScheduler([Stage("a", delayed(1)), Stage("a", delayed(2))])
+    with pytest.raises(ValueError, match="neither a stage nor an initial value"):
+        asyncio.run(StageScheduler([Stage("a", delayed(1), inputs=["missing"])]).run())
+
+
+def test_a_failing_stage_cancels_the_others():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def broken():
+        raise RuntimeError("stage failed")
+
+    scheduler = StageScheduler([Stage("slow", slow), Stage("broken", broken)])
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        asyncio.run(scheduler.run())
+    assert cancelled == [True] and time.perf_counter() - start < 1
+
+
+def test_stages_see_their_name_and_share_of_the_budget():
+    seen = {}
+
+    def record(name):
+        async def run(*args):
+            seen[name] = (current_stage.get(), current_deadline.get() - time.monotonic())
+            return name
+        return run
+
+    scheduler = StageScheduler([Stage("first", record("first")), Stage("second", record("second"), inputs=["first"])], budget=10.0)
+    asyncio.run(scheduler.run())
+    assert seen["first"][0] == "first" and seen["second"][0] == "second"
+    # the first stage has the second one ahead of it: half of the budget
+    assert 4.5 < seen["first"][1] <= 5.0 and 9.0 < seen["second"][1] <= 10.0
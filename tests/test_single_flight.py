@@ -0,0 +1,84 @@
+# Importing dependencies
+import asyncio
+
+from prompt_enhancer import PromptEnhancer
+from prompt_enhancer.ledger import CostLedger
+from prompt_enhancer.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5))), flight
+
+    results, flight = asyncio.run(main())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["done"] * 5
+    assert sum(shared for _, shared in results) == 4
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+
+def test_cancelled_leader_does_not_cancel_the_followers():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_pipelines_under_a_budget_are_not_shared_across_tenants(mock_api):
+    mock_api.state.latency = 0.05
+    ledger = CostLedger(path=None, max_per_request=1.0)
+
+    async def main():
+        flight = SingleFlight()
+        # without the call-level coalescing, which shares the identical LLM calls like cache hits
+        enhancers = [PromptEnhancer(cost_ledger=ledger, tenant=tenant, inflight_pipelines=flight, inflight_calls=None) for tenant in ("a", "b", "b")]
+        await asyncio.gather(*(enhancer.enhance_prompt("Write a haiku about the sea") for enhancer in enhancers))
+        return enhancers, flight
+
+    enhancers, flight = asyncio.run(main())
+    # tenant b's second request joins b's pipeline, never a's
+    assert [enhancer.pipeline_coalesced for enhancer in enhancers] == [False, False, True]
+    assert flight.stats()["leaders"] == 2
+    assert ledger.totals["tenants"]["a"] > 0 and ledger.totals["tenants"]["b"] > 0
+
+
+def test_cancelled_leader_is_charged_when_the_shared_pipeline_ends(mock_api):
+    mock_api.state.latency = 0.05
+    ledger = CostLedger(path=None)
+
+    async def main():
+        flight = SingleFlight()
+        leader = PromptEnhancer(cost_ledger=ledger, tenant="a", inflight_pipelines=flight)
+        follower = PromptEnhancer(cost_ledger=ledger, tenant="b", inflight_pipelines=flight)
+        leader_task = asyncio.create_task(leader.enhance_prompt("Write a haiku about the sea"))
+        await asyncio.sleep(0.02)
+        follower_task = asyncio.create_task(follower.enhance_prompt("Write a haiku about the sea"))
+        await asyncio.sleep(0.01)
+        leader_task.cancel()
+        await follower_task
+        await asyncio.sleep(0)
+        return leader
+
+    leader = asyncio.run(main())
+    entries = {entry["tenant"]: entry for entry in ledger.entries}
+    assert entries["a"]["status"] == "succeeded"
+    assert entries["a"]["cost"] == round(leader.cost, 8) > 0
+    assert entries["b"]["coalesced"] and entries["b"]["cost"] == 0